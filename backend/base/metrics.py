@@ -0,0 +1,259 @@
+"""Request instrumentation, exported in the Prometheus text format.
+
+user_auth.middlewares.ManageAccessMiddleware measures every request: wall
+time, response size, database queries and their time per alias, and the time
+spent in mh_all_manager calls per method (utils.pool.mh_manager). The totals
+go to the metrics below, which `metrics_view` serves, and the request's own
+numbers to its Server-Timing header. Metrics are kept per process, so every
+worker is scraped (or reports) separately.
+"""
+
+import contextvars
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label values, the count per bucket followed by the sum.
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * len(self.buckets) + [0.0]
+            values[bisect_left(self.buckets, value)] += 1
+            values[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(v)) for key, v in self._values.items()]
+        for key, counts in values:
+            labels = tuple(zip(self.labelnames, key))
+            total = 0
+            for bucket, count in zip(self.buckets, counts):
+                total += count
+                le = ("le", _format_value(bucket))
+                yield f"{self.name}_bucket", labels + (le,), total
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                label_text = "{" + label_text + "}" if label_text else ""
+                lines.append(f"{name}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by view.",
+    ("view", "method", "status"),
+)
+RESPONSE_SIZE = registry.histogram(
+    "http_response_size_bytes",
+    "Size of the response body, by view. Streamed responses aren't counted.",
+    ("view",),
+    buckets=tuple(4**n * 256 for n in range(9)),
+)
+DB_QUERIES = registry.counter(
+    "db_queries_total", "Database queries run, by view and alias.", ("view", "alias")
+)
+DB_SECONDS = registry.counter(
+    "db_query_seconds_total",
+    "Time spent in database queries, by view and alias.",
+    ("view", "alias"),
+)
+MANAGER_CALLS = registry.counter(
+    "mh_manager_calls_total",
+    "mh_all_manager method calls, by view and method.",
+    ("view", "method"),
+)
+MANAGER_SECONDS = registry.counter(
+    "mh_manager_seconds_total",
+    "Time spent in mh_all_manager method calls, by view and method.",
+    ("view", "method"),
+)
+
+
+class RequestTimings:
+    """What one request spent its time on."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = None
+        # alias -> [queries, seconds] and method -> [calls, seconds]
+        self.queries = defaultdict(lambda: [0, 0.0])
+        self.manager_calls = defaultdict(lambda: [0, 0.0])
+
+    def record_query(self, alias, seconds):
+        entry = self.queries[alias]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def record_manager_call(self, method, seconds):
+        entry = self.manager_calls[method]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def server_timing(self) -> str:
+        """The Server-Timing header value, durations in milliseconds."""
+
+        entries = [f"total;dur={self.duration * 1000:.1f}"]
+        for alias, (count, seconds) in self.queries.items():
+            entries.append(
+                f'db-{alias};desc="{alias}, {count} queries";dur={seconds * 1000:.1f}'
+            )
+        for method, (count, seconds) in self.manager_calls.items():
+            entries.append(
+                f'mh-{method};desc="{method} x{count}";dur={seconds * 1000:.1f}'
+            )
+        return ", ".join(entries)
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def current_timings():
+    """The RequestTimings of the request being handled, if it's measured."""
+    return _current.get()
+
+
+class _QueryTimer:
+    def __init__(self, timings, alias):
+        self.timings = timings
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings.record_query(self.alias, time.perf_counter() - start)
+
+
+@contextmanager
+def measure_request():
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(_QueryTimer(timings, alias))
+                )
+            yield timings
+    finally:
+        timings.duration = time.perf_counter() - timings.started
+        _current.reset(token)
+
+
+def observe_request(request, response, timings):
+    match = request.resolver_match
+    view = match.route if match is not None else "unmatched"
+
+    REQUEST_DURATION.observe(
+        timings.duration,
+        view=view,
+        method=request.method,
+        status=response.status_code,
+    )
+    if not response.streaming:
+        RESPONSE_SIZE.observe(len(response.content), view=view)
+    for alias, (count, seconds) in timings.queries.items():
+        DB_QUERIES.inc(count, view=view, alias=alias)
+        DB_SECONDS.inc(seconds, view=view, alias=alias)
+    for method, (count, seconds) in timings.manager_calls.items():
+        MANAGER_CALLS.inc(count, view=view, method=method)
+        MANAGER_SECONDS.inc(seconds, view=view, method=method)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, answered only to "Authorization: Bearer
+    <METRICS_TOKEN>" and to no one while METRICS_TOKEN isn't set.
+    """
+
+    token = getattr(settings, "METRICS_TOKEN", "")
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    if not token or not hmac.compare_digest(
+        authorization.encode(), f"Bearer {token}".encode()
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,9 +1,44 @@
-import json
-
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Optional, falls back to DRF's stdlib json rendering.
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer backed by orjson. UUIDs and datetimes are encoded by
+    orjson itself, anything else it doesn't know (Decimal, lazy strings,
+    querysets, ...) goes through DRF's encoder, so the output matches
+    JSONRenderer's. Indented output (e.g. `Accept: application/json; indent=4`)
+    and a missing orjson fall back to JSONRenderer.
+    """
+
+    if orjson is not None:
+        options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._default = JSONEncoder().default
+
+    def dumps(self, data) -> bytes:
+        if orjson is None:
+            return super().render(data)
+        return orjson.dumps(data, default=self._default, option=self.options)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return self.dumps(data)
 
 
-class BaseJSONRenderer(JSONRenderer):
+class BaseJSONRenderer(ORJSONRenderer):
     charset = "utf-8"
     object_label = "object"
     pagination_object_label = "objects"
@@ -11,7 +46,7 @@ class BaseJSONRenderer(JSONRenderer):
 
     def render(self, data, media_type=None, renderer_context=None):
         if data.get("results", None) is not None:
-            return json.dumps(
+            return self.dumps(
                 {
                     self.pagination_object_label: data["results"],
                     self.pagination_count_label: data["count"],
@@ -26,4 +61,4 @@ class BaseJSONRenderer(JSONRenderer):
             return super(BaseJSONRenderer, self).render(data)
 
         else:
-            return json.dumps({self.object_label: data})
+            return self.dumps({self.object_label: data})
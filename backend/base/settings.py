@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 import sys
 import environ
+from corsheaders.defaults import default_headers
 
 env = environ.Env()
 environ.Env.read_env()
@@ -48,6 +49,13 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "https://www.terrastack.ai",
 ]
+CORS_EXPOSE_HEADERS = [
+    "X-Next-After",
+    "X-Total-Count",
+    "Server-Timing",
+    "X-Simplification-Tolerance",
+]
+CORS_ALLOW_HEADERS = (*default_headers, "x-tile-token")
 # Application definition
 
 INSTALLED_APPS = [
@@ -65,6 +73,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "utils.middlewares.ReplicaRoutingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -102,6 +111,24 @@ WSGI_APPLICATION = "base.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before they
+# are reused. DB_POOL=True switches to psycopg's connection pool instead, which
+# needs psycopg 3 with its pool extra (pip install "psycopg[binary,pool]") and
+# doesn't combine with persistent connections.
+DB_POOL = env.bool("DB_POOL", default=False)
+DB_CONN_MAX_AGE = 0 if DB_POOL else env.int("DB_CONN_MAX_AGE", default=60)
+DB_OPTIONS = (
+    {
+        "pool": {
+            "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+            "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+            "timeout": env.int("DB_POOL_TIMEOUT", default=10),
+        }
+    }
+    if DB_POOL
+    else {}
+)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -110,6 +137,9 @@ DATABASES = {
         "PASSWORD": "postgres",
         "HOST": "localhost",
         "PORT": "5432",
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": DB_OPTIONS,
     },
     "external_db": {
         "ENGINE": "django.db.backends.postgresql",
@@ -118,9 +148,41 @@ DATABASES = {
         "PASSWORD": "postgres",
         "HOST": "localhost",
         "PORT": "5432",
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": DB_OPTIONS,
     },
 }
 
+# Cache
+# Set CACHE_URL (e.g. rediscache://127.0.0.1:6379/1) to share cached data
+# between gunicorn workers, the default cache is per process.
+
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+# Data versions (utils.cache) are kept in the database so `manage.py
+# bump_data_version` reaches every worker, each re-reads them this often.
+DATA_VERSION_LOCAL_TIMEOUT = env.int("DATA_VERSION_LOCAL_TIMEOUT", default=5)
+
+HIERARCHY_CACHE_TIMEOUT = env.int("HIERARCHY_CACHE_TIMEOUT", default=60 * 60)
+LOCATION_INDEX_CACHE_TIMEOUT = env.int("LOCATION_INDEX_CACHE_TIMEOUT", default=60 * 60)
+
+# Entitlements are invalidated when a Plan changes, which only reaches other
+# workers through a shared cache. Without one the local timeout applies.
+ENTITLEMENTS_CACHE_TIMEOUT = env.int("ENTITLEMENTS_CACHE_TIMEOUT", default=24 * 60 * 60)
+ENTITLEMENTS_LOCAL_CACHE_TIMEOUT = env.int(
+    "ENTITLEMENTS_LOCAL_CACHE_TIMEOUT", default=30
+)
+
+# Authenticated users are cached by user_auth.backends.JWTAuthentication. With a
+# shared cache, the local timeout bounds how long another worker may still see a
+# deactivated user, with locmem it's AUTH_USER_CACHE_TIMEOUT.
+AUTH_USER_CACHE_TIMEOUT = env.int("AUTH_USER_CACHE_TIMEOUT", default=5 * 60)
+AUTH_USER_LOCAL_CACHE_TIMEOUT = env.int("AUTH_USER_LOCAL_CACHE_TIMEOUT", default=10)
+AUTH_USER_LOCAL_CACHE_SIZE = env.int("AUTH_USER_LOCAL_CACHE_SIZE", default=1024)
+# Number of verified tokens kept per process, 0 disables the token cache.
+AUTH_TOKEN_CACHE_SIZE = env.int("AUTH_TOKEN_CACHE_SIZE", default=1024)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -144,6 +206,10 @@ REST_FRAMEWORK = {
     # 'EXCEPTION_HANDLER': 'conduit.apps.core.exceptions.core_exception_handler',
     "NON_FIELD_ERRORS_KEY": "error",
     "DEFAULT_AUTHENTICATION_CLASSES": ("user_auth.backends.JWTAuthentication",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "base.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 20,
 }
@@ -174,7 +240,12 @@ RAZORPAY_PUBLIC_KEY = env("RAZORPAY_PUBLIC_KEY")
 RAZORPAY_SECRET_KEY = env("RAZORPAY_SECRET_KEY")
 
 # Settings for Proxy
+# The tile proxy (pg_tileserv_proxy) checks tile cache purges against this key,
+# see utils.tiles.
 PROXY_SECRET_KEY = env("PROXY_SECRET_KEY")
+# Signs the tile tokens and tile sessions (utils.tiles), pg_tileserv_proxy reads
+# the same variable to verify them.
+TILE_TOKEN_SECRET = env("TILE_TOKEN_SECRET")
 PROXY_URL = env("PROXY_URL")
 
 # Static files (CSS, JavaScript, Images)
@@ -190,6 +261,123 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 AUTH_USER_MODEL = "user_auth.CustomUser"
 DATABASE_ROUTERS = ["utils.routers.MultiDBRouter"]
 
+# Read replicas per database as "host[:port]=weight;...", e.g.
+# DB_REPLICAS="10.0.0.5=2;10.0.0.6:5433=1". Each one becomes a
+# "<alias>_replica_<n>" database that utils.routers sends reads to, picked by
+# weight ("weighted") or in turn ("round_robin").
+DATABASE_REPLICAS = {}
+for _alias, _variable in (
+    ("default", "DB_REPLICAS"),
+    ("external_db", "EXTERNAL_DB_REPLICAS"),
+):
+    for _n, (_host, _weight) in enumerate(
+        env.dict(_variable, cast={"value": int}, default={}).items()
+    ):
+        _host, _, _port = _host.partition(":")
+        _replica = f"{_alias}_replica_{_n}"
+        DATABASES[_replica] = {
+            **DATABASES[_alias],
+            "HOST": _host,
+            "PORT": _port or DATABASES[_alias]["PORT"],
+            "TEST": {"MIRROR": _alias},
+        }
+        DATABASE_REPLICAS.setdefault(_alias, {})[_replica] = _weight
+DATABASE_REPLICA_SELECTION = env("DB_REPLICA_SELECTION", default="weighted")
+# After a write, the client and user keep reading from the primary this long.
+DATABASE_PRIMARY_STICKY_SECONDS = env.int("DB_PRIMARY_STICKY_SECONDS", default=5)
+DATABASE_PRIMARY_COOKIE = "db_primary"
+
+# Request instrumentation, see base.metrics. /metrics/ is only served to
+# scrapers sending METRICS_TOKEN as a bearer token, and responses only carry a
+# Server-Timing header (database aliases, query counts) when it's enabled.
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+SERVER_TIMING = env.bool("SERVER_TIMING", default=False)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 PAYMENT_CURRENCY = "INR"
+
+# land_value's terra_utils configuration, loaded when the first manager is created.
+TERRA_UTILS_CONFIG = env(
+    "TERRA_UTILS_CONFIG",
+    default="/home/ubuntu/terraview-django/backend/submodules/land_value/config",
+)
+
+# Pool of land_value mh_all_manager instances shared by the request handlers.
+MH_MANAGER_POOL = {
+    "MAX_SIZE": env.int("MH_MANAGER_POOL_SIZE", default=8),
+    "MAX_USES": env.int("MH_MANAGER_POOL_MAX_USES", default=500),
+    "MAX_AGE": env.int("MH_MANAGER_POOL_MAX_AGE", default=3600),  # in seconds
+    "TIMEOUT": env.int("MH_MANAGER_POOL_TIMEOUT", default=30),  # in seconds
+}
+
+# Rendered plot PDFs, see utils.pdf_cache.
+PDF_CACHE_ROOT = env("PDF_CACHE_ROOT", default=os.path.join(BASE_DIR, "pdf_cache"))
+PDF_CACHE_MAX_BYTES = env.int("PDF_CACHE_MAX_BYTES", default=2 * 1024**3)
+
+# Tile session tokens covering all of a user's layers, see utils.tiles. The
+# cookie only reaches the tile proxy when TILE_SESSION_COOKIE_DOMAIN covers it.
+TILE_SESSION_LIFETIME = env.int("TILE_SESSION_LIFETIME", default=12 * 60 * 60)
+TILE_SESSION_REFRESH_AHEAD = env.int("TILE_SESSION_REFRESH_AHEAD", default=30 * 60)
+TILE_SESSION_COOKIE = "tile_session"
+TILE_SESSION_COOKIE_DOMAIN = env("TILE_SESSION_COOKIE_DOMAIN", default=None)
+
+# Layer catalog built by `manage.py build_layer_catalog`, see utils.catalog.
+# Zoom range of layers that haven't been rendered to an archive.
+LAYER_CATALOG_ZOOMS = (0, 22)
+LAYER_CATALOG_CACHE_TIMEOUT = env.int(
+    "LAYER_CATALOG_CACHE_TIMEOUT", default=24 * 60 * 60
+)
+
+# Pre-rendered vector tiles of static layers, see utils.mbtiles.
+MBTILES_ROOT = env("MBTILES_ROOT", default=os.path.join(BASE_DIR, "mbtiles"))
+MBTILES_MMAP_SIZE = env.int("MBTILES_MMAP_SIZE", default=256 * 1024**2)
+
+# Background report rendering, see utils.reports.
+REPORT_JOB_WORKERS = env.int("REPORT_JOB_WORKERS", default=2)
+REPORT_JOB_RETRY_AFTER = 2  # in seconds, polling hint sent with unfinished jobs
+
+# Bulk ZIP export of reports.
+BULK_REPORT_MAX = env.int("BULK_REPORT_MAX", default=500)
+BULK_REPORT_WORKERS = env.int("BULK_REPORT_WORKERS", default=4)
+
+# In-process spatial index over the cadastral layers, see utils.spatial.
+# SIMPLIFY_TOLERANCES are the simplified geometry tiers kept per layer, in meters.
+CADASTRAL_INDEX = {
+    "GEOMETRY_COLUMN": "geom",
+    "COLUMNS": [
+        "plot_id",
+        "khata_no",
+        "gat_no",
+        "survey_no",
+        "owner_name_english",
+        "district",
+        "taluka",
+        "village_name",
+    ],
+    "MAX_LAYERS": env.int("CADASTRAL_INDEX_MAX_LAYERS", default=8),
+    "SIMPLIFY_TOLERANCES": env.list(
+        "CADASTRAL_SIMPLIFY_TOLERANCES", cast=float, default=[1, 5, 20, 80]
+    ),
+}
+CADASTRAL_BATCH_MAX = env.int("CADASTRAL_BATCH_MAX", default=1000)
+
+# Keyset pages of utils.views.MaharashtraMetadataList.
+METADATA_PAGE_SIZE = 1000
+METADATA_MAX_PAGE_SIZE = 5000
+METADATA_STREAM_CHUNK_SIZE = 2000
+
+# Per-village identifier and preview index, see utils.villages.
+VILLAGE_INDEX_CACHE_TIMEOUT = env.int("VILLAGE_INDEX_CACHE_TIMEOUT", default=60 * 60)
+VILLAGE_INDEX_LOCAL_MAX_BYTES = env.int(
+    "VILLAGE_INDEX_LOCAL_MAX_BYTES", default=256 * 1024**2
+)
+
+# Owner-name search, see utils.owners. Indexes are built per district by
+# `manage.py build_owner_index`. Marathi transliteration keys need the
+# ai4bharat-transliteration model and are skipped when it can't be loaded.
+OWNER_INDEX_ROOT = env(
+    "OWNER_INDEX_ROOT", default=os.path.join(BASE_DIR, "owner_index")
+)
+OWNER_SEARCH_TRANSLITERATE = env.bool("OWNER_SEARCH_TRANSLITERATE", default=True)
+OWNER_SEARCH_LOCAL_SIZE = 16
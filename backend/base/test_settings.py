@@ -7,5 +7,6 @@ DATABASES = {
         "NAME": ":memory:",
     }
 }
+DATABASE_REPLICAS = {}
 
 PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
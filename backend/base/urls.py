@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+
 urlpatterns = [
+    path("metrics/", metrics_view, name="metrics"),
     path("admin/", admin.site.urls),
     path("api/", include("user_auth.urls")),
     path("api/", include("utils.urls")),
@@ -1,6 +1,8 @@
 import jwt
 from django.conf import settings
 from rest_framework import authentication, exceptions
+from utils.routers import set_request_user
+from .cache import get_cached_user, token_cache
 from .models import CustomUser
 
 
@@ -37,17 +39,20 @@ class JWTAuthentication(authentication.BaseAuthentication):
         """
         Authenticate the provided credentials, return user and token if valid.
         """
-        try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            raise exceptions.AuthenticationFailed("The token has expired.")
-        except jwt.InvalidTokenError:
-            raise exceptions.AuthenticationFailed(
-                "Invalid authentication. Could not decode token."
-            )
+        payload = token_cache.get(token)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+            except jwt.ExpiredSignatureError:
+                raise exceptions.AuthenticationFailed("The token has expired.")
+            except jwt.InvalidTokenError:
+                raise exceptions.AuthenticationFailed(
+                    "Invalid authentication. Could not decode token."
+                )
+            token_cache.set(token, payload)
 
         try:
-            user = CustomUser.objects.get(pk=payload["id"])
+            user = get_cached_user(payload["id"])
         except CustomUser.DoesNotExist:
             raise exceptions.AuthenticationFailed(
                 "No user matching this token was found."
@@ -56,4 +61,5 @@ class JWTAuthentication(authentication.BaseAuthentication):
         if not user.is_active:
             raise exceptions.AuthenticationFailed("This user has been deactivated.")
 
+        set_request_user(user.pk)
         return (user, token)
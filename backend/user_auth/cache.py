@@ -0,0 +1,114 @@
+"""Caches used by JWTAuthentication to skip work on every authenticated request.
+
+Users are cached as plain field values, without the password hash, in a short
+lived per-process LRU and in the shared cache, so each request gets its own
+CustomUser instance without a database round trip. Entries are dropped when the
+user is saved or deleted (see user_auth.signals), but only in the process that
+saved it and in the shared cache. Other processes may keep their LRU entry for
+up to AUTH_USER_LOCAL_CACHE_TIMEOUT seconds and, when the cache isn't shared
+between processes (locmem), their cached values for up to
+AUTH_USER_CACHE_TIMEOUT seconds. Queryset .update() calls skip the signals
+altogether, so callers that deactivate users that way must call
+invalidate_cached_user themselves.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import CustomUser
+
+_users = OrderedDict()
+_users_lock = threading.Lock()
+
+# Never cached, a user read from the cache loads it from the database on access.
+UNCACHED_FIELDS = {"password"}
+
+
+def _user_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def _user_values(user):
+    return {
+        f.attname: getattr(user, f.attname)
+        for f in CustomUser._meta.concrete_fields
+        if f.attname not in UNCACHED_FIELDS
+    }
+
+
+def _user_from_values(values):
+    return CustomUser.from_db("default", list(values), list(values.values()))
+
+
+def get_cached_user(user_id) -> CustomUser:
+    """Returns the user with the given id, raises CustomUser.DoesNotExist."""
+
+    user_id = str(user_id)
+    with _users_lock:
+        entry = _users.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _users.move_to_end(user_id)
+            return _user_from_values(entry[1])
+
+    key = _user_key(user_id)
+    values = cache.get(key)
+    if values is None:
+        values = _user_values(CustomUser.objects.get(pk=user_id))
+        cache.set(
+            key, values, timeout=getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300)
+        )
+
+    local_timeout = getattr(settings, "AUTH_USER_LOCAL_CACHE_TIMEOUT", 10)
+    with _users_lock:
+        _users[user_id] = (time.monotonic() + local_timeout, values)
+        _users.move_to_end(user_id)
+        while len(_users) > getattr(settings, "AUTH_USER_LOCAL_CACHE_SIZE", 1024):
+            _users.popitem(last=False)
+    return _user_from_values(values)
+
+
+def invalidate_cached_user(user_id):
+    user_id = str(user_id)
+    with _users_lock:
+        _users.pop(user_id, None)
+    cache.delete(_user_key(user_id))
+
+
+class TokenCache:
+    """LRU of verified token payloads, entries are dropped once the token expires."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            payload = self._payloads.get(token)
+            if payload is None:
+                return None
+            if payload.get("exp", float("inf")) <= time.time():
+                del self._payloads[token]
+                return None
+            self._payloads.move_to_end(token)
+            return payload
+
+    def set(self, token, payload):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._payloads[token] = payload
+            self._payloads.move_to_end(token)
+            while len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+
+token_cache = TokenCache(getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 0))
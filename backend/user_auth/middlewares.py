@@ -1,13 +1,25 @@
-from .models import CustomUser
+from django.conf import settings
+
+from base import metrics
 
 
 class ManageAccessMiddleware:
-    """To store logs and important information in the database"""
+    """
+    Measures each request (see base.metrics): wall time, response size,
+    database queries per alias and mh_all_manager calls. The totals feed the
+    Prometheus metrics, the request's own numbers its Server-Timing header
+    when SERVER_TIMING is enabled.
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.server_timing = getattr(settings, "SERVER_TIMING", False)
 
     def __call__(self, request):
-        # FIXME : Remove this not needed
-        # if request.path.startswith("/geo-data/") and request.user.is_authenticated:
-        return self.get_response(request)
+        with metrics.measure_request() as timings:
+            response = self.get_response(request)
+
+        metrics.observe_request(request, response, timings)
+        if self.server_timing:
+            response["Server-Timing"] = timings.server_timing()
+        return response
@@ -1,10 +1,16 @@
 # TODO: Add post save for CustomUser to create UserProfile
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
+from .cache import invalidate_cached_user
 from .models import UserProfile, CustomUser
 
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
+def invalidate_user_cache(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
 post_save.connect(create_user_profile, sender=CustomUser)
+post_save.connect(invalidate_user_cache, sender=CustomUser)
+post_delete.connect(invalidate_user_cache, sender=CustomUser)
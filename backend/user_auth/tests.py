@@ -1,9 +1,19 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils.timezone import now
 from django.utils import timezone
-from rest_framework.test import APITestCase, APIClient
-from rest_framework import status
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from rest_framework import exceptions, status
+from unittest.mock import patch
+from base import metrics
+from utils import pool
+from .backends import JWTAuthentication
+from . import cache as user_cache
+from .cache import token_cache
+from .middlewares import ManageAccessMiddleware
 from .models import OTPVerification, CustomUser
 import uuid
 
@@ -100,3 +110,128 @@ class UserAPITestCase(APITestCase):
         data = {"email": "test@example.com"}
         response = self.client.post("/api/request-otp/", data, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CachedAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        self.request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {self.user.token}"
+        )
+        self.addCleanup(token_cache.clear)
+
+    def test_user_lookup_is_cached(self):
+        JWTAuthentication().authenticate(self.request)
+
+        with self.assertNumQueries(0):
+            user, _ = JWTAuthentication().authenticate(self.request)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, self.user.email)
+
+    def test_deactivation_invalidates_cache(self):
+        JWTAuthentication().authenticate(self.request)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            JWTAuthentication().authenticate(self.request)
+
+    def test_password_hash_isnt_cached(self):
+        JWTAuthentication().authenticate(self.request)
+
+        self.assertNotIn("password", cache.get(user_cache._user_key(self.user.pk)))
+        user = user_cache.get_cached_user(self.user.pk)
+        self.assertIn("password", user.get_deferred_fields())
+        self.assertTrue(user.check_password("1234asdf"))
+
+    def test_local_cache_is_bounded(self):
+        others = [
+            CustomUser.objects.create_user(email=f"user{i}@example.com", password="x")
+            for i in range(3)
+        ]
+        user_cache._users.clear()
+        self.addCleanup(user_cache._users.clear)
+
+        with self.settings(AUTH_USER_LOCAL_CACHE_SIZE=2):
+            for user in others:
+                user_cache.get_cached_user(user.pk)
+
+        self.assertEqual(list(user_cache._users), [str(u.pk) for u in others[1:]])
+
+
+class InstrumentationTestCase(TestCase):
+
+    class Manager:
+        def get_preview_from_village(self, district, taluka, village):
+            return [{"khata_no": "1"}]
+
+    def setUp(self):
+        manager_pool = pool.ManagerPool(factory=self.Manager, max_size=1)
+        patcher = patch.object(pool, "get_manager_pool", return_value=manager_pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view(self, request):
+        CustomUser.objects.count()
+        CustomUser.objects.exists()
+        with pool.mh_manager() as amo:
+            amo.get_preview_from_village("d", "t", "v")
+        return HttpResponse(b"x" * 10)
+
+    def test_server_timing(self):
+        response = ManageAccessMiddleware(self.view)(RequestFactory().get("/"))
+        self.assertNotIn("Server-Timing", response)
+
+        with self.settings(SERVER_TIMING=True):
+            response = ManageAccessMiddleware(self.view)(RequestFactory().get("/"))
+
+        timing = response["Server-Timing"]
+        self.assertTrue(timing.startswith("total;dur="))
+        self.assertIn('db-default;desc="default, 2 queries"', timing)
+        self.assertIn(
+            'mh-get_preview_from_village;desc="get_preview_from_village x1"', timing
+        )
+
+    def test_metrics(self):
+        ManageAccessMiddleware(self.view)(RequestFactory().get("/"))
+
+        text = metrics.registry.render()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn('db_queries_total{view="unmatched",alias="default"}', text)
+        self.assertIn(
+            'mh_manager_calls_total{view="unmatched",method="get_preview_from_village"}',
+            text,
+        )
+        self.assertIn(
+            'http_response_size_bytes_bucket{view="unmatched",le="256.0"}', text
+        )
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram(
+            "test_seconds", "Test.", ("view",), buckets=(1, 2)
+        )
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value, view="v")
+
+        self.assertEqual(
+            [value for _, _, value in histogram.samples()], [2, 3, 4, 6.0, 4]
+        )
+
+    def test_metrics_endpoint_needs_the_token(self):
+        def scrape(token=None):
+            headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+            return metrics.metrics_view(RequestFactory().get("/metrics/", **headers))
+
+        self.assertEqual(scrape().status_code, 403)
+        self.assertEqual(scrape("").status_code, 403)
+        with self.settings(METRICS_TOKEN="scrape-token"):
+            self.assertEqual(scrape().status_code, 403)
+            self.assertEqual(scrape("wrong").status_code, 403)
+            response = scrape("scrape-token")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
@@ -1,6 +1,13 @@
 from django.contrib import admin
 
-from .models import Plan, ReportPlan, Transaction, ReportTransaction
+from .models import (
+    Plan,
+    ReportPlan,
+    Transaction,
+    ReportTransaction,
+    ReportJob,
+    LayerCatalog,
+)
 
 
 class PlanAdmin(admin.ModelAdmin):
@@ -59,6 +66,24 @@ class ReportTransactionAdmin(admin.ModelAdmin):
     ordering = ("-created_at",)
 
 
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ("plot_id", "khata_no", "user", "status", "created_at")
+    list_filter = ("status",)
+    ordering = ("-created_at",)
+
+
+class LayerCatalogAdmin(admin.ModelAdmin):
+    list_display = (
+        "layer",
+        "entity_type",
+        "entity_name",
+        "feature_count",
+        "computed_at",
+    )
+    search_fields = ("layer", "entity_name")
+    readonly_fields = [f.name for f in LayerCatalog._meta.fields]
+
+
 # admin.site.disable_action("delete_selected")
 
 
@@ -66,3 +91,5 @@ admin.site.register(Plan, PlanAdmin)
 admin.site.register(ReportPlan, ReportPlanAdmin)
 admin.site.register(ReportTransaction, ReportTransactionAdmin)
 admin.site.register(Transaction, TransactionAdmin)
+admin.site.register(ReportJob, ReportJobAdmin)
+admin.site.register(LayerCatalog, LayerCatalogAdmin)
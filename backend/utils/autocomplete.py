@@ -0,0 +1,126 @@
+"""Prefix autocomplete over district, taluka and village names.
+
+Every district, taluka and village in maharashtra_metadata contributes its
+English name (and, for villages, its Marathi name) as a normalized key to the
+sorted array of its location type. A prefix lookup is a bisect into each type's
+array followed by a short forward scan, so a few typed characters return a
+handful of matches with their parent codes instead of the whole hierarchy, and
+thousands of villages sharing a prefix can't crowd out a district. The index is
+rebuilt per metadata data version.
+"""
+
+from bisect import bisect_left
+
+from .cache import METADATA, VersionedCache, get_data_version
+from .entitlements import DISTRICT, TALUKA, VILLAGE, normalize_name
+from .models import MaharashtraMetadata
+
+# Ranking order of the location types.
+TYPES = (DISTRICT, TALUKA, VILLAGE)
+
+
+class LocationIndex:
+    def __init__(self, rows):
+        """
+        `rows` yields (district_code, district_name, taluka_code, taluka_name,
+        village_code, village_name, village_name_marathi) tuples.
+        """
+
+        # Each location is (type, name, code, district_code, taluka_code).
+        self.locations = []
+        seen = set()
+        keys = {location_type: [] for location_type in TYPES}
+
+        def add(location, *names):
+            ident = location[:1] + location[2:3]
+            if ident in seen:
+                return
+            seen.add(ident)
+            for name in names:
+                if name:
+                    keys[location[0]].append(
+                        (normalize_name(name), len(self.locations))
+                    )
+            self.locations.append(location)
+
+        for d_code, d_name, t_code, t_name, v_code, v_name, v_marathi in rows:
+            add((DISTRICT, d_name, d_code, None, None), d_name)
+            add((TALUKA, t_name, t_code, d_code, None), t_name)
+            add((VILLAGE, v_name, v_code, d_code, t_code), v_name, v_marathi)
+
+        # Per location type, the sorted keys and the location each belongs to.
+        self.keys = {}
+        self.targets = {}
+        for location_type, type_keys in keys.items():
+            type_keys.sort()
+            self.keys[location_type] = [key for key, _ in type_keys]
+            self.targets[location_type] = [target for _, target in type_keys]
+
+    def complete(self, prefix, limit=10, location_type=None, scan=None):
+        """
+        Returns up to `limit` locations with a name starting with `prefix`,
+        districts first, then talukas, then villages, shorter names first.
+        At most `scan` keys (default 50 * limit) of each type are looked at.
+        """
+
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        scan = scan or 50 * limit
+
+        ranked = []
+        for current in TYPES:
+            if len(ranked) >= limit:
+                break
+            if location_type is not None and current != location_type:
+                continue
+            keys, targets = self.keys[current], self.targets[current]
+            matches = {}
+            i = bisect_left(keys, prefix)
+            end = min(len(keys), i + scan)
+            while i < end and keys[i].startswith(prefix):
+                matches[targets[i]] = self.locations[targets[i]]
+                i += 1
+            ranked.extend(
+                sorted(matches.values(), key=lambda loc: (len(loc[1]), loc[1]))
+            )
+
+        return [
+            {
+                "type": location[0],
+                "name": location[1],
+                "code": location[2],
+                "district_code": location[3],
+                "taluka_code": location[4],
+            }
+            for location in ranked[:limit]
+        ]
+
+
+def load_location_rows():
+    return (
+        MaharashtraMetadata.objects.using("external_db")
+        .order_by("ogc_fid")
+        .values_list(
+            "district_code",
+            "district_name",
+            "taluka_code",
+            "taluka_name",
+            "village_code",
+            "village_name",
+            "village_name_marathi",
+        )
+        .iterator(chunk_size=5000)
+    )
+
+
+_cached = VersionedCache("LOCATION_INDEX_CACHE_TIMEOUT")
+
+
+def get_location_index() -> LocationIndex:
+    """Returns the location index for the current metadata version."""
+
+    return _cached.get(
+        f"location-index:v{get_data_version(METADATA)}:by-type",
+        lambda: LocationIndex(load_location_rows()),
+    )
@@ -0,0 +1,187 @@
+"""Version counters for data that is owned by land_value rather than by Django.
+
+Cached structures derived from that data include the current version in their
+cache key, so bumping a version (e.g. after a metadata import) invalidates every
+dependent entry across all workers at once.
+
+The counters are DataVersion rows in the default database, so a bump made by
+`manage.py bump_data_version` in its own process reaches every worker whatever
+the cache backend. Each process re-reads a counter at most every
+DATA_VERSION_LOCAL_TIMEOUT seconds, which bounds how long a worker keeps
+serving the previous version.
+
+VersionedCache holds such a derived structure in the shared cache and per
+process, and JSONPayload is the pre-serialized, pre-compressed form the JSON
+endpoints serve with ETags.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is always available.
+    brotli = None
+
+METADATA = "metadata"
+RECORDS = "records"
+CATALOG = "catalog"
+
+DATA_VERSIONS = (METADATA, RECORDS, CATALOG)
+
+# Always the primary, a replica could still hold the previous version.
+DATABASE = "default"
+
+_local = {}  # name -> (expires, version)
+_lock = threading.Lock()
+
+
+def _remember(name, version):
+    timeout = getattr(settings, "DATA_VERSION_LOCAL_TIMEOUT", 5)
+    with _lock:
+        _local[name] = (time.monotonic() + timeout, version)
+    return version
+
+
+def get_data_version(name) -> int:
+    """Returns the current version of the named data set."""
+
+    entry = _local.get(name)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    version = (
+        DataVersion.objects.using(DATABASE)
+        .filter(name=name)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return _remember(name, version or 1)
+
+
+def bump_data_version(name) -> int:
+    """Invalidates everything cached against the named data set."""
+
+    with transaction.atomic(using=DATABASE):
+        versions = DataVersion.objects.using(DATABASE)
+        versions.get_or_create(name=name)
+        versions.filter(name=name).update(version=F("version") + 1)
+        version = versions.get(name=name).version
+    return _remember(name, version)
+
+
+# Backends whose entries only the process that wrote them can see.
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared(alias="default") -> bool:
+    """Whether entries written to the cache are seen by the other workers."""
+    return settings.CACHES[alias]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
+
+
+def clear_local_versions():
+    """Forgets the counters read by this process (tests)."""
+    _local.clear()
+
+
+class VersionedCache:
+    """
+    A structure built at most once per cache lifetime for the current key, which
+    carries the data versions it derives from. Besides the shared cache, each
+    process keeps the latest one to avoid unpickling it on every request.
+    """
+
+    def __init__(self, timeout_setting, default_timeout=60 * 60):
+        self.timeout_setting = timeout_setting
+        self.default_timeout = default_timeout
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Returns the value cached under `key`, calling `build()` on a miss."""
+
+        timeout = getattr(settings, self.timeout_setting, self.default_timeout)
+
+        entry = self._local.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+
+            value = cache.get(key)
+            if value is None:
+                value = build()
+                cache.set(key, value, timeout=timeout)
+
+            self._local.clear()
+            self._local[key] = (time.monotonic() + timeout, value)
+            return value
+
+    def clear_local(self):
+        """Forgets this process' copy (tests)."""
+        with self._lock:
+            self._local.clear()
+
+
+class JSONPayload:
+    """A serialized JSON document plus its pre-compressed variants and ETags."""
+
+    def __init__(self, body: bytes):
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.body = body
+        self.variants = {"gzip": gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body)
+
+    @classmethod
+    def dump(cls, data):
+        return cls(json.dumps(data, separators=(",", ":")).encode())
+
+    @property
+    def etag(self):
+        return f'"{self.digest}"'
+
+    @property
+    def etags(self):
+        """Strong ETags of every representation, each encoding gets its own."""
+        return {self.etag} | {f'"{self.digest}-{enc}"' for enc in self.variants}
+
+    def negotiate(self, accept_encoding: str):
+        """Returns (body, content_encoding, etag) for an Accept-Encoding header."""
+
+        accepted = set()
+        for coding in accept_encoding.split(","):
+            name, _, params = coding.partition(";")
+            qvalue = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key == "q":
+                    try:
+                        qvalue = float(value)
+                    except ValueError:
+                        qvalue = 0
+            if qvalue > 0:
+                accepted.add(name.strip().lower())
+
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return self.variants[encoding], encoding, f'"{self.digest}-{encoding}"'
+        return self.body, None, self.etag
+
+    def data(self):
+        return json.loads(self.body)
@@ -0,0 +1,200 @@
+"""Precomputed catalog of the cadastral tile layers.
+
+`manage.py build_layer_catalog` reads each layer's bounds, feature count,
+attribute schema and zoom range from external_db once and stores them as
+LayerCatalog rows, together with the hierarchy entity that guards the layer.
+The map's layer list, layer metadata and extents are then served from the
+serialized catalog, cached against the catalog data version with ETags, so a
+map load no longer fans out to pg_tileserv. Rebuilding bumps the version.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .cache import (
+    CATALOG,
+    JSONPayload,
+    VersionedCache,
+    bump_data_version,
+    get_data_version,
+)
+from .entitlements import get_hierarchy_index
+from .mbtiles import get_archive
+from .models import LayerCatalog
+from .spatial import LAYER_RE, _config
+
+
+def discover_layers() -> dict:
+    """Returns {layer: (geometry_type, srid)} for the cadastral tables."""
+
+    with connections["external_db"].cursor() as cursor:
+        cursor.execute(
+            "SELECT f_table_schema, f_table_name, type, srid FROM geometry_columns "
+            "WHERE f_geometry_column = %s",
+            [_config()["GEOMETRY_COLUMN"]],
+        )
+        rows = cursor.fetchall()
+    layers = {f"{schema}.{table}": (kind, srid) for schema, table, kind, srid in rows}
+    return {layer: layers[layer] for layer in sorted(layers) if LAYER_RE.match(layer)}
+
+
+def inspect_layer(layer) -> dict:
+    """Reads a layer's attribute schema, feature count and bounds."""
+
+    if not LAYER_RE.match(layer):
+        raise ValueError(f"Invalid cadastral layer {layer!r}")
+
+    schema, table = layer.split(".")
+    geometry = _config()["GEOMETRY_COLUMN"]
+    connection = connections["external_db"]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = %s AND table_name = %s AND column_name <> %s "
+            "ORDER BY ordinal_position",
+            [schema, table, geometry],
+        )
+        attributes = [{"name": name, "type": kind} for name, kind in cursor.fetchall()]
+        cursor.execute(
+            "SELECT n, ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e) FROM ("
+            "SELECT count(*) AS n, "
+            f"ST_Extent(ST_Transform({quote(geometry)}, 4326)) AS e "
+            f"FROM {quote(schema)}.{quote(table)}) extent"
+        )
+        row = cursor.fetchone()
+
+    return {
+        "attributes": attributes,
+        "feature_count": row[0],
+        "bounds": None if row[1] is None else tuple(row[1:]),
+    }
+
+
+def zoom_range(layer):
+    """The rendered zooms of the layer's archive, LAYER_CATALOG_ZOOMS otherwise."""
+
+    archive = get_archive(layer)
+    if archive is not None:
+        metadata = archive.metadata()
+        if "minzoom" in metadata and "maxzoom" in metadata:
+            return int(metadata["minzoom"]), int(metadata["maxzoom"])
+    return tuple(getattr(settings, "LAYER_CATALOG_ZOOMS", (0, 22)))
+
+
+def build_catalog(layers=None, log=None) -> list[LayerCatalog]:
+    """
+    Computes the catalog entries of `layers`, all discovered layers by default,
+    in which case entries of layers that no longer exist are removed.
+    """
+
+    discovered = discover_layers()
+    if layers is None:
+        layers = list(discovered)
+    unknown = [layer for layer in layers if layer not in discovered]
+    if unknown:
+        raise ValueError(f"Unknown layers: {', '.join(unknown)}")
+
+    index = get_hierarchy_index()
+    rows = {}
+    for layer in layers:
+        started = time.monotonic()
+        geometry_type, srid = discovered[layer]
+        details = inspect_layer(layer)
+        min_zoom, max_zoom = zoom_range(layer)
+        entity = index.resolve_table(layer)
+        west, south, east, north = details["bounds"] or (None,) * 4
+        rows[layer] = {
+            "geometry_type": geometry_type,
+            "srid": srid,
+            "west": west,
+            "south": south,
+            "east": east,
+            "north": north,
+            "min_zoom": min_zoom,
+            "max_zoom": max_zoom,
+            "feature_count": details["feature_count"],
+            "attributes": details["attributes"],
+            "entity_type": entity[0] if entity else None,
+            "entity_code": entity[1] if entity else None,
+            "entity_name": index.names.get(entity) if entity else None,
+        }
+        if log is not None:
+            log(
+                f"{layer}: {details['feature_count']} features "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+
+    with transaction.atomic():
+        if len(layers) == len(discovered):
+            LayerCatalog.objects.exclude(layer__in=layers).delete()
+        entries = [
+            LayerCatalog.objects.update_or_create(layer=layer, defaults=fields)[0]
+            for layer, fields in rows.items()
+        ]
+    bump_data_version(CATALOG)
+    return entries
+
+
+def serialize_entry(entry: LayerCatalog) -> dict:
+    schema, name = entry.layer.split(".", 1)
+    bounds = entry.bounds
+    return {
+        "id": entry.layer,
+        "schema": schema,
+        "name": name,
+        "geometrytype": entry.geometry_type,
+        "srid": entry.srid,
+        "bounds": bounds,
+        "center": (
+            [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, entry.min_zoom]
+            if bounds
+            else None
+        ),
+        "minzoom": entry.min_zoom,
+        "maxzoom": entry.max_zoom,
+        "feature_count": entry.feature_count,
+        "properties": entry.attributes,
+        "entity": (
+            {
+                "type": entry.entity_type,
+                "code": entry.entity_code,
+                "name": entry.entity_name,
+            }
+            if entry.entity_type
+            else None
+        ),
+        "computed_at": entry.computed_at.isoformat(),
+    }
+
+
+class CatalogPayloads:
+    """The serialized layer list and, per layer, its metadata and extent."""
+
+    def __init__(self, entries):
+        serialized = [serialize_entry(entry) for entry in entries]
+        self.index = JSONPayload.dump(serialized)
+        self.layers = {item["id"]: JSONPayload.dump(item) for item in serialized}
+        self.extents = {
+            item["id"]: JSONPayload.dump(
+                {"layer": item["id"], "extent": item["bounds"]}
+            )
+            for item in serialized
+        }
+
+
+_cached = VersionedCache("LAYER_CATALOG_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def get_layer_catalog() -> CatalogPayloads:
+    """
+    Returns the catalog for the current catalog version, serialized at most
+    once per cache lifetime.
+    """
+
+    return _cached.get(
+        f"layer-catalog:v{get_data_version(CATALOG)}",
+        lambda: CatalogPayloads(LayerCatalog.objects.all()),
+    )
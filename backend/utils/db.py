@@ -0,0 +1,38 @@
+"""Per-alias database connection statistics.
+
+Every new connection Django opens is counted per alias (see utils.signals), so
+a steadily climbing count under load means connections aren't being reused.
+When an alias uses psycopg's connection pool (OPTIONS["pool"]) the pool's own
+counters are reported as well.
+"""
+
+import threading
+from collections import Counter
+
+from django.db import connections
+
+_opened = Counter()
+_opened_lock = threading.Lock()
+
+
+def count_connection(sender, connection, **kwargs):
+    with _opened_lock:
+        _opened[connection.alias] += 1
+
+
+def connection_stats() -> dict:
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        settings_dict = connection.settings_dict
+        # Read the pool without creating it, unlike `connection.pool`.
+        pool = getattr(connection, "_connection_pools", {}).get(alias)
+        stats[alias] = {
+            "vendor": connection.vendor,
+            "conn_max_age": settings_dict.get("CONN_MAX_AGE"),
+            "health_checks": settings_dict.get("CONN_HEALTH_CHECKS"),
+            "pooled": bool(settings_dict.get("OPTIONS", {}).get("pool")),
+            "connections_opened": _opened[alias],
+            "pool": pool.get_stats() if pool is not None else None,
+        }
+    return stats
@@ -0,0 +1,161 @@
+"""Precomputed map-view entitlements.
+
+The hierarchy is indexed once per metadata version into name -> code maps, and
+each user's plans are expanded once into a set of entity ids such as
+("taluka", "4021"). District plans expand to their talukas but not to villages,
+a village is covered when it or one of its parents is in the set, so access
+checks are a handful of set lookups. A user's set is dropped from the cache
+whenever one of their Plan rows changes (see utils.signals). That only reaches
+other workers through a shared cache, with a per-process one the sets are kept
+for ENTITLEMENTS_LOCAL_CACHE_TIMEOUT seconds instead.
+"""
+
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import METADATA, cache_is_shared, get_data_version
+from .hierarchy import get_hierarchy_payload
+from .models import Plan
+
+DISTRICT = "district"
+TALUKA = "taluka"
+VILLAGE = "village"
+
+
+def normalize_name(name) -> str:
+    return " ".join(str(name).split()).casefold()
+
+
+class HierarchyIndex:
+    """Name -> code lookups and parent -> children expansion for the hierarchy."""
+
+    def __init__(self, tree):
+        self.district_codes = {}
+        self.taluka_codes = {}
+        self.village_codes = {}
+        self.district_taluka_codes = {}
+        self.district_children = {}
+        self.parents = {}
+        self.names = {}
+
+        for district in tree:
+            d_code = str(district["code"])
+            self.district_codes.setdefault(normalize_name(district["name"]), set()).add(
+                d_code
+            )
+            self.names[(DISTRICT, d_code)] = normalize_name(district["name"])
+            talukas = self.district_children.setdefault(d_code, set())
+            for taluka in district["talukas"]:
+                t_code = str(taluka["code"])
+                t_name = normalize_name(taluka["name"])
+                talukas.add(t_code)
+                self.taluka_codes.setdefault(t_name, set()).add(t_code)
+                self.district_taluka_codes[(d_code, t_name)] = t_code
+                self.parents[(TALUKA, t_code)] = (DISTRICT, d_code)
+                self.names[(TALUKA, t_code)] = t_name
+                for village in taluka["villages"]:
+                    v_code = str(village["code"])
+                    self.parents[(VILLAGE, v_code)] = (TALUKA, t_code)
+                    self.village_codes.setdefault(
+                        normalize_name(village["name"]), set()
+                    ).add(v_code)
+
+    def expand(self, entity_type, name):
+        """Returns the entity ids a plan on the named entity grants."""
+
+        name = normalize_name(name)
+        if entity_type == VILLAGE:
+            return {(VILLAGE, code) for code in self.village_codes.get(name, ())}
+        if entity_type == TALUKA:
+            return {(TALUKA, code) for code in self.taluka_codes.get(name, ())}
+        if entity_type == DISTRICT:
+            ids = set()
+            for d_code in self.district_codes.get(name, ()):
+                ids.add((DISTRICT, d_code))
+                ids.update((TALUKA, code) for code in self.district_children[d_code])
+            return ids
+        return set()
+
+    def lineage(self, entity):
+        """Yields the entity followed by its taluka and district."""
+
+        while entity is not None:
+            yield entity
+            entity = self.parents.get(entity)
+
+    def resolve_table(self, table):
+        """
+        Maps a tile table such as "jalgaon.parola_cadastrals" to the entity that
+        guards it, the taluka when it exists in that district, otherwise the
+        district. Returns None for tables that don't follow the naming scheme.
+        """
+
+        if "." not in table:
+            return None
+        schema, name = table.split(".", 1)
+        d_codes = self.district_codes.get(normalize_name(schema))
+        if not d_codes:
+            return None
+
+        taluka = normalize_name(name.rsplit("_", 1)[0])
+        for d_code in sorted(d_codes):
+            t_code = self.district_taluka_codes.get((d_code, taluka))
+            if t_code is not None:
+                return (TALUKA, t_code)
+        return (DISTRICT, min(d_codes))
+
+
+_index = {}
+_index_lock = threading.Lock()
+
+
+def get_hierarchy_index() -> HierarchyIndex:
+    payload = get_hierarchy_payload()
+    index = _index.get(payload.digest)
+    if index is None:
+        with _index_lock:
+            index = _index.get(payload.digest)
+            if index is None:
+                index = HierarchyIndex(payload.tree())
+                _index.clear()
+                _index[payload.digest] = index
+    return index
+
+
+def _entitlements_key(user_id):
+    return f"entitlements:v{get_data_version(METADATA)}:{user_id}"
+
+
+def get_user_entitlements(user) -> frozenset:
+    """Returns the set of entity ids the user's plans grant access to."""
+
+    key = _entitlements_key(user.pk)
+    entitlements = cache.get(key)
+    if entitlements is None:
+        index = get_hierarchy_index()
+        entitlements = set()
+        plans = Plan.objects.filter(user=user).values_list("plan_type", "entity_name")
+        for plan_type, entity_name in plans:
+            entitlements |= index.expand(plan_type.lower(), entity_name)
+        entitlements = frozenset(entitlements)
+        cache.set(key, entitlements, timeout=entitlements_timeout())
+    return entitlements
+
+
+def entitlements_timeout() -> int:
+    """How long a user's entitlements are cached, see the module docstring."""
+
+    if cache_is_shared():
+        return getattr(settings, "ENTITLEMENTS_CACHE_TIMEOUT", 24 * 60 * 60)
+    return getattr(settings, "ENTITLEMENTS_LOCAL_CACHE_TIMEOUT", 30)
+
+
+def has_entity_access(user, entity) -> bool:
+    entitlements = get_user_entitlements(user)
+    return any(e in entitlements for e in get_hierarchy_index().lineage(entity))
+
+
+def invalidate_user_entitlements(user_id):
+    cache.delete(_entitlements_key(user_id))
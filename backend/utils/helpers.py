@@ -1,103 +1,26 @@
 """Module containing helper functions for the backend."""
 
-from land_value.data_manager.all_manager.mh_all_manager import mh_all_manager
+from django.db import transaction
 
-from utils.models import Plan, ReportPlan
+from utils.models import ReportPlan, ReportTransaction
+from utils.entitlements import get_hierarchy_index, has_entity_access
+from utils.hierarchy import get_hierarchy_payload
 from django.db.models import Sum
-from django.db.models import Count, F
+from django.db.models import F
 
 def get_metadata_state():
-
-    mh_all_manager_obj = mh_all_manager()
-    entries = mh_all_manager_obj.get_active_metadata()
-
-    hierarchy = {}
-
-    for entry in entries:
-        d_code = entry[0]
-        d_name = entry[1]
-        t_code = entry[3]
-        t_name = entry[4]
-        v_code = entry[6]
-        v_name = entry[7]
-
-        district = hierarchy.setdefault(
-            d_code, {"code": d_code, "name": d_name, "talukas": {}}
-        )
-
-        taluka = district["talukas"].setdefault(
-            t_code, {"code": t_code, "name": t_name, "villages": []}
-        )
-
-        taluka["villages"].append({"code": v_code, "name": v_name})
-
-    result = []
-    for district in hierarchy.values():
-        talukas = list(district["talukas"].values())
-        for taluka in talukas:
-            taluka["villages"].sort(key=lambda v: v["name"])
-        talukas.sort(key=lambda t: t["name"])
-        result.append(
-            {"code": district["code"], "name": district["name"], "talukas": talukas}
-        )
-
-    result.sort(key=lambda d: d["name"])
-    return result
+    """Returns the district -> taluka -> village hierarchy for the active metadata."""
+    return get_hierarchy_payload().tree()
 
 
 def has_plan_access(user, table) -> bool:
     """Check if the user has access to the requested data."""
 
-    metadata = {d["name"]: d for d in get_metadata_state()}
-
-    district = table.split(".", 1)[0] if "." in table else None
-    taluka = None
-    layer = None
-    if district and "_" in district:
-        taluka = district.split("_")[0]
-        layer = district.split("_")[1]
-        district = None
-
-    args = {}
-    if district:
-        district = district.upper()
-        taluka = table.split(".")[1].split("_")[0]
-        if taluka in metadata[district]["talukas"]:
-            args = {"entity_type": "taluka", "entity_name": taluka}
-        else:
-            args = {"entity_type": "district", "entity_name": district}
-
-    plans = Plan.objects.filter(user=user)
-    if not plans.exists():
+    entity = get_hierarchy_index().resolve_table(table)
+    if entity is None:
         return False
 
-    village_accessible, talukas_accessible, districts_accessible = set(), set(), set()
-
-    for plan in plans:
-        entity_name = plan.entity_name
-        print(entity_name)
-        if plan.plan_type == "Village":
-            village_accessible.add(entity_name)
-        elif plan.plan_type == "Taluka":
-            talukas_accessible.add(entity_name)
-            for district in metadata.values():
-                for taluka in district["talukas"]:
-                    if taluka["name"] == entity_name:
-                        village_accessible.update(v["name"] for v in taluka["villages"])
-        elif plan.plan_type == "District":
-            districts_accessible.add(entity_name)
-            if entity_name in metadata:
-                for taluka in metadata[entity_name]["talukas"]:
-                    talukas_accessible.add(taluka["name"])
-                    village_accessible.update(v["name"] for v in taluka["villages"])
-
-    access_map = {
-        "village": village_accessible,
-        "taluka": talukas_accessible,
-        "district": districts_accessible,
-    }
-
-    return args["entity_name"] in access_map.get(args["entity_type"], set())
+    return has_entity_access(user, entity)
 
 
 def has_report_access(user, quantity=1):
@@ -130,12 +53,47 @@ def get_report_access_plan(user) -> ReportPlan | None:
     If no such plan exists, returns None.
     """
 
-    report_plans = ReportPlan.objects.filter(user=user).annotate(
-        used_transactions=Count("transactions")
-    ).filter(used_transactions__lt=F("quantity")).order_by("id")  # Order by ID for consistency
+    report_plans = ReportPlan.objects.filter(
+        user=user, used_count__lt=F("quantity")
+    ).order_by("id")  # Order by ID for consistency
 
     return report_plans.first()
 
+
+def reserve_reports(user, reports) -> list[ReportTransaction] | None:
+    """
+    Reserves one report per entry in `reports` (ReportTransaction field values),
+    spreading them over the user's plans in order. Either every report is reserved
+    or none is, returns None when the plans don't have enough quota left.
+    """
+
+    reports = list(reports)
+    with transaction.atomic():
+        plans = ReportPlan.objects.filter(
+            user=user, used_count__lt=F("quantity")
+        ).order_by("id")
+
+        reserved = []
+        for plan in plans:
+            wanted = reports[len(reserved) :]
+            if not wanted:
+                break
+            # A plan drained by a concurrent request in the meantime is skipped.
+            count = min(len(wanted), plan.quantity - plan.used_count)
+            if ReportPlan.reserve(plan.id, count):
+                reserved.extend(
+                    ReportTransaction(report_plan=plan, **values)
+                    for values in wanted[:count]
+                )
+
+        if len(reserved) < len(reports):
+            transaction.set_rollback(True)
+            return None
+
+        # Quota is already taken, bulk_create skips ReportTransaction.save.
+        return ReportTransaction.objects.bulk_create(reserved)
+
+
 if __name__ == "__main__":
 
     user = "random"
@@ -0,0 +1,66 @@
+"""Cached, pre-serialized district -> taluka -> village hierarchy."""
+
+from .cache import METADATA, JSONPayload, VersionedCache, get_data_version
+from .pool import mh_manager
+
+
+class HierarchyPayload(JSONPayload):
+    """The serialized hierarchy, see JSONPayload."""
+
+    def tree(self):
+        return self.data()
+
+
+def build_hierarchy():
+    """Builds the hierarchy from land_value's active metadata."""
+
+    with mh_manager() as mh_all_manager_obj:
+        entries = mh_all_manager_obj.get_active_metadata()
+
+    hierarchy = {}
+
+    for entry in entries:
+        d_code = entry[0]
+        d_name = entry[1]
+        t_code = entry[3]
+        t_name = entry[4]
+        v_code = entry[6]
+        v_name = entry[7]
+
+        district = hierarchy.setdefault(
+            d_code, {"code": d_code, "name": d_name, "talukas": {}}
+        )
+
+        taluka = district["talukas"].setdefault(
+            t_code, {"code": t_code, "name": t_name, "villages": []}
+        )
+
+        taluka["villages"].append({"code": v_code, "name": v_name})
+
+    result = []
+    for district in hierarchy.values():
+        talukas = list(district["talukas"].values())
+        for taluka in talukas:
+            taluka["villages"].sort(key=lambda v: v["name"])
+        talukas.sort(key=lambda t: t["name"])
+        result.append(
+            {"code": district["code"], "name": district["name"], "talukas": talukas}
+        )
+
+    result.sort(key=lambda d: d["name"])
+    return result
+
+
+_cached = VersionedCache("HIERARCHY_CACHE_TIMEOUT")
+
+
+def get_hierarchy_payload() -> HierarchyPayload:
+    """
+    Returns the hierarchy for the current metadata version, building it at most
+    once per cache lifetime.
+    """
+
+    return _cached.get(
+        f"maharashtra-hierarchy:v{get_data_version(METADATA)}",
+        lambda: HierarchyPayload.dump(build_hierarchy()),
+    )
@@ -0,0 +1,100 @@
+import timeit
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from base.renderers import ORJSONRenderer, orjson
+
+
+def preview_payload(rows):
+    """Rows shaped like the khata-preview and report-info responses."""
+    return [
+        {
+            "khata_no": str(i // 3),
+            "village_name": "Mohadi",
+            "owner_names": "Patil Ramesh Shankar, Patil Sunita Ramesh",
+            "district": "Jalgaon",
+            "taluka": "Parola",
+            "plot_id": str(uuid.uuid4()),
+            "gat_no": f"{i}/1",
+            "survey_no": str(i),
+        }
+        for i in range(rows)
+    ]
+
+
+def transaction_payload(rows):
+    """Rows with the UUID, datetime and Decimal values model serializers produce."""
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": uuid.uuid4(),
+            "created_at": now,
+            "amount": Decimal("499.00"),
+            "khata_no": str(i),
+        }
+        for i in range(rows)
+    ]
+
+
+def hierarchy_payload(villages):
+    return [
+        {
+            "code": str(d),
+            "name": f"District {d}",
+            "talukas": [
+                {
+                    "code": f"{d}{t}",
+                    "name": f"Taluka {t}",
+                    "villages": [
+                        {"code": f"{d}{t}{v}", "name": f"Village {v}"}
+                        for v in range(villages // 100)
+                    ],
+                }
+                for t in range(10)
+            ],
+        }
+        for d in range(10)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compares JSONRenderer and ORJSONRenderer on list-heavy response payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write("orjson is not installed, nothing to compare.")
+            return
+
+        rows = options["rows"]
+        repeat = options["repeat"]
+        renderers = [("json", JSONRenderer()), ("orjson", ORJSONRenderer())]
+        payloads = [
+            ("khata preview", preview_payload(rows)),
+            ("transactions", transaction_payload(rows)),
+            ("hierarchy", hierarchy_payload(rows)),
+        ]
+
+        for name, payload in payloads:
+            timings = {}
+            for label, renderer in renderers:
+                timings[label] = (
+                    min(
+                        timeit.repeat(
+                            lambda: renderer.render(payload), number=1, repeat=repeat
+                        )
+                    )
+                    * 1000
+                )
+            self.stdout.write(
+                f"{name} ({rows} rows): json {timings['json']:.2f} ms, "
+                f"orjson {timings['orjson']:.2f} ms, "
+                f"{timings['json'] / timings['orjson']:.1f}x faster"
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.catalog import build_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes the layer catalog (bounds, zooms, feature counts, attributes and "
+        "entitlement entity) of the cadastral tile layers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "layers", nargs="*", help="Defaults to every layer in external_db"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            entries = build_catalog(options["layers"] or None, log=self.stdout.write)
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(f"{len(entries)} layers catalogued")
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.entitlements import normalize_name
+from utils.hierarchy import get_hierarchy_payload
+from utils.owners import build_owner_index, save_owner_index
+
+
+class Command(BaseCommand):
+    help = "Builds the owner-name search index of each district into OWNER_INDEX_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "districts", nargs="*", help="Defaults to every district in the hierarchy"
+        )
+
+    def handle(self, *args, **options):
+        known = {
+            normalize_name(d["name"]): d["name"] for d in get_hierarchy_payload().tree()
+        }
+        districts = options["districts"] or list(known.values())
+        unknown = [d for d in districts if normalize_name(d) not in known]
+        if unknown:
+            raise CommandError(f"Unknown districts: {', '.join(unknown)}")
+
+        for district in districts:
+            started = time.monotonic()
+            index = build_owner_index(district)
+            path = save_owner_index(district, index)
+            self.stdout.write(
+                f"{known[normalize_name(district)]}: {len(index.names)} owners, "
+                f"{len(index.plots)} plots written to {path} "
+                f"in {time.monotonic() - started:.0f}s"
+            )
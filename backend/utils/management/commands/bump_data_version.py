@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from utils.cache import DATA_VERSIONS, bump_data_version
+
+
+class Command(BaseCommand):
+    help = "Invalidates cached structures built from land_value data after a refresh."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="+", choices=DATA_VERSIONS)
+
+    def handle(self, *args, **options):
+        for name in options["names"]:
+            version = bump_data_version(name)
+            self.stdout.write(f"{name}: now at version {version}")
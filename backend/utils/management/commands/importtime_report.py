@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+# Modules that must not be imported while a worker boots, they are loaded
+# lazily by the code paths that need them.
+HEAVY_MODULES = (
+    "ai4bharat",
+    "geopandas",
+    "land_value",
+    "numpy",
+    "pandas",
+    "scipy",
+    "shapely",
+    "terra_utils",
+    "torch",
+)
+
+
+def measure_imports(module="base.urls"):
+    """
+    Imports `module` after django.setup() in a fresh interpreter under
+    `python -X importtime` and returns (name, self_us, cumulative_us, depth)
+    per module, depth 0 being a top level import.
+    """
+
+    code = f"import django; django.setup(); import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+        check=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def heavy_imports(imports):
+    """Returns the HEAVY_MODULES packages that were imported."""
+    packages = {name.split(".")[0] for name, *_ in imports}
+    return sorted(packages.intersection(HEAVY_MODULES))
+
+
+class Command(BaseCommand):
+    help = "Reports the slowest imports of a worker boot (python -X importtime)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", default="base.urls")
+        parser.add_argument("--top", type=int, default=20)
+
+    def handle(self, *args, **options):
+        imports = measure_imports(options["module"])
+        total = sum(cumulative for _, _, cumulative, depth in imports if not depth)
+        self.stdout.write(f"{len(imports)} modules, {total / 1000:.1f} ms")
+        for name, self_us, cumulative_us, _ in sorted(
+            imports, key=lambda i: i[1], reverse=True
+        )[: options["top"]]:
+            self.stdout.write(
+                f"{self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}"
+            )
+
+        heavy = heavy_imports(imports)
+        if heavy:
+            self.stderr.write("Heavy modules imported at boot: " + ", ".join(heavy))
@@ -0,0 +1,27 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.tiles import purge_tile_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Drops the tile proxy's cached tiles of the given layers after a data refresh."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("layers", nargs="+", help="e.g. jalgaon.parola_cadastrals")
+
+    def handle(self, *args, **options):
+        failed = []
+        for layer in options["layers"]:
+            try:
+                generation = purge_tile_cache(layer)
+            except (ValueError, requests.RequestException) as e:
+                self.stderr.write(f"{layer}: {e}")
+                failed.append(layer)
+                continue
+            self.stdout.write(f"{layer}: now at generation {generation}")
+
+        if failed:
+            raise CommandError(f"Could not purge {', '.join(failed)}")
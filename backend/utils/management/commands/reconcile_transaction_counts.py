@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from utils.models import Plan, ReportPlan, ReportTransaction, Transaction
+
+
+class Command(BaseCommand):
+    help = "Recomputes Plan.used_count and ReportPlan.used_count from the transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report plans whose counter has drifted.",
+        )
+
+    def handle(self, *args, **options):
+        for model, transaction_model, fk in [
+            (Plan, Transaction, "plan"),
+            (ReportPlan, ReportTransaction, "report_plan"),
+        ]:
+            counts = (
+                transaction_model.objects.filter(**{fk: OuterRef("pk")})
+                .order_by()
+                .values(fk)
+                .annotate(n=Count("pk"))
+                .values("n")
+            )
+            drifted = (
+                model.objects.annotate(actual=Coalesce(Subquery(counts), 0))
+                .exclude(used_count=F("actual"))
+                .values_list("pk", "used_count", "actual")
+            )
+            for pk, used_count, actual in drifted:
+                self.stdout.write(
+                    f"{model.__name__} {pk}: used_count {used_count}, actual {actual}"
+                )
+                if not options["dry_run"]:
+                    model.objects.filter(pk=pk).update(used_count=actual)
@@ -0,0 +1,112 @@
+import json
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from utils.mbtiles import (
+    MBTilesWriter,
+    archive_path,
+    describe_layer,
+    render_tile,
+    tiles_in_bounds,
+)
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _render(task):
+    description, z, x, y = task
+    return z, x, y, render_tile(description, z, x, y)
+
+
+class Command(BaseCommand):
+    help = "Pre-renders a cadastral layer's vector tiles into an MBTiles archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("layer", help="e.g. jalgaon.parola_cadastrals")
+        parser.add_argument("--min-zoom", type=int, default=10)
+        parser.add_argument("--max-zoom", type=int, default=16)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--output", help="Defaults to MBTILES_ROOT/<layer>.mbtiles")
+
+    def handle(self, *args, **options):
+        layer = options["layer"]
+        zooms = range(options["min_zoom"], options["max_zoom"] + 1)
+        if not zooms:
+            raise CommandError("--max-zoom is below --min-zoom")
+
+        try:
+            description = describe_layer(layer)
+        except ValueError as e:
+            raise CommandError(e)
+        if description["bounds"] is None:
+            raise CommandError(f"{layer} has no geometries")
+
+        tasks = [
+            (description, *tile)
+            for tile in tiles_in_bounds(description["bounds"], zooms)
+        ]
+        self.stdout.write(
+            f"{layer}: rendering {len(tasks)} tiles, zoom {zooms[0]}-{zooms[-1]}"
+        )
+
+        writer = MBTilesWriter(options["output"] or archive_path(layer))
+        started = time.monotonic()
+        try:
+            if options["workers"] > 1:
+                # Workers open their own database connections.
+                connections.close_all()
+                with multiprocessing.Pool(options["workers"], _init_worker) as pool:
+                    self._write(
+                        writer,
+                        pool.imap_unordered(_render, tasks, chunksize=16),
+                        len(tasks),
+                    )
+            else:
+                self._write(writer, map(_render, tasks), len(tasks))
+        except BaseException:
+            writer.abort()
+            raise
+
+        west, south, east, north = description["bounds"]
+        writer.finish(
+            {
+                "name": layer,
+                "format": "pbf",
+                "type": "overlay",
+                "minzoom": zooms[0],
+                "maxzoom": zooms[-1],
+                "bounds": f"{west},{south},{east},{north}",
+                "center": f"{(west + east) / 2},{(south + north) / 2},{zooms[0]}",
+                "json": json.dumps(
+                    {
+                        "vector_layers": [
+                            {
+                                "id": layer,
+                                "fields": {c: "" for c in description["columns"]},
+                                "minzoom": zooms[0],
+                                "maxzoom": zooms[-1],
+                            }
+                        ]
+                    }
+                ),
+            }
+        )
+        self.stdout.write(
+            f"{layer}: {writer.count} non-empty tiles written to {writer.path} "
+            f"in {time.monotonic() - started:.0f}s"
+        )
+
+    def _write(self, writer, results, total):
+        for done, (z, x, y, data) in enumerate(results, 1):
+            if data:
+                writer.add(z, x, y, data)
+            if done % 10000 == 0:
+                self.stdout.write(f"{done}/{total} tiles")
@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.reports import pending_job_ids, requeue_stale_jobs, run_report_job
+
+
+class Command(BaseCommand):
+    help = "Renders queued report jobs, for jobs the web workers didn't get to."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "REPORT_JOB_WORKERS", 2),
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=2.0, help="In seconds."
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=15,
+            help="Minutes after which a running job is assumed dead and requeued.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue once and exit."
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options["stale_after"])
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                requeued = requeue_stale_jobs(stale_after)
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+                job_ids = pending_job_ids(limit=options["workers"] * 4)
+                done = sum(executor.map(run_report_job, job_ids))
+                if done:
+                    self.stdout.write(f"Rendered {done} job(s)")
+
+                if options["once"] and not job_ids:
+                    return
+                if not job_ids:
+                    time.sleep(options["poll_interval"])
@@ -0,0 +1,225 @@
+"""Pre-rendered vector tile archives (MBTiles) of the static cadastral layers.
+
+`manage.py render_mbtiles <layer>` renders a layer's tiles with ST_AsMVT, the
+way pg_tileserv would, into MBTILES_ROOT/<layer>.mbtiles. The tiles view then
+answers those layers from the archive. SQLite reads it through memory-mapped
+I/O (MBTILES_MMAP_SIZE), so a tile is an index lookup plus a page read and
+Postgres isn't involved at all. Re-rendering replaces the archive atomically,
+readers switch over on their next tile.
+"""
+
+import gzip
+import math
+import os
+import sqlite3
+import threading
+import urllib.parse
+
+from django.conf import settings
+from django.db import connections
+
+from .spatial import LAYER_RE, _config
+
+MAX_LATITUDE = 85.0511287798066
+EXTENT = 4096
+BUFFER = 256
+
+SCHEMA = """
+CREATE TABLE metadata (name TEXT, value TEXT);
+CREATE TABLE tiles (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB
+);
+CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+"""
+
+
+def lnglat_to_tile(lng, lat, z):
+    """Returns the (x, y) of the XYZ tile containing the point at zoom `z`."""
+
+    n = 2**z
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bounds(bounds, zooms):
+    """Yields the (z, x, y) tiles covering (west, south, east, north)."""
+
+    west, south, east, north = bounds
+    for z in zooms:
+        x0, y0 = lnglat_to_tile(west, north, z)
+        x1, y1 = lnglat_to_tile(east, south, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def archive_path(layer):
+    return os.path.join(settings.MBTILES_ROOT, f"{layer}.mbtiles")
+
+
+def describe_layer(layer) -> dict:
+    """Reads what rendering needs to know about a layer from external_db."""
+
+    if not LAYER_RE.match(layer):
+        raise ValueError(f"Invalid cadastral layer {layer!r}")
+
+    schema, table = layer.split(".")
+    geometry = _config()["GEOMETRY_COLUMN"]
+    connection = connections["external_db"]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = %s AND table_name = %s AND column_name <> %s "
+            "ORDER BY ordinal_position",
+            [schema, table, geometry],
+        )
+        columns = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT Find_SRID(%s, %s, %s)", [schema, table, geometry])
+        srid = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e) FROM ("
+            f"SELECT ST_Extent(ST_Transform({quote(geometry)}, 4326)) AS e "
+            f"FROM {quote(schema)}.{quote(table)}) extent"
+        )
+        bounds = cursor.fetchone()
+
+    return {
+        "layer": layer,
+        "columns": columns,
+        "geometry": geometry,
+        "srid": srid,
+        "bounds": None if bounds[0] is None else tuple(bounds),
+    }
+
+
+def render_tile(description, z, x, y) -> bytes:
+    """Returns the gzipped MVT of one tile, empty bytes when it has no plots."""
+
+    quote = connections["external_db"].ops.quote_name
+    columns = "".join(f"t.{quote(c)}, " for c in description["columns"])
+    geometry = f"t.{quote(description['geometry'])}"
+    table = ".".join(quote(part) for part in description["layer"].split("."))
+    sql = (
+        "WITH bounds AS (SELECT ST_TileEnvelope(%s, %s, %s) AS geom) "
+        "SELECT ST_AsMVT(tile, %s, %s, 'mvt_geom') FROM ("
+        f"SELECT {columns}ST_AsMVTGeom(ST_Transform({geometry}, 3857), "
+        "bounds.geom, %s, %s, true) AS mvt_geom "
+        f"FROM {table} t, bounds "
+        f"WHERE {geometry} && ST_Transform(bounds.geom, %s)"
+        ") tile WHERE mvt_geom IS NOT NULL"
+    )
+    params = [z, x, y, description["layer"], EXTENT, EXTENT, BUFFER]
+    with connections["external_db"].cursor() as cursor:
+        cursor.execute(sql, params + [description["srid"]])
+        data = bytes(cursor.fetchone()[0] or b"")
+    return gzip.compress(data) if data else b""
+
+
+class MBTilesWriter:
+    """Writes an archive next to `path` and moves it into place on `finish`."""
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.db = sqlite3.connect(self.temp_path)
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.executescript(SCHEMA)
+        self.count = 0
+
+    def add(self, z, x, y, data):
+        # MBTiles rows count from the bottom (TMS), XYZ tiles from the top.
+        self.db.execute(
+            "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)",
+            (z, x, 2**z - 1 - y, data),
+        )
+        self.count += 1
+
+    def finish(self, metadata):
+        self.db.executemany(
+            "INSERT INTO metadata VALUES (?, ?)",
+            [(name, str(value)) for name, value in metadata.items()],
+        )
+        self.db.commit()
+        self.db.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.db.close()
+        os.remove(self.temp_path)
+
+
+class MBTilesArchive:
+    """Read-only, memory-mapped access to an archive, one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        stat = os.stat(path)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            uri = f"file:{urllib.parse.quote(self.path)}?mode=ro&immutable=1"
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            mmap_size = getattr(settings, "MBTILES_MMAP_SIZE", 256 * 1024**2)
+            connection.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+            self._local.connection = connection
+        return connection
+
+    def tile(self, z, x, y):
+        """Returns the stored (gzipped) tile, None when the archive has no such tile."""
+
+        row = (
+            self._connection()
+            .execute(
+                "SELECT tile_data FROM tiles "
+                "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, 2**z - 1 - y),
+            )
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def metadata(self) -> dict:
+        return dict(self._connection().execute("SELECT name, value FROM metadata"))
+
+
+def archived_layers() -> list[str]:
+    """The layers that have been rendered to an archive."""
+
+    try:
+        names = os.listdir(settings.MBTILES_ROOT)
+    except FileNotFoundError:
+        return []
+    layers = (name[: -len(".mbtiles")] for name in names if name.endswith(".mbtiles"))
+    return sorted(layer for layer in layers if LAYER_RE.match(layer))
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(layer):
+    """Returns the archive of `layer`, or None if it hasn't been rendered."""
+
+    if not LAYER_RE.match(layer):
+        return None
+    path = archive_path(layer)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    archive = _archives.get(layer)
+    if archive is None or archive.identity != (stat.st_ino, stat.st_mtime_ns):
+        with _archives_lock:
+            archive = _archives[layer] = MBTilesArchive(path)
+    return archive
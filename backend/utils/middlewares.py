@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .routers import begin_request, end_request, primary_key
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets utils.routers.MultiDBRouter send a request's reads to the read
+    replicas. Unsafe methods read from the primaries. After a request that
+    wrote, the client (by cookie) and the user (by a cache flag checked when
+    the token is authenticated) stay on the primaries for
+    DATABASE_PRIMARY_STICKY_SECONDS, so they read their own writes despite
+    replication lag.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cookie = getattr(settings, "DATABASE_PRIMARY_COOKIE", "db_primary")
+        self.sticky_seconds = getattr(settings, "DATABASE_PRIMARY_STICKY_SECONDS", 5)
+
+    def __call__(self, request):
+        pinned = request.method not in SAFE_METHODS or self.cookie in request.COOKIES
+        token = begin_request(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = end_request(token)
+
+        if state.wrote and self.sticky_seconds:
+            if state.user_id is not None:
+                cache.set(primary_key(state.user_id), 1, timeout=self.sticky_seconds)
+            response.set_cookie(
+                self.cookie,
+                "1",
+                max_age=self.sticky_seconds,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
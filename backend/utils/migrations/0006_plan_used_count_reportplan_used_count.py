@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 00:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_used_count(apps, schema_editor):
+    for model_name, transaction_name, fk in [
+        ("Plan", "Transaction", "plan"),
+        ("ReportPlan", "ReportTransaction", "report_plan"),
+    ]:
+        Model = apps.get_model("utils", model_name)
+        Transaction = apps.get_model("utils", transaction_name)
+        counts = (
+            Transaction.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        Model.objects.update(used_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("utils", "0005_reportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plan",
+            name="used_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="reportplan",
+            name="used_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_used_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("utils", "0006_plan_used_count_reportplan_used_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LayerCatalog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("layer", models.CharField(max_length=255, unique=True)),
+                ("geometry_type", models.CharField(blank=True, max_length=50)),
+                ("srid", models.IntegerField(blank=True, null=True)),
+                ("west", models.FloatField(blank=True, null=True)),
+                ("south", models.FloatField(blank=True, null=True)),
+                ("east", models.FloatField(blank=True, null=True)),
+                ("north", models.FloatField(blank=True, null=True)),
+                ("min_zoom", models.PositiveSmallIntegerField(default=0)),
+                ("max_zoom", models.PositiveSmallIntegerField(default=22)),
+                ("feature_count", models.PositiveIntegerField(default=0)),
+                ("attributes", models.JSONField(default=list)),
+                ("entity_type", models.CharField(blank=True, max_length=20, null=True)),
+                ("entity_code", models.CharField(blank=True, max_length=20, null=True)),
+                (
+                    "entity_name",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["layer"],
+            },
+        ),
+    ]
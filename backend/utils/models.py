@@ -2,7 +2,8 @@ import uuid
 
 from datetime import timedelta
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
 PLAN_TYPE = [
     ("Village", "Village"),
@@ -21,6 +22,19 @@ ALLOWED_TRANSACTIONS = {
 }
 
 
+def _without_counters(instance, update_fields):
+    """
+    The fields an update of `instance` writes. used_count is left out, it only
+    changes through F() updates (ReportPlan.reserve and utils.signals) and a
+    stale instance would otherwise write back the count it loaded.
+    """
+    if update_fields is None:
+        update_fields = [
+            f.name for f in instance._meta.concrete_fields if not f.primary_key
+        ]
+    return [name for name in update_fields if name != "used_count"]
+
+
 class Plan(models.Model):
     """Model for Plans"""
 
@@ -41,13 +55,23 @@ class Plan(models.Model):
 
     duration = models.IntegerField(null=False, blank=False, default=12)  # in months
     is_paid = models.BooleanField(default=False)
+    # Kept in step with the transactions by utils.signals, see
+    # `manage.py reconcile_transaction_counts` to repair drift.
+    used_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = _without_counters(
+                self, kwargs.get("update_fields")
+            )
+        super().save(*args, **kwargs)
 
     @property
     def total_transactions(self) -> int:
         """
         Returns the total number of transactions associated with this user.
         """
-        return self._get_transaction_count()
+        return self.used_count
 
     def _get_transaction_count(self) -> int:
         """
@@ -93,6 +117,8 @@ class ReportPlan(models.Model):
     quantity = models.IntegerField(null=False, blank=False, default=0)
     duration = models.IntegerField(null=False, blank=False, default=12)  # in months
     is_paid = models.BooleanField(default=False)
+    # Incremented by ReportPlan.reserve, decremented by utils.signals on delete.
+    used_count = models.PositiveIntegerField(default=0, editable=False)
 
     @property
     def valid_till(self):
@@ -112,12 +138,31 @@ class ReportPlan(models.Model):
             and self.is_paid
         )
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = _without_counters(
+                self, kwargs.get("update_fields")
+            )
+        super().save(*args, **kwargs)
+
     @property
     def total_transactions(self):
         """
         Returns the total number of transactions associated with this user.
         """
-        return self._get_transaction_count()
+        return self.used_count
+
+    @classmethod
+    def reserve(cls, plan_id, count=1) -> bool:
+        """
+        Takes `count` reports from the plan's quota in a single conditional
+        UPDATE, returns False and changes nothing if not enough are left.
+        """
+        return bool(
+            cls.objects.filter(
+                pk=plan_id, used_count__lte=F("quantity") - count
+            ).update(used_count=F("used_count") + count)
+        )
 
     def _get_transaction_count(self):
         """
@@ -151,18 +196,18 @@ class ReportTransaction(models.Model):
         """
         Override the save method to enforce transaction limits based on the user's plan.
         """
-        report_plan = ReportPlan.objects.get(id=self.report_plan.id)
-        total_transactions = report_plan.transactions.count()
-
-        # Check if the number of transactions exceeds the allowed limit for the plan
-        if total_transactions >= report_plan.quantity:
-            raise ValueError(
-                f"You have exceeded the allowed transactions for the report plan. "
-                f"Allowed: {report_plan.quantity}, Used: {total_transactions}."
-            )
-
-        # Call the original save method if validation passes
-        super().save(*args, **kwargs)
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        # The reservation is undone with the insert if the latter fails.
+        with transaction.atomic():
+            if not ReportPlan.reserve(self.report_plan_id):
+                report_plan = ReportPlan.objects.get(id=self.report_plan_id)
+                raise ValueError(
+                    f"You have exceeded the allowed transactions for the report plan. "
+                    f"Allowed: {report_plan.quantity}, Used: {report_plan.used_count}."
+                )
+            super().save(*args, **kwargs)
 
     @property
     def user(self):
@@ -221,6 +266,105 @@ class Transaction(models.Model):
         ordering = ["created_at"]
 
 
+class ReportJobStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    RUNNING = "RUNNING", "Running"
+    COMPLETED = "COMPLETED", "Completed"
+    FAILED = "FAILED", "Failed"
+
+
+class ReportJob(models.Model):
+    """A PDF report rendered in the background, see utils.reports."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    user = models.ForeignKey(
+        to="user_auth.CustomUser",
+        related_name="report_jobs",
+        on_delete=models.CASCADE,
+        db_index=True,
+    )
+    report_transaction = models.OneToOneField(
+        to="utils.ReportTransaction",
+        related_name="job",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    plot_id = models.CharField(max_length=100)
+    khata_no = models.CharField(max_length=100, null=True, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=ReportJobStatus.choices,
+        default=ReportJobStatus.PENDING,
+        db_index=True,
+    )
+    file_path = models.CharField(max_length=500, null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.status in (ReportJobStatus.COMPLETED, ReportJobStatus.FAILED)
+
+    def __str__(self):
+        return f"Report job {self.plot_id} - {self.get_status_display()}"
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class DataVersion(models.Model):
+    """Version counter of a data set, see utils.cache."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class LayerCatalog(models.Model):
+    """
+    What the map needs to know about a cadastral tile layer, computed by
+    `manage.py build_layer_catalog` and served by utils.catalog.
+    """
+
+    # e.g. jalgaon.parola_cadastrals
+    layer = models.CharField(max_length=255, unique=True)
+    geometry_type = models.CharField(max_length=50, blank=True)
+    srid = models.IntegerField(null=True, blank=True)
+    # Bounds in EPSG:4326, null for layers without geometries.
+    west = models.FloatField(null=True, blank=True)
+    south = models.FloatField(null=True, blank=True)
+    east = models.FloatField(null=True, blank=True)
+    north = models.FloatField(null=True, blank=True)
+    min_zoom = models.PositiveSmallIntegerField(default=0)
+    max_zoom = models.PositiveSmallIntegerField(default=22)
+    feature_count = models.PositiveIntegerField(default=0)
+    attributes = models.JSONField(default=list)  # [{"name": ..., "type": ...}]
+    # The entity that guards the layer, see HierarchyIndex.resolve_table.
+    entity_type = models.CharField(max_length=20, null=True, blank=True)
+    entity_code = models.CharField(max_length=20, null=True, blank=True)
+    entity_name = models.CharField(max_length=100, null=True, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def bounds(self):
+        if self.west is None:
+            return None
+        return [self.west, self.south, self.east, self.north]
+
+    def __str__(self):
+        return self.layer
+
+    class Meta:
+        ordering = ["layer"]
+
+
 class MaharashtraMetadata(models.Model):
     ogc_fid = models.AutoField(primary_key=True)
     sid = models.IntegerField()
@@ -0,0 +1,271 @@
+"""Owner-name search over the plots of a district, taluka or village.
+
+`manage.py build_owner_index` builds one index per district from the villages'
+preview indexes (utils.villages) and stores it in OWNER_INDEX_ROOT: every
+distinct owner name gets one or more search keys (the name itself and, when
+ai4bharat-transliteration is installed, its Marathi transliteration) and each
+key is broken into trigrams in an inverted index. A query is scored by the
+share of its trigrams a key contains, so "ramesh pati" finds
+"Patil Ramesh Shankar" and "रमेश" finds it through the Marathi key. The index
+carries the plots' identifiers, so searches never touch the village indexes,
+and requests only load prebuilt indexes. Rebuilding replaces a district's
+index atomically, readers switch over on their next search.
+"""
+
+import hashlib
+import heapq
+import os
+import pickle
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+from .entitlements import normalize_name
+from .hierarchy import get_hierarchy_payload
+from .villages import COLUMNS, get_village_index
+
+_SEPARATORS = re.compile(r"[\s,.;:/()\-]+")
+
+
+def normalize_owner_name(name) -> str:
+    return " ".join(w for w in _SEPARATORS.split(str(name).casefold()) if w)
+
+
+def trigrams(text) -> set[str]:
+    """pg_trgm style trigrams, each word padded with two spaces in front and one behind."""
+
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+_transliterator = None
+_transliterator_lock = threading.Lock()
+
+
+def get_transliterator():
+    """Returns an English -> Marathi XlitEngine, or None when it's disabled or missing."""
+
+    global _transliterator
+    if not getattr(settings, "OWNER_SEARCH_TRANSLITERATE", True):
+        return None
+    if _transliterator is None:
+        with _transliterator_lock:
+            if _transliterator is None:
+                try:
+                    from ai4bharat.transliteration import XlitEngine
+
+                    _transliterator = XlitEngine("mr", beam_width=4, rescore=False)
+                except Exception as e:
+                    print(f"[ERROR]: Transliteration unavailable: {e}")
+                    _transliterator = False
+    return _transliterator or None
+
+
+class OwnerSearchIndex:
+    def __init__(self, villages, transliterate=None):
+        """
+        `villages` yields ((district, taluka, village), VillageIndex) pairs,
+        `transliterate` maps an English word to its Marathi spelling.
+        """
+
+        self.villages = []
+        # The COLUMNS values of every plot with an owner, and its village position.
+        self.plots = []
+        self.plot_villages = array("I")
+        self.names = []
+        # Per name, the plots it owns.
+        self.hits = []
+        # Per search key, the name it belongs to and its trigram count.
+        self.key_names = array("I")
+        self.key_sizes = array("H")
+        self.trigrams = {}
+
+        name_ids = {}
+        for position, (location, index) in enumerate(villages):
+            self.villages.append(location)
+            for row, owner in enumerate(index.owners):
+                name = index.owner_names[owner]
+                if not name:
+                    continue
+                name_id = name_ids.get(name)
+                if name_id is None:
+                    name_id = name_ids[name] = len(self.names)
+                    self.names.append(name)
+                    self.hits.append(array("I"))
+                    self._add_keys(name_id, name, transliterate)
+                self.hits[name_id].append(len(self.plots))
+                self.plots.append(
+                    tuple(index.columns[column][row] for column in COLUMNS)
+                )
+                self.plot_villages.append(position)
+
+    def _add_keys(self, name_id, name, transliterate):
+        key = normalize_owner_name(name)
+        keys = {key}
+        if transliterate is not None:
+            keys.add(" ".join(transliterate(word) for word in key.split()))
+
+        for key in keys:
+            grams = trigrams(key)
+            if not grams:
+                continue
+            key_id = len(self.key_names)
+            self.key_names.append(name_id)
+            self.key_sizes.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                self.trigrams.setdefault(gram, array("I")).append(key_id)
+
+    def scope(self, taluka=None, village=None):
+        """The positions of the villages in `taluka` (and `village`), None for all."""
+
+        if not taluka:
+            return None
+        wanted = (normalize_name(taluka), normalize_name(village) if village else None)
+        return {
+            position
+            for position, (_, t_name, v_name) in enumerate(self.villages)
+            if normalize_name(t_name) == wanted[0]
+            and (wanted[1] is None or normalize_name(v_name) == wanted[1])
+        }
+
+    def search(self, query, limit=20, min_score=0.6, taluka=None, village=None):
+        """
+        Returns up to `limit` (name, score, [(location, plot), ...]) matches, best
+        first, among the plots of `taluka` (and `village`) when given. The score
+        is the share of the query's trigrams found in the name, ties go to the
+        closer (shorter) name. A plot is a dict of its COLUMNS values.
+        """
+
+        grams = trigrams(normalize_owner_name(query))
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigrams.get(gram, ()))
+
+        within = self.scope(taluka, village)
+        best = {}
+        for key_id, count in shared.items():
+            score = count / len(grams)
+            if score < min_score:
+                continue
+            closeness = count / (len(grams) + self.key_sizes[key_id] - count)
+            name_id = self.key_names[key_id]
+            best[name_id] = max(best.get(name_id, (0, 0)), (score, closeness))
+
+        matches = []
+        for name_id, (score, _) in sorted(
+            best.items(), key=lambda item: item[1], reverse=True
+        ):
+            plots = [
+                (
+                    self.villages[self.plot_villages[plot]],
+                    dict(zip(COLUMNS, self.plots[plot])),
+                )
+                for plot in self.hits[name_id]
+                if within is None or self.plot_villages[plot] in within
+            ]
+            if plots:
+                matches.append((self.names[name_id], round(score, 3), plots))
+                if len(matches) == limit:
+                    break
+        return matches
+
+
+def scope_villages(district, taluka=None, village=None):
+    """Returns the (district, taluka, village) names the scope covers."""
+
+    wanted = [normalize_name(n) if n else None for n in (district, taluka, village)]
+    found = []
+    for d in get_hierarchy_payload().tree():
+        if normalize_name(d["name"]) != wanted[0]:
+            continue
+        for t in d["talukas"]:
+            if wanted[1] and normalize_name(t["name"]) != wanted[1]:
+                continue
+            for v in t["villages"]:
+                if wanted[2] and normalize_name(v["name"]) != wanted[2]:
+                    continue
+                found.append((d["name"], t["name"], v["name"]))
+    return found
+
+
+def build_owner_index(district) -> OwnerSearchIndex:
+    transliterator = get_transliterator()
+    words = {}
+
+    def transliterate(word):
+        if word not in words:
+            words[word] = transliterator.translit_word(word, topk=1)["mr"][0]
+        return words[word]
+
+    return OwnerSearchIndex(
+        (
+            (location, get_village_index(*location))
+            for location in scope_villages(district)
+        ),
+        transliterate if transliterator is not None else None,
+    )
+
+
+def index_path(district):
+    digest = hashlib.sha256(normalize_name(district).encode()).hexdigest()[:32]
+    return os.path.join(settings.OWNER_INDEX_ROOT, f"{digest}.pickle")
+
+
+def save_owner_index(district, index: OwnerSearchIndex) -> str:
+    """Stores the district's index, replacing the previous one atomically."""
+
+    path = index_path(district)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(temp_path, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def get_owner_index(district):
+    """
+    Returns the prebuilt owner search index of a district, or None when
+    build_owner_index hasn't been run for it.
+    """
+
+    path = index_path(district)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    identity = (stat.st_ino, stat.st_mtime_ns)
+
+    with _local_lock:
+        entry = _local.get(path)
+        if entry is not None and entry[0] == identity:
+            _local.move_to_end(path)
+            return entry[1]
+
+    with open(path, "rb") as f:
+        index = pickle.load(f)
+
+    with _local_lock:
+        _local[path] = (identity, index)
+        _local.move_to_end(path)
+        while len(_local) > getattr(settings, "OWNER_SEARCH_LOCAL_SIZE", 16):
+            _local.popitem(last=False)
+    return index
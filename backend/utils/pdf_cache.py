@@ -0,0 +1,206 @@
+"""On-disk cache of rendered plot PDFs.
+
+Files are addressed by a hash of the plot id and the current records data
+version, so a data refresh (`manage.py bump_data_version records`) makes every
+cached report stale without touching the disk. The directory is capped at
+PDF_CACHE_MAX_BYTES, least recently used files are evicted first. A hit bumps the
+file's mtime, which is what the eviction order is based on. Each process counts
+the bytes it renders on top of the size its last sweep found and only walks the
+directory once that passes the cap.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .cache import RECORDS, get_data_version
+from .pool import mh_manager
+
+
+class ReportRenderError(Exception):
+    pass
+
+
+def render_report(plot_id, path):
+    """Renders the plot PDF into `path`."""
+
+    with mh_manager() as all_manager_obj:
+        pdf = all_manager_obj.get_plot_pdf_by_plot_id(plot_id)
+
+    if not pdf:
+        raise ReportRenderError(f"Failed to generate report for plot {plot_id}")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        pdf.seek(0)
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(pdf, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+class PDFCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        # path -> [lock, number of threads holding or waiting for it]
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # Size found by the last sweep plus what was rendered since, None
+        # until the first sweep.
+        self._size = None
+        self._size_lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def path_for(self, plot_id, version) -> str:
+        digest = hashlib.sha256(f"{version}:{plot_id}".encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.pdf")
+
+    @staticmethod
+    def _touch(path) -> bool:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def get(self, plot_id, version):
+        """Returns the cached file's path, or None on a miss."""
+
+        path = self.path_for(plot_id, version)
+        return path if self._touch(path) else None
+
+    def _lock(self, path):
+        with self._locks_guard:
+            entry = self._locks.get(path)
+            if entry is None:
+                entry = self._locks[path] = [threading.Lock(), 0]
+            entry[1] += 1
+        return entry
+
+    def _unlock(self, path, entry):
+        # The entry stays while other threads wait on it, so a failed render
+        # doesn't let a newcomer start a second one next to a waiter's.
+        with self._locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[path]
+
+    def get_or_render(self, plot_id, version) -> str:
+        path = self.path_for(plot_id, version)
+        if self._touch(path):
+            return path
+
+        # Concurrent requests for the same plot wait for a single render.
+        entry = self._lock(path)
+        try:
+            with entry[0]:
+                if not self._touch(path):
+                    render_report(plot_id, path)
+                    self._added(path)
+        finally:
+            self._unlock(path, entry)
+        return path
+
+    def _added(self, path):
+        """Counts a rendered file, sweeping once the cache may be over its cap."""
+
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        with self._size_lock:
+            if self._size is not None:
+                self._size += size
+                if self._size <= self.max_bytes:
+                    return
+        # One sweep at a time, the others keep counting.
+        if self._evict_lock.acquire(blocking=False):
+            try:
+                self.evict()
+            finally:
+                self._evict_lock.release()
+
+    def evict(self):
+        """Deletes least recently used files until the cache fits its size cap."""
+
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".pdf"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            with self._size_lock:
+                self._size = total
+            return
+
+        # Evict down to 90% so the next few renders don't each trigger a sweep.
+        target = self.max_bytes * 0.9
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._size_lock:
+            self._size = total
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> PDFCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PDFCache(
+                    root=settings.PDF_CACHE_ROOT,
+                    max_bytes=settings.PDF_CACHE_MAX_BYTES,
+                )
+    return _cache
+
+
+def get_report_pdf(plot_id, version=None) -> str:
+    """
+    Returns the path of the plot's PDF, rendering it on a cache miss. `version`
+    defaults to the current records version, threads outside a request pass it
+    in so they don't open a database connection of their own.
+    """
+    if version is None:
+        version = get_data_version(RECORDS)
+    return get_pdf_cache().get_or_render(plot_id, version)
+
+
+def open_report_pdf(plot_id, version=None):
+    """
+    Opens the plot's cached PDF for reading. The file can be evicted between the
+    lookup and the open, in which case it is rendered once more.
+    """
+    if version is None:
+        version = get_data_version(RECORDS)
+    try:
+        return open(get_report_pdf(plot_id, version), "rb")
+    except FileNotFoundError:
+        return open(get_report_pdf(plot_id, version), "rb")
@@ -0,0 +1,266 @@
+"""Process-wide pool of mh_all_manager instances shared across requests."""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from base.metrics import current_timings
+
+_terra_config = None
+_terra_config_lock = threading.Lock()
+
+
+def get_terra_config():
+    """
+    Loads land_value's terra_utils Config on first use rather than at import
+    time, so processes that never touch land_value don't pay for it.
+    """
+
+    global _terra_config
+    if _terra_config is None:
+        with _terra_config_lock:
+            if _terra_config is None:
+                from terra_utils import Config
+
+                _terra_config = Config(settings.TERRA_UTILS_CONFIG)
+    return _terra_config
+
+
+def _default_factory():
+    try:
+        get_terra_config()
+    except Exception as e:
+        print(e)
+
+    from land_value.data_manager.all_manager.mh_all_manager import mh_all_manager
+
+    return mh_all_manager()
+
+
+def _connection_errors():
+    """Exception types that mean the manager's connection can't be trusted anymore."""
+
+    errors = [ConnectionError]
+    try:
+        import psycopg2
+
+        errors += [psycopg2.OperationalError, psycopg2.InterfaceError]
+    except ImportError:
+        pass
+    try:
+        from sqlalchemy import exc
+
+        errors += [exc.OperationalError, exc.DisconnectionError]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+class ManagerPoolTimeout(Exception):
+    pass
+
+
+class _PooledManager:
+    """Bookkeeping wrapper for one manager instance."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.uses = 0
+        self.created_at = time.monotonic()
+
+
+class ManagerPool:
+    """
+    Bounded, thread-safe pool of manager instances.
+
+    Instances are created lazily up to `max_size`. An instance is recycled once it
+    has served `max_uses` checkouts, when it is older than `max_age` seconds, when
+    `health_check` returns False for it, or when a connection error escapes the
+    block that borrowed it.
+    """
+
+    def __init__(
+        self,
+        factory=_default_factory,
+        max_size=8,
+        max_uses=500,
+        max_age=None,
+        timeout=30,
+        health_check=None,
+    ):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.timeout = timeout
+        self.health_check = health_check
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._connection_errors = _connection_errors()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def _is_stale(self, item):
+        if self.max_uses and item.uses >= self.max_uses:
+            return True
+        if self.max_age and time.monotonic() - item.created_at >= self.max_age:
+            return True
+        if self.health_check is not None:
+            try:
+                return not self.health_check(item.manager)
+            except Exception:
+                return True
+        return False
+
+    def _discard(self, item):
+        close = getattr(item.manager, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"[WARN]: Failed to close pooled manager: {e}")
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                while self._idle:
+                    item = self._idle.pop()
+                    if not self._is_stale(item):
+                        item.uses += 1
+                        return item
+                    self._size -= 1
+                    self._discard(item)
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ManagerPoolTimeout(
+                        f"No manager available after {self.timeout}s "
+                        f"(pool size {self.max_size})."
+                    )
+                self._cond.wait(remaining)
+
+        # Build outside the lock, construction is the slow part we're pooling.
+        try:
+            item = _PooledManager(self.factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        item.uses += 1
+        return item
+
+    def release(self, item, discard=False):
+        with self._cond:
+            if discard or self._is_stale(item):
+                self._size -= 1
+                self._discard(item)
+            else:
+                self._idle.append(item)
+            self._cond.notify()
+
+    @contextmanager
+    def manager(self):
+        item = self.acquire()
+        discard = False
+        try:
+            yield item.manager
+        except self._connection_errors:
+            discard = True
+            raise
+        finally:
+            self.release(item, discard=discard)
+
+    def clear(self):
+        """Drop every idle instance, in-use ones are dropped when released."""
+
+        with self._cond:
+            while self._idle:
+                self._size -= 1
+                self._discard(self._idle.pop())
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_manager_pool() -> ManagerPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                options = getattr(settings, "MH_MANAGER_POOL", {})
+                health_check = options.get("HEALTH_CHECK")
+                if isinstance(health_check, str):
+                    health_check = import_string(health_check)
+                _pool = ManagerPool(
+                    max_size=options.get("MAX_SIZE", 8),
+                    max_uses=options.get("MAX_USES", 500),
+                    max_age=options.get("MAX_AGE"),
+                    timeout=options.get("TIMEOUT", 30),
+                    health_check=health_check,
+                )
+    return _pool
+
+
+class _TimedManager:
+    """Records the duration of the manager's method calls in the request timings."""
+
+    def __init__(self, manager, timings):
+        self._manager = manager
+        self._timings = timings
+
+    def __getattr__(self, name):
+        attr = getattr(self._manager, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._timings.record_manager_call(name, time.perf_counter() - start)
+
+        return timed
+
+
+@contextmanager
+def mh_manager():
+    """
+    Borrow a pooled mh_all_manager for the duration of a `with` block.
+
+        with mh_manager() as amo:
+            amo.get_khata_from_village(district, taluka, village)
+
+    Within a measured request, the wait for a free manager and each method
+    call are timed (base.metrics).
+    """
+
+    timings = current_timings()
+    if timings is None:
+        with get_manager_pool().manager() as manager:
+            yield manager
+        return
+
+    start = time.perf_counter()
+    with get_manager_pool().manager() as manager:
+        timings.record_manager_call("pool_wait", time.perf_counter() - start)
+        yield _TimedManager(manager, timings)
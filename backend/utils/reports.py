@@ -0,0 +1,196 @@
+"""Background rendering of plot PDF reports.
+
+ReportJob rows are the queue. A job is handed to an in-process thread pool once
+the transaction that created it commits, and `manage.py run_report_jobs` drains
+whatever is left behind (restarts, crashed workers) from the same table. A job is
+claimed with a conditional UPDATE so it is rendered at most once no matter how
+many workers see it. The PDF itself lands in the shared PDF cache
+(utils.pdf_cache), a finished job points at that cache entry.
+"""
+
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .cache import RECORDS, get_data_version
+from .models import ReportJob, ReportJobStatus
+from .pdf_cache import ReportRenderError, get_report_pdf, open_report_pdf
+
+
+def run_report_job(job_id) -> bool:
+    """Claims and renders one job, returns False if someone else claimed it."""
+
+    claimed = ReportJob.objects.filter(
+        pk=job_id, status=ReportJobStatus.PENDING
+    ).update(status=ReportJobStatus.RUNNING, started_at=timezone.now())
+    if not claimed:
+        return False
+
+    job = ReportJob.objects.get(pk=job_id)
+    try:
+        job.file_path = get_report_pdf(job.plot_id)
+        job.status = ReportJobStatus.COMPLETED
+    except Exception as e:
+        print(f"[ERROR]: Report job {job.id} failed: {e}")
+        job.status = ReportJobStatus.FAILED
+        job.error = str(e)
+        # Give the reserved report back, the user never received it.
+        if job.report_transaction_id:
+            job.report_transaction.delete()
+            job.report_transaction = None
+
+    job.finished_at = timezone.now()
+    job.save()
+    return True
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "REPORT_JOB_WORKERS", 2),
+                    thread_name_prefix="report-job",
+                )
+    return _executor
+
+
+def _run_in_worker(job_id):
+    try:
+        run_report_job(job_id)
+    except Exception as e:
+        print(f"[ERROR]: Report worker crashed on job {job_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def enqueue_report_job(job):
+    """Schedules the job on the local worker pool once the current transaction commits."""
+
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.id))
+
+
+def requeue_stale_jobs(older_than: timedelta) -> int:
+    """Puts jobs back in the queue whose worker disappeared while rendering."""
+
+    return ReportJob.objects.filter(
+        status=ReportJobStatus.RUNNING,
+        started_at__lt=timezone.now() - older_than,
+    ).update(status=ReportJobStatus.PENDING, started_at=None)
+
+
+def pending_job_ids(limit=None):
+    ids = ReportJob.objects.filter(status=ReportJobStatus.PENDING).order_by(
+        "created_at"
+    )
+    return list(ids.values_list("id", flat=True)[:limit])
+
+
+class _ZipStream:
+    """Write-only sink for ZipFile that hands out whatever was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _render_in_worker(plot_id, version):
+    try:
+        return get_report_pdf(plot_id, version)
+    finally:
+        close_old_connections()
+
+
+def stream_report_zip(reports, on_failed=None, chunk_size=64 * 1024):
+    """
+    Yields a ZIP archive of the given (plot_id, filename) reports chunk by chunk.
+
+    PDFs are rendered in parallel through the PDF cache and copied into the
+    archive from disk, so memory use doesn't grow with the number of reports.
+    Plots that could not be rendered are listed in errors.txt inside the
+    archive. `on_failed` is called with every plot id whose PDF wasn't handed
+    out, including those left over when the stream breaks off or the client
+    goes away, even before the first chunk.
+    """
+
+    chunks = _report_zip_chunks(
+        list(reports), on_failed, chunk_size, get_data_version(RECORDS)
+    )
+    # Runs up to the empty chunk inside the try block, so closing a stream that
+    # was never read still refunds everything.
+    next(chunks)
+    return chunks
+
+
+def _report_zip_chunks(reports, on_failed, chunk_size, version):
+    sink = _ZipStream()
+    failed = []
+    delivered = set()
+    executor = ThreadPoolExecutor(
+        max_workers=getattr(settings, "BULK_REPORT_WORKERS", 4),
+        thread_name_prefix="bulk-report",
+    )
+    try:
+        yield b""
+        futures = [
+            (
+                plot_id,
+                filename,
+                executor.submit(_render_in_worker, plot_id, version),
+            )
+            for plot_id, filename in reports
+        ]
+        # PDFs are already compressed, deflating them again only costs CPU.
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+            for plot_id, filename, future in futures:
+                try:
+                    future.result()
+                    src = open_report_pdf(plot_id, version)
+                except Exception as e:
+                    print(f"[ERROR]: Bulk report for plot {plot_id} failed: {e}")
+                    failed.append(plot_id)
+                    continue
+
+                with src, archive.open(filename, "w", force_zip64=True) as dst:
+                    for chunk in iter(lambda: src.read(chunk_size), b""):
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+                data = sink.drain()
+                if data:
+                    yield data
+                delivered.add(plot_id)
+
+            if failed:
+                archive.writestr(
+                    "errors.txt",
+                    "Failed to generate reports for plots:\n" + "\n".join(failed),
+                )
+        yield sink.drain()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        undelivered = [p for p, _ in reports if p not in delivered]
+        if undelivered and on_failed is not None:
+            on_failed(undelivered)
@@ -1,26 +1,147 @@
+import contextvars
+import itertools
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+
+class RoutingState:
+    """Per-request routing flags, see utils.middlewares.ReplicaRoutingMiddleware."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned  # Reads go to the primary.
+        self.wrote = False  # The request wrote to a primary.
+        self.user_id = None
+
+
+_state = contextvars.ContextVar("db_routing_state", default=None)
+
+
+def begin_request(pinned=False):
+    """Starts routing a request's reads, returns the token for end_request."""
+    return _state.set(RoutingState(pinned))
+
+
+def end_request(token) -> RoutingState:
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def primary_key(user_id):
+    return f"db-primary:{user_id}"
+
+
+def set_request_user(user_id):
+    """
+    Records the authenticated user of the current request and pins its reads
+    to the primaries if the user wrote within DATABASE_PRIMARY_STICKY_SECONDS.
+    """
+
+    state = _state.get()
+    if state is None:
+        return
+    state.user_id = user_id
+    if not state.pinned and getattr(settings, "DATABASE_REPLICAS", None):
+        state.pinned = bool(cache.get(primary_key(user_id)))
+
+
+@contextmanager
+def use_primary():
+    """Sends the reads of the enclosed block to the primaries."""
+
+    outer = _state.get()
+    token = _state.set(RoutingState(pinned=True))
+    try:
+        yield
+    finally:
+        inner = _state.get()
+        _state.reset(token)
+        if outer is not None and inner.wrote:
+            outer.pinned = outer.wrote = True
+
+
+_cycles = {}
+_cycles_lock = threading.Lock()
+
+
+def choose_replica(primary):
+    """
+    Returns the alias to read from for `primary`, one of its
+    DATABASE_REPLICAS picked by weight (DATABASE_REPLICA_SELECTION "weighted")
+    or in turn, each replica as many times as its weight ("round_robin").
+    Replicas with weight 0 are skipped, without any the primary is used.
+    """
+
+    replicas = getattr(settings, "DATABASE_REPLICAS", {}).get(primary)
+    replicas = tuple((a, w) for a, w in (replicas or {}).items() if w > 0)
+    if not replicas:
+        return primary
+
+    if getattr(settings, "DATABASE_REPLICA_SELECTION", "weighted") == "round_robin":
+        cycle = _cycles.get(replicas)
+        if cycle is None:
+            with _cycles_lock:
+                cycle = _cycles.setdefault(
+                    replicas,
+                    itertools.cycle([a for a, w in replicas for _ in range(w)]),
+                )
+        return next(cycle)
+
+    aliases, weights = zip(*replicas)
+    return random.choices(aliases, weights)[0]
+
+
 class MultiDBRouter:
     """
     A router to direct database operations for models in 'utils' between
     the default and external databases.
+
+    During a request, reads of either database are spread over its read
+    replicas (settings.DATABASE_REPLICAS) unless the request is pinned to
+    the primaries: unsafe methods, requests that already wrote, reads inside
+    a transaction and clients that wrote within the last
+    DATABASE_PRIMARY_STICKY_SECONDS always read from the primary. Outside a
+    request (commands, background jobs) everything uses the primaries.
     """
 
     external_models = {"maharashtrametadata"}  # Use lowercase model names
 
+    def primary_for(self, model):
+        if model._meta.model_name in self.external_models:
+            return "external_db"
+        return "default"
+
     def db_for_read(self, model, **hints):
         """Route read queries based on the model name."""
-        if model._meta.model_name in self.external_models:
-            return "external_db"  # Read from external DB
-        return "default"  # Otherwise, read from default DB
+        primary = self.primary_for(model)
+        state = _state.get()
+        if state is None or state.pinned:
+            return primary
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db  # Follow relations on the same database
+        alias = choose_replica(primary)
+        if alias != primary and connections[primary].in_atomic_block:
+            return primary  # Read what the transaction has written
+        return alias
 
     def db_for_write(self, model, **hints):
         """Prevent writes to external DB, allow writes to default DB."""
         if model._meta.model_name in self.external_models:
             return None  # Do not allow writes
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
         return "default"  # Allow writes to default DB
 
     def allow_relation(self, obj1, obj2, **hints):
         """Allow relations only within the same database."""
-        db_set = {self.db_for_read(obj1), self.db_for_read(obj2)}
+        db_set = {self.primary_for(obj1), self.primary_for(obj2)}
         if len(db_set) == 1:  # Both objects are in the same DB
             return True
         return False  # Prevent cross-database relations
@@ -1,11 +1,13 @@
+from django.urls import reverse
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
-from shapely.lib import is_valid
 from utils.models import (
     Plan,
     Transaction,
     MaharashtraMetadata,
     ReportPlan,
     ReportTransaction,
+    ReportJob,
+    ReportJobStatus,
 )
 
 
@@ -101,3 +103,38 @@ class MaharashtraMetadataSerializer(ModelSerializer):
     class Meta:
         model = MaharashtraMetadata
         fields = ["state_name", "district_name", "taluka_name", "village_name"]
+
+
+class ReportJobSerializer(ModelSerializer):
+    status_url = SerializerMethodField()
+    download_url = SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            "id",
+            "created_at",
+            "status",
+            "plot_id",
+            "khata_no",
+            "error",
+            "started_at",
+            "finished_at",
+            "status_url",
+            "download_url",
+        ]
+        read_only_fields = fields
+
+    def _absolute_url(self, name, obj):
+        url = reverse(name, kwargs={"pk": obj.pk})
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def get_status_url(self, obj):
+        return self._absolute_url("report-job-status", obj)
+
+    def get_download_url(self, obj):
+        """Only set once the PDF is ready."""
+        if obj.status != ReportJobStatus.COMPLETED:
+            return None
+        return self._absolute_url("report-job-download", obj)
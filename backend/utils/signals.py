@@ -0,0 +1,40 @@
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+
+from .db import count_connection
+from .entitlements import invalidate_user_entitlements
+from .models import Plan, ReportPlan, ReportTransaction, Transaction
+
+
+def invalidate_plan_entitlements(sender, instance, **kwargs):
+    invalidate_user_entitlements(instance.user_id)
+
+
+def count_transaction(sender, instance, created, **kwargs):
+    if created:
+        Plan.objects.filter(pk=instance.plan_id).update(used_count=F("used_count") + 1)
+
+
+def uncount_transaction(sender, instance, **kwargs):
+    Plan.objects.filter(pk=instance.plan_id, used_count__gt=0).update(
+        used_count=F("used_count") - 1
+    )
+
+
+def uncount_report_transaction(sender, instance, **kwargs):
+    ReportPlan.objects.filter(pk=instance.report_plan_id, used_count__gt=0).update(
+        used_count=F("used_count") - 1
+    )
+
+
+post_save.connect(invalidate_plan_entitlements, sender=Plan)
+post_delete.connect(invalidate_plan_entitlements, sender=Plan)
+
+# bulk_create skips these, callers that bulk insert update used_count themselves.
+post_save.connect(count_transaction, sender=Transaction)
+post_delete.connect(uncount_transaction, sender=Transaction)
+# ReportTransactions are counted when they reserve quota (ReportPlan.reserve).
+post_delete.connect(uncount_report_transaction, sender=ReportTransaction)
+
+connection_created.connect(count_connection)
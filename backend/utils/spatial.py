@@ -0,0 +1,196 @@
+"""In-process spatial index over the cadastral layers.
+
+Each layer (a table such as "jalgaon.parola_cadastrals" in external_db) is read
+once, reprojected to EPSG:4326 by PostGIS, and kept in a shapely STRtree so
+point-in-plot and nearest-plot lookups don't hit the database. Layers are loaded
+on first use and the least recently used ones are dropped once more than
+CADASTRAL_INDEX["MAX_LAYERS"] are held. They are keyed by the records data
+version, so `manage.py bump_data_version records` reloads them.
+
+Lookups can return the plots' geometry. Next to the full-resolution shapes,
+each index keeps a topology-preserving simplification per
+CADASTRAL_INDEX["SIMPLIFY_TOLERANCES"] (in meters), computed once at load, and
+requests pick the coarsest one that still looks the same at their zoom.
+"""
+
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+from .cache import RECORDS, get_data_version
+
+# Meters per degree of latitude, used to turn distances into degrees for the
+# nearest-plot lookup. Good enough for "within a few meters" at these latitudes.
+METERS_PER_DEGREE = 111_320
+
+# Ground size of a pixel of a 256px web mercator tile at zoom 0 on the equator.
+METERS_PER_PIXEL = 156_543.03
+
+LAYER_RE = re.compile(r"^[a-z0-9_]+\.[a-z0-9_]+$")
+
+
+def _config():
+    return {
+        "GEOMETRY_COLUMN": "geom",
+        "COLUMNS": [
+            "plot_id",
+            "khata_no",
+            "gat_no",
+            "survey_no",
+            "owner_name_english",
+            "district",
+            "taluka",
+            "village_name",
+        ],
+        "MAX_LAYERS": 8,
+        "SIMPLIFY_TOLERANCES": [1, 5, 20, 80],
+        **getattr(settings, "CADASTRAL_INDEX", {}),
+    }
+
+
+def tolerance_for_zoom(zoom) -> float:
+    """The simplification tolerance, in meters, a pixel at `zoom` hides."""
+    return METERS_PER_PIXEL / 2 ** max(zoom, 0)
+
+
+class CadastralIndex:
+    """STRtree over one layer's plots, `attributes[i]` describes `geometries[i]`."""
+
+    def __init__(self, geometries, attributes, tolerances=None):
+        # shapely and numpy are imported on first use to keep worker startup lean.
+        import numpy as np
+        import shapely
+
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.attributes = attributes
+        self.tree = shapely.STRtree(self.geometries)
+
+        if tolerances is None:
+            tolerances = _config()["SIMPLIFY_TOLERANCES"]
+        # Tolerance in meters -> simplified geometries, 0 is full resolution.
+        self.tiers = {0: self.geometries}
+        for tolerance in sorted(t for t in tolerances if t > 0):
+            self.tiers[tolerance] = shapely.simplify(
+                self.geometries, tolerance / METERS_PER_DEGREE, preserve_topology=True
+            )
+
+    def __len__(self):
+        return len(self.attributes)
+
+    def tier(self, tolerance) -> float:
+        """
+        The coarsest simplification within `tolerance` meters of the plots, full
+        resolution (0) when none is, e.g. for a negative or NaN tolerance.
+        """
+        return max((t for t in self.tiers if t <= tolerance), default=0)
+
+    def _plot(self, i, tolerance):
+        if tolerance is None:
+            return self.attributes[i]
+
+        from shapely.geometry import mapping
+
+        geometry = self.tiers[self.tier(tolerance)][i]
+        return {**self.attributes[i], "geometry": mapping(geometry)}
+
+    def containing(self, points, limit=10, tolerance=None):
+        """
+        Returns, for each (lng, lat), the attributes of the plots covering it,
+        with their geometry simplified to `tolerance` meters when one is given.
+        """
+
+        import shapely
+
+        matches = [[] for _ in points]
+        if not len(points) or not len(self):
+            return matches
+        point_idx, plot_idx = self.tree.query(
+            shapely.points(points), predicate="intersects"
+        )
+        for p, g in zip(point_idx.tolist(), plot_idx.tolist()):
+            if len(matches[p]) < limit:
+                matches[p].append(self._plot(g, tolerance))
+        return matches
+
+    def nearest(self, points, max_distance=None, tolerance=None):
+        """
+        Returns, for each (lng, lat), the attributes of the closest plot within
+        `max_distance` meters, or None. Distances are approximate. Geometry is
+        included as in `containing`.
+        """
+
+        import shapely
+
+        matches = [None] * len(points)
+        if not len(points) or not len(self):
+            return matches
+        if max_distance is not None:
+            max_distance = max_distance / METERS_PER_DEGREE
+        point_idx, plot_idx = self.tree.query_nearest(
+            shapely.points(points), max_distance=max_distance, all_matches=False
+        )
+        for p, g in zip(point_idx.tolist(), plot_idx.tolist()):
+            matches[p] = self._plot(g, tolerance)
+        return matches
+
+
+def load_cadastral_index(layer) -> CadastralIndex:
+    """Reads a cadastral layer from external_db into a CadastralIndex."""
+
+    if not LAYER_RE.match(layer):
+        raise ValueError(f"Invalid cadastral layer {layer!r}")
+
+    config = _config()
+    connection = connections["external_db"]
+    quote = connection.ops.quote_name
+    columns = config["COLUMNS"]
+    table = ".".join(quote(part) for part in layer.split("."))
+    geometry = quote(config["GEOMETRY_COLUMN"])
+
+    sql = (
+        f"SELECT {', '.join(quote(c) for c in columns)}, "
+        f"ST_AsBinary(ST_Transform({geometry}, 4326)) "
+        f"FROM {table} WHERE {geometry} IS NOT NULL"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+
+    import shapely
+
+    attributes = [dict(zip(columns, row[:-1])) for row in rows]
+    geometries = shapely.from_wkb([bytes(row[-1]) for row in rows])
+    return CadastralIndex(geometries, attributes)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_load_locks = defaultdict(threading.Lock)
+
+
+def get_cadastral_index(layer) -> CadastralIndex:
+    key = (layer, get_data_version(RECORDS))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+        load_lock = _load_locks[key]
+
+    # Loading a layer takes a while, only block requests for the same layer.
+    with load_lock:
+        with _indexes_lock:
+            index = _indexes.get(key)
+        if index is None:
+            index = load_cadastral_index(layer)
+            with _indexes_lock:
+                for stale in [k for k in _indexes if k[0] == layer]:
+                    del _indexes[stale]
+                _indexes[key] = index
+                _load_locks.pop(key, None)
+                while len(_indexes) > _config()["MAX_LAYERS"]:
+                    _indexes.popitem(last=False)
+    return index
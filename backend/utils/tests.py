@@ -97,3 +97,1738 @@
 #         # Validate the response
 #         self.assertEqual(response.status_code, 500)
 #         self.assertIn("error", response.json())
+
+
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+import uuid
+import zipfile
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from shapely.geometry import Point, box
+
+from base.renderers import ORJSONRenderer
+from user_auth.models import CustomUser
+
+from . import (
+    autocomplete,
+    catalog,
+    db,
+    entitlements,
+    hierarchy,
+    mbtiles,
+    owners,
+    pdf_cache,
+    reports,
+    routers,
+    spatial,
+    tiles,
+    views,
+    villages,
+)
+from . import cache as data_cache
+from .cache import METADATA, RECORDS, bump_data_version
+from .helpers import has_plan_access, reserve_reports
+from .models import (
+    DataVersion,
+    LayerCatalog,
+    MaharashtraMetadata,
+    Plan,
+    ReportJob,
+    ReportJobStatus,
+    ReportPlan,
+    ReportTransaction,
+)
+from .management.commands import render_mbtiles
+from .management.commands.importtime_report import heavy_imports, measure_imports
+from .middlewares import ReplicaRoutingMiddleware
+from .pdf_cache import PDFCache
+from .pool import ManagerPool, ManagerPoolTimeout
+from .spatial import CadastralIndex
+from .views import MaharashtraMetadataList, get_plots_by_points, maharashtra_hierarchy
+
+
+class ManagerPoolTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.created = []
+
+        def factory():
+            manager = object()
+            self.created.append(manager)
+            return manager
+
+        self.factory = factory
+
+    def test_reuses_released_manager(self):
+        """A released manager is handed out again instead of building a new one."""
+        pool = ManagerPool(factory=self.factory, max_size=2)
+
+        with pool.manager() as first:
+            pass
+        with pool.manager() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(len(self.created), 1)
+
+    def test_recycles_after_max_uses(self):
+        pool = ManagerPool(factory=self.factory, max_size=1, max_uses=2)
+
+        for _ in range(3):
+            with pool.manager():
+                pass
+
+        self.assertEqual(len(self.created), 2)
+
+    def test_discards_on_connection_error(self):
+        pool = ManagerPool(factory=self.factory, max_size=1)
+
+        with self.assertRaises(ConnectionError):
+            with pool.manager():
+                raise ConnectionError("lost connection")
+
+        self.assertEqual(pool.size, 0)
+        with pool.manager():
+            pass
+        self.assertEqual(len(self.created), 2)
+
+    def test_failed_health_check_is_replaced(self):
+        pool = ManagerPool(
+            factory=self.factory, max_size=1, health_check=lambda m: False
+        )
+
+        with pool.manager():
+            pass
+        with pool.manager():
+            pass
+
+        self.assertEqual(len(self.created), 2)
+
+    def test_bounded_size(self):
+        pool = ManagerPool(factory=self.factory, max_size=1, timeout=0.01)
+
+        with pool.manager():
+            with self.assertRaises(ManagerPoolTimeout):
+                pool.acquire()
+
+
+class MaharashtraHierarchyTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        data_cache.clear_local_versions()
+        hierarchy._cached.clear_local()
+        self.factory = APIRequestFactory()
+        self.tree = [{"code": "1", "name": "JALGAON", "talukas": []}]
+
+    def test_built_once_and_revalidated(self):
+        """Repeat requests reuse the cached payload and honour If-None-Match."""
+        with patch.object(
+            hierarchy, "build_hierarchy", return_value=self.tree
+        ) as build:
+            response = maharashtra_hierarchy(self.factory.get("/"))
+            etag = response["ETag"]
+
+            cached = maharashtra_hierarchy(
+                self.factory.get("/", HTTP_IF_NONE_MATCH=etag)
+            )
+
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), self.tree)
+        self.assertEqual(cached.status_code, 304)
+
+    def test_gzip_variant(self):
+        with patch.object(hierarchy, "build_hierarchy", return_value=self.tree):
+            response = maharashtra_hierarchy(
+                self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+            )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.tree)
+
+    def test_rebuilt_after_version_bump(self):
+        with patch.object(
+            hierarchy, "build_hierarchy", return_value=self.tree
+        ) as build:
+            maharashtra_hierarchy(self.factory.get("/"))
+            bump_data_version(METADATA)
+            maharashtra_hierarchy(self.factory.get("/"))
+
+        self.assertEqual(build.call_count, 2)
+
+
+class DataVersionTestCase(TestCase):
+
+    def setUp(self):
+        data_cache.clear_local_versions()
+        self.addCleanup(data_cache.clear_local_versions)
+
+    def test_bump_from_another_process_is_seen(self):
+        """Versions live in the database, not in the (per-process) cache."""
+        self.assertEqual(data_cache.get_data_version(RECORDS), 1)
+        self.assertEqual(bump_data_version(RECORDS), 2)
+
+        # What `manage.py bump_data_version` does from its own process.
+        DataVersion.objects.filter(name=RECORDS).update(version=5)
+        cache.clear()
+        self.assertEqual(data_cache.get_data_version(RECORDS), 2)
+        with self.settings(DATA_VERSION_LOCAL_TIMEOUT=0):
+            data_cache.clear_local_versions()
+            self.assertEqual(data_cache.get_data_version(RECORDS), 5)
+            self.assertEqual(data_cache.get_data_version(METADATA), 1)
+
+
+class PlanAccessTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        data_cache.clear_local_versions()
+        hierarchy._cached.clear_local()
+        self.user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        tree = [
+            {
+                "code": "1",
+                "name": "JALGAON",
+                "talukas": [
+                    {
+                        "code": "11",
+                        "name": "Parola",
+                        "villages": [{"code": "111", "name": "Mohadi"}],
+                    },
+                    {
+                        "code": "12",
+                        "name": "Amalner",
+                        "villages": [{"code": "121", "name": "Dharagir"}],
+                    },
+                ],
+            }
+        ]
+        patcher = patch.object(hierarchy, "build_hierarchy", return_value=tree)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_taluka_plan(self):
+        Plan.objects.create(user=self.user, plan_type="Taluka", entity_name="Parola")
+
+        self.assertTrue(has_plan_access(self.user, "jalgaon.parola_cadastrals"))
+        self.assertFalse(has_plan_access(self.user, "jalgaon.amalner_cadastrals"))
+
+    def test_new_plan_invalidates_entitlements(self):
+        self.assertFalse(has_plan_access(self.user, "jalgaon.amalner_cadastrals"))
+
+        Plan.objects.create(user=self.user, plan_type="District", entity_name="JALGAON")
+
+        self.assertTrue(has_plan_access(self.user, "jalgaon.amalner_cadastrals"))
+
+    def test_short_timeout_without_shared_cache(self):
+        """Other workers can't see the invalidation, so entries expire quickly."""
+        self.assertEqual(entitlements.entitlements_timeout(), 30)
+
+        redis = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://127.0.0.1:6379/1",
+            }
+        }
+        with self.settings(CACHES=redis):
+            self.assertEqual(entitlements.entitlements_timeout(), 24 * 60 * 60)
+
+    def test_unknown_table(self):
+        Plan.objects.create(user=self.user, plan_type="District", entity_name="JALGAON")
+
+        self.assertFalse(has_plan_access(self.user, "parola_cadastrals"))
+        self.assertFalse(has_plan_access(self.user, "pune.haveli_cadastrals"))
+
+
+class ReportJobTestCase(TestCase):
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        plan = ReportPlan.objects.create(user=user, quantity=5, is_paid=True)
+        self.job = ReportJob.objects.create(
+            user=user,
+            report_transaction=ReportTransaction.objects.create(
+                report_plan=plan, khata_no="12"
+            ),
+            plot_id="p-1",
+            khata_no="12",
+        )
+        self.plan = plan
+
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(
+            patch.object(pdf_cache, "_cache", PDFCache(root.name, max_bytes=1024))
+        )
+
+        self.manager = MagicMock()
+        pool = patch.object(pdf_cache, "mh_manager")
+        pool.start().return_value.__enter__.return_value = self.manager
+        self.addCleanup(pool.stop)
+
+    def test_renders_pending_job(self):
+        self.manager.get_plot_pdf_by_plot_id.return_value = io.BytesIO(b"%PDF-1.4")
+
+        self.assertTrue(reports.run_report_job(self.job.id))
+        # Already claimed, a second worker must not render it again.
+        self.assertFalse(reports.run_report_job(self.job.id))
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ReportJobStatus.COMPLETED)
+        with open(self.job.file_path, "rb") as f:
+            self.assertEqual(f.read(), b"%PDF-1.4")
+        self.manager.get_plot_pdf_by_plot_id.assert_called_once_with("p-1")
+
+    def test_status_answers_without_waiting(self):
+        request = APIRequestFactory().get(
+            f"/utils/report-jobs/{self.job.id}/", {"wait": 25}
+        )
+        force_authenticate(request, user=self.job.user)
+
+        with patch.object(views.time, "sleep") as sleep, self.assertNumQueries(1):
+            response = views.report_job_status(request, self.job.id)
+
+        sleep.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Retry-After"], "2")
+
+        self.manager.get_plot_pdf_by_plot_id.return_value = io.BytesIO(b"%PDF-1.4")
+        reports.run_report_job(self.job.id)
+        response = views.report_job_status(request, self.job.id)
+        self.assertEqual(response.data["status"], ReportJobStatus.COMPLETED)
+        self.assertFalse(response.has_header("Retry-After"))
+
+    def test_failed_job_refunds_report(self):
+        self.manager.get_plot_pdf_by_plot_id.return_value = None
+
+        reports.run_report_job(self.job.id)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ReportJobStatus.FAILED)
+        self.assertEqual(self.plan.transactions.count(), 0)
+
+
+class PDFCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.cache = PDFCache(root.name, max_bytes=20)
+
+        self.manager = MagicMock()
+        self.manager.get_plot_pdf_by_plot_id.side_effect = lambda plot_id: io.BytesIO(
+            b"%PDF-" + plot_id.encode()
+        )
+        pool = patch.object(pdf_cache, "mh_manager")
+        pool.start().return_value.__enter__.return_value = self.manager
+        self.addCleanup(pool.stop)
+
+    def test_repeat_download_is_not_rendered_again(self):
+        first = self.cache.get_or_render("p-1", version=1)
+        second = self.cache.get_or_render("p-1", version=1)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.manager.get_plot_pdf_by_plot_id.call_count, 1)
+
+    def test_new_version_renders_again(self):
+        self.cache.get_or_render("p-1", version=1)
+        self.cache.get_or_render("p-1", version=2)
+
+        self.assertEqual(self.manager.get_plot_pdf_by_plot_id.call_count, 2)
+
+    def test_evicts_least_recently_used(self):
+        old = self.cache.get_or_render("p-1", version=1)
+        os.utime(old, (0, 0))
+        self.cache.get_or_render("p-2", version=1)
+        self.cache.get_or_render("p-3", version=1)
+
+        self.assertIsNone(self.cache.get("p-1", version=1))
+        self.assertIsNotNone(self.cache.get("p-3", version=1))
+
+    def test_sweeps_only_past_the_cap(self):
+        with patch.object(pdf_cache.os, "walk", wraps=os.walk) as walk:
+            self.cache.get_or_render("p-1", version=1)
+            self.cache.get_or_render("p-2", version=1)
+            self.assertEqual(walk.call_count, 1)
+
+            self.cache.get_or_render("p-3", version=1)
+            self.assertEqual(walk.call_count, 2)
+
+    def test_render_lock_outlives_its_waiters(self):
+        path = self.cache.path_for("p-1", 1)
+        first = self.cache._lock(path)
+        waiter = self.cache._lock(path)
+
+        self.cache._unlock(path, first)
+        self.assertIs(self.cache._lock(path), waiter)
+
+        self.cache._unlock(path, waiter)
+        self.cache._unlock(path, waiter)
+        self.assertEqual(self.cache._locks, {})
+
+
+class BulkReportTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        ReportPlan.objects.create(user=self.user, quantity=2, is_paid=True)
+        ReportPlan.objects.create(user=self.user, quantity=1, is_paid=True)
+
+    def test_reserves_across_plans(self):
+        reserved = reserve_reports(self.user, [{"khata_no": str(i)} for i in range(3)])
+
+        self.assertEqual([t.khata_no for t in reserved], ["0", "1", "2"])
+        self.assertEqual(ReportTransaction.objects.count(), 3)
+
+    def test_reserves_nothing_without_enough_quota(self):
+        reserved = reserve_reports(self.user, [{"khata_no": str(i)} for i in range(4)])
+
+        self.assertIsNone(reserved)
+        self.assertEqual(ReportTransaction.objects.count(), 0)
+
+    def get_report_pdf(self, plot_id, version=None):
+        if plot_id == "bad":
+            raise pdf_cache.ReportRenderError("boom")
+        if plot_id == "broken":
+            raise ManagerPoolTimeout()
+        path = os.path.join(self.root.name, f"{plot_id}.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF-" + plot_id.encode())
+        return path
+
+    def render(self):
+        """Renders through get_report_pdf, in the workers and in open_report_pdf."""
+
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        stack = ExitStack()
+        for module in (reports, pdf_cache):
+            stack.enter_context(
+                patch.object(module, "get_report_pdf", side_effect=self.get_report_pdf)
+            )
+        return stack
+
+    def test_streams_zip_and_reports_failures(self):
+        failed = []
+
+        with self.render():
+            data = b"".join(
+                reports.stream_report_zip(
+                    [
+                        ("p-1", "1_p-1.pdf"),
+                        ("bad", "2_bad.pdf"),
+                        ("broken", "3_broken.pdf"),
+                    ],
+                    on_failed=failed.extend,
+                )
+            )
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        self.assertEqual(archive.namelist(), ["1_p-1.pdf", "errors.txt"])
+        self.assertEqual(archive.read("1_p-1.pdf"), b"%PDF-p-1")
+        self.assertEqual(failed, ["bad", "broken"])
+
+    def test_disconnect_refunds_undelivered_reports(self):
+        failed = []
+
+        with self.render():
+            stream = reports.stream_report_zip(
+                [("p-1", "1_p-1.pdf"), ("p-2", "2_p-2.pdf"), ("p-3", "3_p-3.pdf")],
+                on_failed=failed.extend,
+            )
+            next(stream)
+            next(stream)  # p-1 is complete once its trailing bytes went out.
+            next(stream)
+            stream.close()
+
+        self.assertEqual(failed, ["p-2", "p-3"])
+
+    def test_unread_stream_refunds_everything(self):
+        failed = []
+
+        with self.render():
+            stream = reports.stream_report_zip(
+                [("p-1", "1_p-1.pdf"), ("p-2", "2_p-2.pdf")], on_failed=failed.extend
+            )
+            stream.close()
+
+        self.assertEqual(failed, ["p-1", "p-2"])
+
+    def test_evicted_pdf_is_rendered_again(self):
+        failed = []
+        render = self.get_report_pdf
+
+        def evicted(plot_id, version=None):
+            # The worker's file is gone by the time the archive opens it.
+            path = render(plot_id, version)
+            if threading.current_thread() is not threading.main_thread():
+                os.remove(path)
+            return path
+
+        self.get_report_pdf = evicted
+        with self.render():
+            data = b"".join(
+                reports.stream_report_zip(
+                    [("p-1", "1_p-1.pdf")], on_failed=failed.extend
+                )
+            )
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        self.assertEqual(archive.read("1_p-1.pdf"), b"%PDF-p-1")
+        self.assertEqual(failed, [])
+
+    def test_workers_are_handed_the_data_version(self):
+        versions = []
+
+        def get_report_pdf(plot_id, version=None):
+            versions.append(version)
+            return self.get_report_pdf(plot_id)
+
+        with self.render(), patch.object(
+            reports, "get_report_pdf", side_effect=get_report_pdf
+        ), patch.object(reports, "close_old_connections") as close:
+            b"".join(reports.stream_report_zip([("p-1", "1_p-1.pdf")]))
+
+        self.assertEqual(versions, [data_cache.get_data_version(RECORDS)])
+        close.assert_called_once_with()
+
+
+class TransactionCounterTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        self.plan = ReportPlan.objects.create(user=self.user, quantity=5, is_paid=True)
+
+    def test_counter_follows_transactions(self):
+        first = ReportTransaction.objects.create(report_plan=self.plan, khata_no="1")
+        ReportTransaction.objects.create(report_plan=self.plan, khata_no="2")
+        first.delete()
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.total_transactions, 1)
+
+    def test_bulk_reservation_is_counted(self):
+        reserve_reports(self.user, [{"khata_no": "1"}, {"khata_no": "2"}])
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.used_count, 2)
+
+    def test_save_stops_at_quantity(self):
+        ReportPlan.objects.filter(pk=self.plan.pk).update(used_count=5)
+
+        with self.assertRaises(ValueError):
+            ReportTransaction.objects.create(report_plan=self.plan, khata_no="6")
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.used_count, 5)
+        self.assertEqual(ReportTransaction.objects.count(), 0)
+
+    def test_reserve_is_conditional(self):
+        self.assertTrue(ReportPlan.reserve(self.plan.pk, 4))
+        self.assertFalse(ReportPlan.reserve(self.plan.pk, 2))
+        self.assertTrue(ReportPlan.reserve(self.plan.pk))
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.used_count, 5)
+
+    def test_stale_save_keeps_the_counter(self):
+        """Saving an instance loaded before a reservation doesn't undo it."""
+        stale = ReportPlan.objects.get(pk=self.plan.pk)
+        reserve_reports(self.user, [{"khata_no": str(n)} for n in range(3)])
+
+        stale.duration = 6
+        stale.save()
+        plan = Plan.objects.create(user=self.user, plan_type="Taluka", entity_name="x")
+        Plan.objects.filter(pk=plan.pk).update(used_count=2)
+        plan.save(update_fields=["is_paid", "used_count"])
+
+        self.plan.refresh_from_db()
+        self.assertEqual((self.plan.used_count, self.plan.duration), (3, 6))
+        self.assertIsNone(reserve_reports(self.user, [{"khata_no": "x"}] * 3))
+        self.assertEqual(Plan.objects.get(pk=plan.pk).used_count, 2)
+
+    def test_failed_download_is_refunded(self):
+        request = APIRequestFactory().get(
+            "/utils/report-gen/",
+            {
+                "state": "maharashtra",
+                "district": "jalgaon",
+                "taluka": "parola",
+                "village": "mohadi",
+                "khata_no": "1",
+                "plot_id": "p-1",
+            },
+        )
+        force_authenticate(request, user=self.user)
+
+        with patch.object(views, "open_report_pdf") as open_pdf:
+            open_pdf.side_effect = pdf_cache.ReportRenderError("no pdf")
+            self.assertEqual(views.report_gen3(request).status_code, 400)
+            open_pdf.side_effect = ManagerPoolTimeout()
+            with self.assertRaises(ManagerPoolTimeout):
+                views.report_gen3(request)
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.used_count, 0)
+        self.assertEqual(ReportTransaction.objects.count(), 0)
+
+    def test_reconcile_repairs_drift(self):
+        ReportTransaction.objects.create(report_plan=self.plan, khata_no="1")
+        ReportPlan.objects.filter(pk=self.plan.pk).update(used_count=4)
+
+        call_command("reconcile_transaction_counts", stdout=io.StringIO())
+
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.used_count, 1)
+
+
+class SpatialIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.index = CadastralIndex(
+            [box(0, 0, 1, 1), box(1, 0, 2, 1)],
+            [{"plot_id": "a"}, {"plot_id": "b"}],
+        )
+
+    def test_containing_and_nearest(self):
+        matches = self.index.containing([(0.5, 0.5), (1.5, 0.5), (5, 5)])
+
+        self.assertEqual(matches, [[{"plot_id": "a"}], [{"plot_id": "b"}], []])
+        self.assertEqual(
+            self.index.nearest([(2.00001, 0.5), (5, 5)], max_distance=10),
+            [{"plot_id": "b"}, None],
+        )
+
+    def test_layer_is_loaded_once(self):
+        spatial._indexes.clear()
+        with patch.object(
+            spatial, "load_cadastral_index", return_value=self.index
+        ) as load:
+            spatial.get_cadastral_index("jalgaon.parola_cadastrals")
+            spatial.get_cadastral_index("jalgaon.parola_cadastrals")
+        spatial._indexes.clear()
+
+        load.assert_called_once_with("jalgaon.parola_cadastrals")
+
+    def test_batch_endpoint(self):
+        user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        request = APIRequestFactory().post(
+            "/utils/plots/by-points/",
+            {
+                "table": "jalgaon.parola_cadastrals",
+                "points": [[0.5, 0.5], [2.00001, 0.5]],
+                "nearest": True,
+                "max_distance": 10,
+            },
+            format="json",
+        )
+        force_authenticate(request, user=user)
+
+        with patch.object(views, "has_plan_access", return_value=True), patch.object(
+            views, "get_cadastral_index", return_value=self.index
+        ):
+            response = get_plots_by_points(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r["plots"] for r in response.data],
+            [[{"plot_id": "a"}], [{"plot_id": "b"}]],
+        )
+
+    def test_lat_lng_lookup_keeps_the_legacy_shape(self):
+        plot = {
+            "plot_id": "a",
+            "khata_no": "12",
+            "gat_no": "7",
+            "survey_no": "7/1",
+            "owner_name_english": "Patil Ramesh",
+            "district": "JALGAON",
+            "taluka": "Parola",
+            "village_name": "Mohadi",
+        }
+        index = CadastralIndex([box(0, 0, 1, 1)], [plot])
+        user = CustomUser(email="test@example.com")
+
+        def lookup(**params):
+            request = APIRequestFactory().get(
+                "/utils/plot/", {"table": "jalgaon.parola_cadastrals", **params}
+            )
+            force_authenticate(request, user=user)
+            with patch.object(
+                views, "has_plan_access", return_value=True
+            ), patch.object(views, "get_cadastral_index", return_value=index):
+                return views.get_plot_by_lat_lng(request)
+
+        response = lookup(lat=0.5, lng=0.5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "khata_no": "12",
+                    "plot_id": "a",
+                    "gat_no": "7",
+                    "survey_no": "7/1",
+                    "owner_names": "Patil Ramesh",
+                    "district": "JALGAON",
+                    "taluka": "Parola",
+                    "village_name": "Mohadi",
+                }
+            ],
+        )
+        for params in (
+            {"lat": 0.5},
+            {"lat": "north", "lng": 0.5},
+            {"lat": "nan", "lng": 1},
+        ):
+            self.assertEqual(lookup(**params).status_code, 400)
+
+    def test_batch_input_checks(self):
+        user = CustomUser(email="test@example.com")
+
+        def lookup(**data):
+            request = APIRequestFactory().post(
+                "/utils/plots/by-points/",
+                {"table": "jalgaon.parola_cadastrals", **data},
+                format="json",
+            )
+            force_authenticate(request, user=user)
+            with patch.object(
+                views, "has_plan_access", return_value=True
+            ), patch.object(views, "get_cadastral_index", return_value=self.index):
+                return get_plots_by_points(request)
+
+        for max_distance in (0, -5, "nan", "far"):
+            response = lookup(points=[[5, 5]], nearest=True, max_distance=max_distance)
+            self.assertEqual(response.status_code, 400, max_distance)
+
+        with self.settings(CADASTRAL_BATCH_MAX=2):
+            response = lookup(points=[[0, 0]] * 3)
+        self.assertIn("At most 2 points", response.data["error"])
+        self.assertEqual(lookup(points={"lng": 0}).status_code, 400)
+
+    def test_simplified_geometry_tiers(self):
+        plot = Point(75.0, 21.0).buffer(0.001, quad_segs=64)
+        index = CadastralIndex([plot], [{"plot_id": "a"}], tolerances=[1, 20])
+
+        def vertices(tolerance):
+            match = index.containing([(75.0, 21.0)], tolerance=tolerance)[0][0]
+            return len(match["geometry"]["coordinates"][0])
+
+        self.assertEqual(index.containing([(75.0, 21.0)]), [[{"plot_id": "a"}]])
+        self.assertEqual(vertices(0), len(plot.exterior.coords))
+        self.assertEqual(index.tier(spatial.tolerance_for_zoom(18)), 0)
+        self.assertEqual(index.tier(spatial.tolerance_for_zoom(12)), 20)
+        self.assertLess(vertices(spatial.tolerance_for_zoom(12)) * 10, vertices(0))
+        self.assertTrue(index.tiers[20][0].is_valid)
+
+        user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        request = APIRequestFactory().post(
+            "/utils/plots/by-points/",
+            {"table": "jalgaon.parola_cadastrals", "points": [[75, 21]], "zoom": 12},
+            format="json",
+        )
+        force_authenticate(request, user=user)
+        with patch.object(views, "has_plan_access", return_value=True), patch.object(
+            views, "get_cadastral_index", return_value=index
+        ):
+            response = get_plots_by_points(request)
+
+        self.assertEqual(response["X-Simplification-Tolerance"], "20")
+        self.assertIn("geometry", response.data[0]["plots"][0])
+
+    def test_invalid_tolerances(self):
+        self.assertEqual(self.index.tier(-5), 0)
+        self.assertEqual(self.index.tier(float("nan")), 0)
+
+        user = CustomUser(email="test@example.com")
+        for params in (
+            {"tolerance": "nan"},
+            {"tolerance": -5},
+            {"tolerance": "coarse"},
+            {"zoom": "-inf"},
+            {"zoom": 1e6},
+        ):
+            request = APIRequestFactory().post(
+                "/utils/plots/by-points/",
+                {
+                    "table": "jalgaon.parola_cadastrals",
+                    "points": [[0.5, 0.5]],
+                    **params,
+                },
+                format="json",
+            )
+            force_authenticate(request, user=user)
+            with patch.object(
+                views, "has_plan_access", return_value=True
+            ), patch.object(views, "get_cadastral_index", return_value=self.index):
+                response = get_plots_by_points(request)
+
+            self.assertEqual(response.status_code, 400, params)
+
+
+class VillageIndexTestCase(TestCase):
+
+    entries = [
+        {"khata_no": "10", "gat_no": "5/1", "survey_no": "7", "plot_id": "p-1"},
+        {"khata_no": "2", "gat_no": "5/1", "survey_no": "7", "plot_id": "p-2"},
+        {"khata_no": "10", "gat_no": "12", "survey_no": "8", "plot_id": "p-3"},
+    ]
+
+    def setUp(self):
+        cache.clear()
+        data_cache.clear_local_versions()
+        villages.clear_local_cache()
+
+    def test_lookups(self):
+        index = villages.VillageIndex(self.entries)
+
+        self.assertEqual(index.khata_numbers(), [2, 10])
+        self.assertEqual(index.numbers(villages.GAT), ["12", "5/1"])
+        self.assertEqual(index.plot_ids(villages.KHATA, " 10 "), ["p-1", "p-3"])
+        self.assertEqual(
+            index.related(villages.SURVEY, "7", villages.KHATA), ["2", "10"]
+        )
+        self.assertEqual(index.entries_for(villages.GAT, "missing"), [])
+
+    def test_built_once_per_records_version(self):
+        manager = MagicMock()
+        manager.get_preview_from_village.return_value = self.entries
+
+        with patch.object(villages, "mh_manager") as pool:
+            pool.return_value.__enter__.return_value = manager
+            villages.get_village_index("Jalgaon", "Parola", "Mohadi")
+            villages.get_village_index("JALGAON", "parola", "mohadi")
+            self.assertEqual(manager.get_preview_from_village.call_count, 1)
+
+            bump_data_version(RECORDS)
+            villages.get_village_index("Jalgaon", "Parola", "Mohadi")
+            self.assertEqual(manager.get_preview_from_village.call_count, 2)
+
+    def test_gat_search_versions(self):
+        raw = [{"plot_id": "p-1", "gat_no": "5/1", "area": "0.42"}]
+        manager = MagicMock()
+        manager.get_info_from_gat.return_value = raw
+        params = {
+            "gat_no": "5/1",
+            "district": "Jalgaon",
+            "taluka": "Parola",
+            "village": "Mohadi",
+        }
+        index = villages.VillageIndex(
+            [{**entry, "owner_name_english": "Patil"} for entry in self.entries]
+        )
+
+        with patch.object(views, "mh_manager") as pool:
+            pool.return_value.__enter__.return_value = manager
+            response = views.search_report_by_gat(
+                APIRequestFactory().get("/utils/reports/search/gat/", params)
+            )
+        with patch.object(views, "get_village_index", return_value=index):
+            v2 = views.search_report_by_gat_v2(
+                APIRequestFactory().get("/utils/reports/search/gat/v2/", params)
+            )
+
+        self.assertEqual(response.data, raw)
+        self.assertEqual([row["plot_id"] for row in v2.data], ["p-2", "p-1"])
+        self.assertEqual(
+            set(v2.data[0]),
+            {
+                "khata_no",
+                "plot_id",
+                "gat_no",
+                "survey_no",
+                "owner_names",
+                "district",
+                "taluka",
+                "village",
+            },
+        )
+
+    def test_columnar_storage_and_khata_range(self):
+        entries = [
+            {"khata_no": k, "plot_id": f"p-{k}", "owner_name_english": "Patil"}
+            for k in ("7", "12/A", "3", "10")
+        ]
+        index = villages.VillageIndex(entries)
+
+        self.assertEqual(index.owner_names, ["Patil"])
+        self.assertEqual(index.columns["khata_no"], ["3", "7", "10", "12/A"])
+        self.assertEqual(list(index.khata_range(4, 10)), [1, 2])
+        self.assertEqual(list(index.khata_range(start=8)), [2])
+        self.assertEqual(len(index.khata_range()), 4)
+        self.assertEqual(index.row(0)["owner_name_english"], "Patil")
+
+    def test_local_cache_is_bounded_by_size(self):
+        manager = MagicMock()
+        manager.get_preview_from_village.return_value = self.entries
+        size = villages.VillageIndex(self.entries).nbytes
+
+        with patch.object(villages, "mh_manager") as pool, self.settings(
+            VILLAGE_INDEX_LOCAL_MAX_BYTES=size * 2
+        ):
+            pool.return_value.__enter__.return_value = manager
+            for village in ("A", "B", "C"):
+                villages.get_village_index("Jalgaon", "Parola", village)
+
+        self.assertEqual(len(villages._local), 2)
+
+    def test_preview_endpoint_pages_by_khata(self):
+        entries = [
+            {"khata_no": str(k), "plot_id": f"p-{k}", "owner_name_english": "Patil"}
+            for k in range(1, 11)
+        ]
+        request = APIRequestFactory().get(
+            "/utils/khata-preview/",
+            {
+                "district": "Jalgaon",
+                "taluka": "Parola",
+                "village": "Mohadi",
+                "khata_from": 3,
+                "khata_to": 8,
+                "offset": 2,
+                "limit": 3,
+            },
+        )
+
+        with patch.object(
+            views,
+            "get_village_index",
+            return_value=villages.VillageIndex(entries),
+        ):
+            response = views.get_khata_preview(request)
+
+        self.assertEqual(response["X-Total-Count"], "6")
+        self.assertEqual(
+            [row["khata_no"] for row in json.loads(response.content)],
+            ["5", "6", "7"],
+        )
+
+    def test_numbers_endpoint_survives_a_failed_lookup(self):
+        index = villages.VillageIndex(self.entries)
+        request = APIRequestFactory().get(
+            "/utils/khata-numbers/",
+            {"district": "Jalgaon", "taluka_name": "Parola", "village_name": "Mohadi"},
+        )
+        force_authenticate(request, user=CustomUser(email="test@example.com"))
+
+        with patch.object(views, "get_village_index", return_value=index), patch.object(
+            index, "numbers", side_effect=[KeyError("gat"), ["7", "8"]]
+        ):
+            response = views.KhataNumbersView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content),
+            {"khata_numbers": [2, 10], "gat_numbers": [], "survey_numbers": ["7", "8"]},
+        )
+
+    def test_preview_endpoint_rejects_negative_pages(self):
+        location = {"district": "Jalgaon", "taluka": "Parola", "village": "Mohadi"}
+
+        for params in ({"offset": -2}, {"limit": -1}):
+            request = APIRequestFactory().get(
+                "/utils/khata-preview/", {**location, **params}
+            )
+            with patch.object(views, "get_village_index") as get_index:
+                response = views.get_khata_preview(request)
+
+            self.assertEqual(response.status_code, 400, params)
+            get_index.assert_not_called()
+
+
+class _Rows(list):
+    """Stands in for the values_list queryset of the unmanaged metadata table."""
+
+    def iterator(self, chunk_size=None):
+        return iter(self)
+
+
+class MaharashtraMetadataListTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        rows = _Rows(
+            (i, "MAHARASHTRA", "JALGAON", "Parola", f"Village {i}") for i in (3, 5, 9)
+        )
+        using = patch.object(MaharashtraMetadata.objects, "using")
+        queryset = using.start().return_value
+        self.addCleanup(using.stop)
+        queryset.filter.return_value.order_by.return_value.values_list.return_value = (
+            rows
+        )
+        self.filter = queryset.filter
+
+    def get(self, **params):
+        request = APIRequestFactory().get("/utils/maharashtra_metadata/", params)
+        force_authenticate(request, user=self.user)
+        return MaharashtraMetadataList.as_view()(request)
+
+    def test_keyset_page(self):
+        response = self.get(limit=2, after=1, district="jalgaon")
+
+        self.assertEqual(
+            [row["village_name"] for row in response.data], ["Village 3", "Village 5"]
+        )
+        self.assertEqual(response["X-Next-After"], "5")
+        self.filter.assert_called_once_with(ogc_fid__gt=1, district_name="JALGAON")
+
+    def test_last_page_has_no_cursor(self):
+        response = self.get(limit=3)
+
+        self.assertEqual(len(response.data), 3)
+        self.assertFalse(response.has_header("X-Next-After"))
+
+    def test_ndjson_stream(self):
+        response = self.get(stream=1)
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])["village_name"], "Village 3")
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+
+    def test_matches_json_renderer(self):
+        data = [
+            {
+                "id": uuid.uuid4(),
+                "created_at": datetime(2025, 1, 2, 3, 4, 5, 6789, tzinfo=timezone.utc),
+                "amount": Decimal("499.50"),
+                "owner_names": "पाटील",
+                "plots": [{"plot_id": "p-1", "gat_no": None}],
+            }
+        ]
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        rendered = ORJSONRenderer().render({"a": 1}, "application/json; indent=2", {})
+
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+
+class OwnerSearchTestCase(SimpleTestCase):
+
+    location = ("JALGAON", "Parola", "Mohadi")
+
+    def setUp(self):
+        self.village = villages.VillageIndex(
+            [
+                {
+                    "khata_no": "1",
+                    "plot_id": "p-1",
+                    "owner_name_english": "Patil Ramesh Shankar",
+                },
+                {
+                    "khata_no": "2",
+                    "plot_id": "p-2",
+                    "owner_name_english": "Patil Ramesh Shankar",
+                },
+                {
+                    "khata_no": "3",
+                    "plot_id": "p-3",
+                    "owner_name_english": "Kale Sunita",
+                },
+            ]
+        )
+
+    def test_ranked_trigram_matches(self):
+        index = owners.OwnerSearchIndex([(self.location, self.village)])
+
+        (name, score, plots), *rest = index.search("ramesh pati")
+
+        self.assertEqual(name, "Patil Ramesh Shankar")
+        self.assertEqual(
+            [(location, plot["plot_id"]) for location, plot in plots],
+            [(self.location, "p-1"), (self.location, "p-2")],
+        )
+        self.assertEqual(rest, [])
+        self.assertEqual(index.search("sunita")[0][0], "Kale Sunita")
+        self.assertEqual(index.search("zzz"), [])
+
+    def test_transliterated_keys(self):
+        marathi = {"patil": "पाटील", "ramesh": "रमेश", "shankar": "शंकर"}
+        index = owners.OwnerSearchIndex(
+            [(self.location, self.village)], lambda word: marathi.get(word, word)
+        )
+
+        self.assertEqual(index.search("रमेश पाटील")[0][0], "Patil Ramesh Shankar")
+
+    def test_search_within_taluka(self):
+        other = ("JALGAON", "Amalner", "Dhar")
+        index = owners.OwnerSearchIndex(
+            [(self.location, self.village), (other, self.village)]
+        )
+
+        ((_, _, plots),) = index.search("kale sunita", taluka="amalner")
+        self.assertEqual(
+            plots,
+            [
+                (
+                    other,
+                    {
+                        "khata_no": "3",
+                        "plot_id": "p-3",
+                        "gat_no": None,
+                        "survey_no": None,
+                    },
+                )
+            ],
+        )
+        self.assertEqual(index.search("kale", taluka="parola", village="dhar"), [])
+
+    def test_view_serves_prebuilt_indexes_only(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.addCleanup(owners._local.clear)
+        user = CustomUser(email="owner@example.com")
+        factory = APIRequestFactory()
+
+        def search():
+            request = factory.get(
+                "/reports/search/owner/", {"q": "ramesh", "district": "Jalgaon"}
+            )
+            force_authenticate(request, user=user)
+            return views.search_report_by_owner(request)
+
+        with self.settings(OWNER_INDEX_ROOT=root.name):
+            with patch.object(owners, "build_owner_index") as build:
+                self.assertEqual(search().status_code, 503)
+            build.assert_not_called()
+
+            index = owners.OwnerSearchIndex([(self.location, self.village)])
+            owners.save_owner_index("JALGAON", index)
+            response = search()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["plot_id"] for row in response.data], ["p-1", "p-2"])
+        self.assertEqual(response.data[0]["village"], "Mohadi")
+
+    def test_scope_covers_taluka(self):
+        tree = [
+            {
+                "code": "1",
+                "name": "JALGAON",
+                "talukas": [
+                    {
+                        "code": "11",
+                        "name": "Parola",
+                        "villages": [
+                            {"code": "111", "name": "Mohadi"},
+                            {"code": "112", "name": "Dharagir"},
+                        ],
+                    },
+                    {"code": "12", "name": "Amalner", "villages": []},
+                ],
+            }
+        ]
+        payload = hierarchy.HierarchyPayload(json.dumps(tree).encode())
+
+        with patch.object(owners, "get_hierarchy_payload", return_value=payload):
+            self.assertEqual(
+                owners.scope_villages("jalgaon", "parola"),
+                [("JALGAON", "Parola", "Mohadi"), ("JALGAON", "Parola", "Dharagir")],
+            )
+            self.assertEqual(
+                owners.scope_villages("jalgaon", "parola", "mohadi"),
+                [("JALGAON", "Parola", "Mohadi")],
+            )
+
+
+class LocationAutocompleteTestCase(TestCase):
+
+    rows = [
+        ("1", "JALGAON", "11", "Parola", "111", "Mohadi", "मोहाडी"),
+        ("1", "JALGAON", "11", "Parola", "112", "Parol", "पारोळ"),
+        ("1", "JALGAON", "12", "Pachora", "121", "Mohadi Bk.", "मोहाडी बु."),
+        ("2", "PUNE", "21", "Haveli", "211", "Parvati", "पर्वती"),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        data_cache.clear_local_versions()
+        autocomplete._cached.clear_local()
+        self.index = autocomplete.LocationIndex(self.rows)
+
+    def test_ranked_prefix_matches(self):
+        self.assertEqual(
+            [(m["type"], m["name"]) for m in self.index.complete("par")],
+            [
+                ("taluka", "Parola"),
+                ("village", "Parol"),
+                ("village", "Parvati"),
+            ],
+        )
+        self.assertEqual(
+            self.index.complete("moh", location_type="village")[1],
+            {
+                "type": "village",
+                "name": "Mohadi Bk.",
+                "code": "121",
+                "district_code": "1",
+                "taluka_code": "12",
+            },
+        )
+
+    def test_marathi_names(self):
+        self.assertEqual(
+            [m["code"] for m in self.index.complete("मोहा")], ["111", "121"]
+        )
+
+    def test_districts_are_not_crowded_out_by_villages(self):
+        rows = [
+            ("2", "PUNE", "21", "Haveli", f"2{i:04}", f"Pa{i:04}", None)
+            for i in range(600)
+        ]
+        index = autocomplete.LocationIndex(rows)
+
+        self.assertEqual(
+            [(m["type"], m["name"]) for m in index.complete("p", limit=2)],
+            [("district", "PUNE"), ("village", "Pa0000")],
+        )
+        self.assertEqual(
+            [m["name"] for m in index.complete("p", location_type="district")],
+            ["PUNE"],
+        )
+
+    def test_endpoint(self):
+        request = APIRequestFactory().get(
+            "/utils/locations/autocomplete/", {"q": "pu", "limit": 5}
+        )
+
+        with patch.object(autocomplete, "load_location_rows", return_value=self.rows):
+            response = views.location_autocomplete(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["name"] for m in response.data], ["PUNE"])
+
+
+class ImportTimeTestCase(SimpleTestCase):
+
+    def test_boot_skips_heavy_modules(self):
+        imports = measure_imports("base.urls")
+        slowest = sorted(imports, key=lambda i: i[2], reverse=True)[:15]
+
+        self.assertEqual(
+            heavy_imports(imports),
+            [],
+            "Slowest imports:\n"
+            + "\n".join(f"{c / 1000:.1f} ms {name}" for name, _, c, _ in slowest),
+        )
+
+
+class DatabaseStatsTestCase(TestCase):
+
+    def test_counts_new_connections(self):
+        before = db.connection_stats()["default"]["connections_opened"]
+
+        connection_created.send(sender=type(connection), connection=connection)
+
+        stats = db.connection_stats()["default"]
+        self.assertEqual(stats["connections_opened"], before + 1)
+        self.assertFalse(stats["pooled"])
+        self.assertIsNone(stats["pool"])
+
+    def test_endpoint_is_admin_only(self):
+        user = CustomUser.objects.create_user(email="u@example.com", password="x")
+        request = APIRequestFactory().get("/utils/database-stats/")
+        force_authenticate(request, user=user)
+        self.assertEqual(views.database_stats(request).status_code, 403)
+
+        user.is_staff = True
+        request = APIRequestFactory().get("/utils/database-stats/")
+        force_authenticate(request, user=user)
+        response = views.database_stats(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("default", response.data)
+
+
+@override_settings(
+    DATABASE_REPLICAS={
+        "default": {"replica_a": 2, "replica_b": 1, "replica_off": 0},
+    },
+    DATABASE_PRIMARY_STICKY_SECONDS=5,
+)
+class ReplicaRoutingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        data_cache.clear_local_versions()
+        self.router = routers.MultiDBRouter()
+        self.reads = []
+
+    def read(self, request):
+        self.reads.append(self.router.db_for_read(Plan))
+        return HttpResponse()
+
+    def write(self, request):
+        self.router.db_for_write(Plan)
+        self.reads.append(self.router.db_for_read(Plan))
+        return HttpResponse()
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Plan), "default")
+        self.assertEqual(self.router.db_for_read(MaharashtraMetadata), "external_db")
+
+    def test_weighted_replicas(self):
+        token = routers.begin_request()
+        try:
+            reads = {self.router.db_for_read(Plan) for _ in range(200)}
+            external = self.router.db_for_read(MaharashtraMetadata)
+        finally:
+            routers.end_request(token)
+
+        self.assertEqual(reads, {"replica_a", "replica_b"})
+        self.assertEqual(external, "external_db")
+
+    @override_settings(DATABASE_REPLICA_SELECTION="round_robin")
+    def test_round_robin_replicas(self):
+        token = routers.begin_request()
+        try:
+            reads = [self.router.db_for_read(Plan) for _ in range(6)]
+        finally:
+            routers.end_request(token)
+
+        self.assertEqual(sorted(reads), ["replica_a"] * 4 + ["replica_b"] * 2)
+
+    def test_reads_after_write_stick_to_primary(self):
+        middleware = ReplicaRoutingMiddleware(self.write)
+        response = middleware(RequestFactory().get("/"))
+        self.assertEqual(self.reads, ["default"])
+        self.assertIn("db_primary", response.cookies)
+
+        request = RequestFactory().get("/")
+        request.COOKIES["db_primary"] = "1"
+        ReplicaRoutingMiddleware(self.read)(request)
+        self.assertEqual(self.reads[-1], "default")
+
+    def test_unsafe_methods_use_primary(self):
+        response = ReplicaRoutingMiddleware(self.read)(RequestFactory().post("/"))
+        self.assertEqual(self.reads, ["default"])
+        self.assertNotIn("db_primary", response.cookies)
+
+    def test_user_sticks_to_primary_after_write(self):
+        def write_as_user(request):
+            routers.set_request_user(7)
+            return self.write(request)
+
+        def read_as_user(request):
+            routers.set_request_user(7)
+            return self.read(request)
+
+        ReplicaRoutingMiddleware(write_as_user)(RequestFactory().post("/"))
+        ReplicaRoutingMiddleware(read_as_user)(RequestFactory().get("/"))
+        ReplicaRoutingMiddleware(self.read)(RequestFactory().get("/"))
+
+        self.assertEqual(self.reads[:2], ["default", "default"])
+        self.assertIn(self.reads[2], {"replica_a", "replica_b"})
+
+    def test_use_primary(self):
+        token = routers.begin_request()
+        try:
+            with routers.use_primary():
+                self.assertEqual(self.router.db_for_read(Plan), "default")
+            self.assertNotEqual(self.router.db_for_read(Plan), "default")
+        finally:
+            routers.end_request(token)
+
+
+PROXY_DIR = settings.BASE_DIR.parent / "pg_tileserv_proxy"
+
+
+def proxy_secrets(location):
+    """
+    The environment variables pg_tileserv_proxy verifies the tokens of the
+    `location` block (the start of its regex) with.
+    """
+
+    conf = (PROXY_DIR / "nginx_tiles.conf").read_text()
+    start = conf.index(f"location ~ {location}")
+    end = conf.find("    location ", start + 1)
+    block = conf[start:end]
+    names = set()
+    for variable in re.findall(r"jwt:verify\((\w+),", block):
+        match = re.search(rf'^\s*{variable} = os\.getenv\("(\w+)"\)', conf, re.M)
+        names.add(match.group(1) if match else None)
+    return names
+
+
+@override_settings(
+    PROXY_URL="http://tiles.test/",
+    PROXY_SECRET_KEY="proxy-secret-used-by-the-tile-cache",
+)
+class TileCachePurgeTestCase(SimpleTestCase):
+
+    def test_purge_sends_layer_scoped_token(self):
+        response = MagicMock()
+        response.json.return_value = {
+            "layer": "jalgaon.parola_cadastrals",
+            "generation": 3,
+        }
+
+        with patch.object(tiles.requests, "post", return_value=response) as post:
+            generation = tiles.purge_tile_cache("jalgaon.parola_cadastrals")
+
+        self.assertEqual(generation, 3)
+        url = post.call_args.args[0]
+        self.assertEqual(url, "http://tiles.test/_purge/jalgaon.parola_cadastrals")
+        token = post.call_args.kwargs["headers"]["Authorization"].split()[1]
+        payload = jwt.decode(token, settings.PROXY_SECRET_KEY, algorithms=["HS256"])
+        self.assertEqual(payload["purge"], "jalgaon.parola_cadastrals")
+
+    @unittest.skipUnless(PROXY_DIR.exists(), "pg_tileserv_proxy isn't checked out")
+    def test_proxy_verifies_purges_with_the_same_secret(self):
+        """
+        The proxy reads the purge secret from the environment variable that
+        settings.PROXY_SECRET_KEY is loaded from, and nginx passes it through.
+        """
+
+        self.assertEqual(proxy_secrets("^/_purge/"), {"PROXY_SECRET_KEY"})
+        dockerfile = (PROXY_DIR / "Dockerfile").read_text()
+        self.assertRegex(dockerfile, r"env PROXY_SECRET_KEY;")
+        settings_file = (settings.BASE_DIR / "base" / "settings.py").read_text()
+        self.assertIn('PROXY_SECRET_KEY = env("PROXY_SECRET_KEY")', settings_file)
+
+    def test_proxy_verifies_tiles_with_the_same_secret(self):
+        """Tile tokens and sessions are verified with settings.TILE_TOKEN_SECRET."""
+
+        self.assertEqual(proxy_secrets("^/([^/]+)"), {"TILE_TOKEN_SECRET"})
+        dockerfile = (PROXY_DIR / "Dockerfile").read_text()
+        self.assertRegex(dockerfile, r"env TILE_TOKEN_SECRET;")
+        settings_file = (settings.BASE_DIR / "base" / "settings.py").read_text()
+        self.assertIn('TILE_TOKEN_SECRET = env("TILE_TOKEN_SECRET")', settings_file)
+
+    def test_command_reports_failures(self):
+        with patch.object(tiles.requests, "post") as post:
+            post.side_effect = tiles.requests.ConnectionError("refused")
+            with self.assertRaises(CommandError):
+                call_command(
+                    "purge_tile_cache",
+                    "jalgaon.parola_cadastrals",
+                    "bad layer",
+                    stderr=io.StringIO(),
+                )
+
+        self.assertEqual(post.call_count, 1)
+
+
+class MBTilesTestCase(SimpleTestCase):
+
+    layer = "jalgaon.parola_cadastrals"
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = self.settings(MBTILES_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write_archive(self, tiles):
+        writer = mbtiles.MBTilesWriter(mbtiles.archive_path(self.layer))
+        for (z, x, y), data in tiles.items():
+            writer.add(z, x, y, data)
+        writer.finish({"name": self.layer, "format": "pbf"})
+
+    def token(self, layer):
+        return tiles.sign_tile_token({"lid": layer})
+
+    def test_tile_math(self):
+        self.assertEqual(mbtiles.lnglat_to_tile(0, 0, 1), (1, 1))
+        self.assertEqual(mbtiles.lnglat_to_tile(75.1, 21.0, 12), (2902, 1803))
+        self.assertEqual(
+            list(mbtiles.tiles_in_bounds((75.0, 20.9, 75.7, 21.1), [8, 9])),
+            [(8, 181, 112), (9, 362, 225), (9, 363, 225)],
+        )
+
+    def test_archive_round_trip(self):
+        self.write_archive({(3, 2, 1): b"tile"})
+
+        archive = mbtiles.get_archive(self.layer)
+        self.assertEqual(archive.tile(3, 2, 1), b"tile")
+        self.assertIsNone(archive.tile(3, 2, 2))
+        self.assertEqual(archive.metadata()["format"], "pbf")
+        self.assertIsNone(mbtiles.get_archive("jalgaon.missing"))
+
+        self.write_archive({(3, 2, 1): b"new tile"})
+        self.assertEqual(mbtiles.get_archive(self.layer).tile(3, 2, 1), b"new tile")
+
+    def test_tile_view(self):
+        self.write_archive({(3, 2, 1): b"tile"})
+
+        def get(path, layer=self.layer):
+            request = RequestFactory().get(path, {"token": self.token(layer)})
+            return views.mbtiles_tile(request, self.layer, *map(int, path.split("/")))
+
+        response = get("3/2/1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"tile")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(get("3/2/2").status_code, 204)
+        self.assertEqual(get("3/2/1", layer="jalgaon.other").status_code, 403)
+
+    def test_render_command(self):
+        description = {
+            "layer": self.layer,
+            "columns": ["plot_id"],
+            "geometry": "geom",
+            "srid": 32643,
+            "bounds": (75.0, 20.9, 75.2, 21.1),
+        }
+        rendered = []
+
+        def render(description, z, x, y):
+            rendered.append((z, x, y))
+            return b"" if z == 9 else gzip.compress(b"mvt")
+
+        with patch.object(
+            render_mbtiles, "describe_layer", return_value=description
+        ), patch.object(render_mbtiles, "render_tile", side_effect=render):
+            call_command(
+                "render_mbtiles",
+                self.layer,
+                "--min-zoom=8",
+                "--max-zoom=9",
+                "--workers=1",
+                stdout=io.StringIO(),
+            )
+
+        archive = mbtiles.get_archive(self.layer)
+        self.assertEqual(rendered, [(8, 181, 112), (9, 362, 225)])
+        self.assertEqual(gzip.decompress(archive.tile(8, 181, 112)), b"mvt")
+        self.assertIsNone(archive.tile(9, 362, 225))
+        self.assertEqual(archive.metadata()["maxzoom"], "9")
+
+
+class TileSessionTestCase(TestCase):
+
+    tables = [
+        "jalgaon.parola_cadastrals",
+        "jalgaon.amalner_cadastrals",
+        "jalgaon.unknown_cadastrals",
+        "pune.haveli_cadastrals",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        data_cache.clear_local_versions()
+        hierarchy._cached.clear_local()
+        tiles.session_cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email="test@example.com", password="1234asdf"
+        )
+        tree = [
+            {
+                "code": "1",
+                "name": "JALGAON",
+                "talukas": [
+                    {"code": "11", "name": "Parola", "villages": []},
+                    {"code": "12", "name": "Amalner", "villages": []},
+                ],
+            }
+        ]
+        patcher = patch.object(hierarchy, "build_hierarchy", return_value=tree)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_grants_match_plan_access(self):
+        Plan.objects.create(user=self.user, plan_type="Taluka", entity_name="Parola")
+        grants = tiles.tile_grants(self.user)
+        self.assertEqual(grants, {"d": [], "t": ["jalgaon.parola"]})
+        for table in self.tables:
+            self.assertEqual(
+                tiles.grants_layer(grants, table), has_plan_access(self.user, table)
+            )
+
+        Plan.objects.create(user=self.user, plan_type="District", entity_name="Jalgaon")
+        grants = tiles.tile_grants(self.user)
+        self.assertEqual(grants, {"d": ["jalgaon"], "t": []})
+        for table in self.tables:
+            self.assertEqual(
+                tiles.grants_layer(grants, table), has_plan_access(self.user, table)
+            )
+
+    def test_session_is_reused_until_entitlements_change(self):
+        Plan.objects.create(user=self.user, plan_type="Taluka", entity_name="Parola")
+        first = tiles.issue_tile_session(self.user)
+        self.assertEqual(tiles.issue_tile_session(self.user)["token"], first["token"])
+        self.assertEqual(first["refresh_at"], first["expires_at"] - 30 * 60)
+
+        Plan.objects.create(user=self.user, plan_type="Taluka", entity_name="Amalner")
+        second = tiles.issue_tile_session(self.user)
+        self.assertNotEqual(second["token"], first["token"])
+        self.assertEqual(
+            tiles.tile_session_grants(second["token"])["t"],
+            ["jalgaon.amalner", "jalgaon.parola"],
+        )
+
+    @override_settings(PROXY_URL="http://tiles.test")
+    def test_session_endpoint_and_archive_tiles(self):
+        Plan.objects.create(user=self.user, plan_type="Taluka", entity_name="Parola")
+        request = APIRequestFactory().get("/utils/tiles/session/")
+        force_authenticate(request, user=self.user)
+        response = views.tile_session(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["tile_url"], "http://tiles.test/{layer}/{z}/{x}/{y}.pbf"
+        )
+        token = response.data["token"]
+        self.assertEqual(response.cookies["tile_session"].value, token)
+
+        with tempfile.TemporaryDirectory() as root, self.settings(MBTILES_ROOT=root):
+            for layer in ("jalgaon.parola_cadastrals", "jalgaon.amalner_cadastrals"):
+                writer = mbtiles.MBTilesWriter(mbtiles.archive_path(layer))
+                writer.add(3, 2, 1, b"tile")
+                writer.finish({"name": layer})
+
+            def get(layer):
+                request = RequestFactory().get("/", HTTP_X_TILE_TOKEN=token)
+                return views.mbtiles_tile(request, layer, 3, 2, 1)
+
+            self.assertEqual(get("jalgaon.parola_cadastrals").status_code, 200)
+            self.assertEqual(get("jalgaon.amalner_cadastrals").status_code, 403)
+
+
+class LayerCatalogTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        data_cache.clear_local_versions()
+        hierarchy._cached.clear_local()
+        catalog._cached.clear_local()
+        self.factory = APIRequestFactory()
+        tree = [
+            {
+                "code": "1",
+                "name": "JALGAON",
+                "talukas": [{"code": "11", "name": "Parola", "villages": []}],
+            }
+        ]
+        self.details = {
+            "jalgaon.parola_cadastrals": {
+                "attributes": [{"name": "plot_id", "type": "text"}],
+                "feature_count": 120,
+                "bounds": (75.0, 20.9, 75.7, 21.1),
+            },
+            "jalgaon.amalner_cadastrals": {
+                "attributes": [],
+                "feature_count": 0,
+                "bounds": None,
+            },
+        }
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        for patcher in (
+            patch.object(hierarchy, "build_hierarchy", return_value=tree),
+            patch.object(
+                catalog,
+                "discover_layers",
+                return_value={
+                    layer: ("MULTIPOLYGON", 32643) for layer in sorted(self.details)
+                },
+            ),
+            patch.object(catalog, "inspect_layer", side_effect=self.details.get),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings = override_settings(MBTILES_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_build_maps_entities_and_prunes(self):
+        LayerCatalog.objects.create(layer="pune.haveli_cadastrals")
+        writer = mbtiles.MBTilesWriter(
+            mbtiles.archive_path("jalgaon.parola_cadastrals")
+        )
+        writer.finish({"minzoom": 10, "maxzoom": 16})
+
+        call_command("build_layer_catalog", stdout=io.StringIO())
+
+        entries = {entry.layer: entry for entry in LayerCatalog.objects.all()}
+        self.assertEqual(set(entries), set(self.details))
+        parola = entries["jalgaon.parola_cadastrals"]
+        self.assertEqual((parola.entity_type, parola.entity_code), ("taluka", "11"))
+        self.assertEqual(parola.entity_name, "parola")
+        self.assertEqual((parola.min_zoom, parola.max_zoom), (10, 16))
+        self.assertEqual(parola.bounds, [75.0, 20.9, 75.7, 21.1])
+        amalner = entries["jalgaon.amalner_cadastrals"]
+        self.assertEqual((amalner.entity_type, amalner.entity_code), ("district", "1"))
+        self.assertEqual((amalner.min_zoom, amalner.max_zoom), (0, 22))
+        self.assertIsNone(amalner.bounds)
+
+        with self.assertRaises(CommandError):
+            call_command("build_layer_catalog", "pune.haveli_cadastrals")
+
+    def get(self, *args, **kwargs):
+        request = self.factory.get(*args, **kwargs)
+        force_authenticate(request, user=CustomUser(email="test@example.com"))
+        return request
+
+    def test_endpoints_are_cached_with_etags(self):
+        catalog.build_catalog()
+        self.assertEqual(views.layer_index(self.factory.get("/")).status_code, 403)
+
+        with self.assertNumQueries(1):
+            index = views.layer_index(self.get("/"))
+            views.layer_index(self.get("/"))
+        self.assertEqual(index.status_code, 200)
+        self.assertEqual(
+            [layer["id"] for layer in json.loads(index.content)],
+            ["jalgaon.amalner_cadastrals", "jalgaon.parola_cadastrals"],
+        )
+        revalidated = views.layer_index(self.get("/", HTTP_IF_NONE_MATCH=index["ETag"]))
+        self.assertEqual(revalidated.status_code, 304)
+
+        metadata = views.layer_metadata(self.get("/"), "jalgaon.parola_cadastrals")
+        self.assertEqual(json.loads(metadata.content)["feature_count"], 120)
+        self.assertEqual(
+            views.layer_metadata(self.get("/"), "pune.haveli").status_code, 404
+        )
+
+        extent = views.layer_extent(
+            self.get("/", {"layer": "jalgaon.parola_cadastrals"})
+        )
+        self.assertEqual(json.loads(extent.content)["extent"], [75.0, 20.9, 75.7, 21.1])
+        self.assertEqual(views.layer_extent(self.get("/")).status_code, 400)
+
+        self.details["jalgaon.parola_cadastrals"]["feature_count"] = 130
+        catalog.build_catalog(["jalgaon.parola_cadastrals"])
+        rebuilt = views.layer_index(self.get("/", HTTP_IF_NONE_MATCH=index["ETag"]))
+        self.assertEqual(rebuilt.status_code, 200)
+        self.assertEqual(LayerCatalog.objects.count(), 2)
@@ -0,0 +1,169 @@
+"""Tile access tokens and calls into the tile proxy (pg_tileserv_proxy).
+
+A tile session token covers every layer the user is entitled to. Its "tiles"
+claim lists the districts whose layers are all granted and the
+"district.taluka" pairs of individually granted talukas, matched against a
+table name the way HierarchyIndex.resolve_table does. The proxy can then check
+any layer without calling back, and tile URLs don't carry the token. Tokens are
+reused until they are within TILE_SESSION_REFRESH_AHEAD of expiring, or until
+the user's entitlements change.
+"""
+
+import hashlib
+import json
+import urllib.parse
+
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from user_auth.cache import TokenCache
+
+from .entitlements import (
+    DISTRICT,
+    TALUKA,
+    get_hierarchy_index,
+    get_user_entitlements,
+    normalize_name,
+)
+from .spatial import LAYER_RE
+
+
+def sign_tile_token(payload) -> str:
+    """Signs a tile token with TILE_TOKEN_SECRET, which pg_tileserv_proxy shares."""
+    return jwt.encode(payload, settings.TILE_TOKEN_SECRET, algorithm="HS256")
+
+
+def tile_token_layer(token):
+    """Returns the layer ("lid") a tile token grants, None if it isn't valid."""
+
+    try:
+        payload = jwt.decode(token, settings.TILE_TOKEN_SECRET, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    return payload.get("lid")
+
+
+SESSION_TYPE = "tile-session"
+SESSION_HEADER = "X-Tile-Token"
+
+
+def tile_grants(user) -> dict:
+    """The layers `user` may load, as carried in a tile session token."""
+
+    index = get_hierarchy_index()
+    entitlements = get_user_entitlements(user)
+    districts = {index.names[e] for e in entitlements if e[0] == DISTRICT}
+    talukas = set()
+    for entity in entitlements:
+        if entity[0] != TALUKA:
+            continue
+        district = index.names[index.parents[entity]]
+        if district not in districts:
+            talukas.add(f"{district}.{index.names[entity]}")
+    return {"d": sorted(districts), "t": sorted(talukas)}
+
+
+def grants_layer(grants, layer) -> bool:
+    if "." not in layer:
+        return False
+    schema, name = layer.split(".", 1)
+    schema = normalize_name(schema)
+    if schema in grants.get("d", ()):
+        return True
+    return f"{schema}.{normalize_name(name.rsplit('_', 1)[0])}" in grants.get("t", ())
+
+
+def issue_tile_session(user) -> dict:
+    """
+    Returns the user's tile session: the token, its grants, when it expires and
+    from when on it should be renewed (both unix timestamps).
+    """
+
+    lifetime = getattr(settings, "TILE_SESSION_LIFETIME", 12 * 60 * 60)
+    refresh_ahead = getattr(settings, "TILE_SESSION_REFRESH_AHEAD", 30 * 60)
+    grants = tile_grants(user)
+    digest = hashlib.sha256(json.dumps(grants).encode()).hexdigest()[:16]
+    key = f"tile-session:{user.pk}:{digest}"
+
+    session = cache.get(key)
+    if session is None:
+        now = timezone.now()
+        expires = now + timezone.timedelta(seconds=lifetime)
+        payload = {
+            "typ": SESSION_TYPE,
+            "uid": str(user.pk),
+            "tiles": grants,
+            "iat": now,
+            "exp": expires,
+        }
+        session = {
+            "token": sign_tile_token(payload),
+            "grants": grants,
+            "expires_at": int(expires.timestamp()),
+            "refresh_at": int(expires.timestamp()) - refresh_ahead,
+        }
+        # Handed out again until the refresh window starts.
+        cache.set(key, session, timeout=max(lifetime - refresh_ahead, 1))
+    return session
+
+
+session_cache = TokenCache(getattr(settings, "TILE_SESSION_CACHE_SIZE", 1024))
+
+
+def tile_session_grants(token):
+    """Returns the grants of a valid tile session token, None otherwise."""
+
+    payload = session_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(
+                token, settings.TILE_TOKEN_SECRET, algorithms=["HS256"]
+            )
+        except jwt.InvalidTokenError:
+            return None
+        if payload.get("typ") != SESSION_TYPE:
+            return None
+        session_cache.set(token, payload)
+    return payload["tiles"]
+
+
+def tile_request_allowed(request, layer) -> bool:
+    """
+    Checks the tile session token in the X-Tile-Token header or the session
+    cookie, or else a layer token (get_tile_url) in the query string.
+    """
+
+    cookie = getattr(settings, "TILE_SESSION_COOKIE", "tile_session")
+    token = request.headers.get(SESSION_HEADER) or request.COOKIES.get(cookie)
+    if token:
+        grants = tile_session_grants(token)
+        return grants is not None and grants_layer(grants, layer)
+    return tile_token_layer(request.GET.get("token", "")) == layer
+
+
+def purge_tile_cache(layer) -> int:
+    """
+    Drops the proxy's cached tiles of `layer`, e.g. after its cadastral data
+    was refreshed, and returns the layer's new cache generation. Raises
+    requests.RequestException when the proxy can't be reached or refuses.
+    """
+
+    if not LAYER_RE.match(layer):
+        raise ValueError(f"Invalid tile layer {layer!r}")
+
+    now = timezone.now()
+    token = jwt.encode(
+        {"purge": layer, "iat": now, "exp": now + timezone.timedelta(minutes=1)},
+        settings.PROXY_SECRET_KEY,
+        algorithm="HS256",
+    )
+    response = requests.post(
+        f"{settings.PROXY_URL.rstrip('/')}/_purge/{urllib.parse.quote(layer)}",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=getattr(settings, "TILE_PURGE_TIMEOUT", 10),
+    )
+    response.raise_for_status()
+    return response.json()["generation"]
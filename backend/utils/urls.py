@@ -1,5 +1,4 @@
 from django.urls import path
-from scipy.sparse.linalg._eigen import test
 from .views import (
     create_plan,
     create_report_plan,
@@ -12,16 +11,30 @@ from .views import (
     get_tile_url,
     report_gen,
     report_gen3,
+    create_report_job,
+    report_job_status,
+    download_report_job,
+    bulk_report_gen,
     MaharashtraMetadataList,
     maharashtra_hierarchy,
+    layer_index,
+    layer_metadata,
+    layer_extent,
+    location_autocomplete,
     KhataNumbersView,
     get_plot_by_lat_lng,
+    get_plots_by_points,
     get_khata_preview,
     get_available_reports,
     report_info_from_khata,
     search_report_by_survey,
     search_report_by_gat,
+    search_report_by_gat_v2,
+    search_report_by_owner,
     health_check,
+    database_stats,
+    mbtiles_tile,
+    tile_session,
     get_khata_from_survey_view,
     # get_access_token
 )
@@ -47,20 +60,50 @@ urlpatterns = [
     ),
     path("report-gen2/", report_gen, name="report-gen"),
     path("report-gen/", report_gen3, name="report_gen2"),
+    path("report-jobs/", create_report_job, name="create-report-job"),
+    path("report-jobs/<uuid:pk>/", report_job_status, name="report-job-status"),
+    path(
+        "report-jobs/<uuid:pk>/download/",
+        download_report_job,
+        name="report-job-download",
+    ),
     path(
         "maharashtra_metadata/",
         MaharashtraMetadataList.as_view(),
         name="maharashtra_metadata_list",
     ),
+    path("reports/bulk/", bulk_report_gen, name="bulk-report-gen"),
     path("maharashtra-hierarchy/", maharashtra_hierarchy, name="maharashtra_hierarchy"),
+    path("layers/index.json", layer_index, name="layer-index"),
+    path("layers/<str:layer>.json", layer_metadata, name="layer-metadata"),
+    path("layer-extent/", layer_extent, name="layer-extent"),
+    path(
+        "locations/autocomplete/",
+        location_autocomplete,
+        name="location-autocomplete",
+    ),
     path("khata-numbers/", KhataNumbersView.as_view(), name="khata_numbers"),
     path("plot/", get_plot_by_lat_lng, name="get_plot_by_lat_lng"),
+    path("plots/by-points/", get_plots_by_points, name="get-plots-by-points"),
     path("get_tile_url/", get_tile_url, name="proxy_access_token"),
+    path("tiles/session/", tile_session, name="tile-session"),
     path("khata-preview/", get_khata_preview, name="khata_preview"),  # get plot id
     path("reports-info/", get_available_reports, name="get_available_reports"),
     path("reports/search/gat/", search_report_by_gat, name="search_report_by_gat"),
+    path(
+        "reports/search/gat/v2/",
+        search_report_by_gat_v2,
+        name="search-report-by-gat-v2",
+    ),
     path("reports/search/survey/", search_report_by_survey, name="search_reports"),
+    path("reports/search/owner/", search_report_by_owner, name="search-report-by-owner"),
     path("khata/report-info/", report_info_from_khata, name="report-info-from-khata"),
     path("khata-from-survey/", get_khata_from_survey_view, name="get-khata-from-survey"),
     path("health-check/", health_check, name="health-check"),
+    path("database-stats/", database_stats, name="database-stats"),
+    path(
+        "tiles/<str:layer>/<int:z>/<int:x>/<int:y>.pbf",
+        mbtiles_tile,
+        name="mbtiles-tile",
+    ),
 ]
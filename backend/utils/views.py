@@ -1,24 +1,38 @@
 from email.policy import HTTP
-import jwt
 
+from django.conf import settings
 from django.utils import timezone
-from django.http import HttpResponse, JsonResponse
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from django.db import transaction, IntegrityError
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.views.decorators.http import require_http_methods
 
 from rest_framework.generics import ListAPIView, RetrieveAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView, View
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
 
 
+from base.renderers import ORJSONRenderer
+
 from .serializers import (
     PlanSerializer,
     ReportPlanSerializer,
     TransactionSerializer,
     MaharashtraMetadataSerializer,
+    ReportJobSerializer,
 )
 from .models import (
     Plan,
@@ -26,28 +40,67 @@ from .models import (
     Transaction,
     ReportPlan,
     MaharashtraMetadata,
+    ReportJob,
+    ReportJobStatus,
 )
-from .helpers import get_metadata_state, has_plan_access, get_report_access_plan
-from land_value.data_manager.all_manager.mh_all_manager import mh_all_manager
+from .helpers import has_plan_access, reserve_reports
+from .hierarchy import get_hierarchy_payload
+from .catalog import get_layer_catalog
+from .pool import mh_manager
+from .pdf_cache import ReportRenderError, open_report_pdf
+from .reports import enqueue_report_job, stream_report_zip
+from .spatial import get_cadastral_index, tolerance_for_zoom
+from .villages import GAT, KHATA, SURVEY, get_village_index
+from .owners import get_owner_index
+from .autocomplete import get_location_index
+from .db import connection_stats
+from .mbtiles import archived_layers, get_archive
+from .tiles import issue_tile_session, sign_tile_token, tile_request_allowed
+import json
+import math
+import time
 import urllib.parse
 
 # pyright: reportAttributeAccessIssue=false
 
-try:
-    from terra_utils import Config
-
-    config = Config(
-        "/home/ubuntu/terraview-django/backend/submodules/land_value/config"
-    )
-except Exception as e:
-    print(e)
-
 
 @require_http_methods(["HEAD", "GET"])
 def health_check(request):
     return HttpResponse(status=200)
 
 
+@require_http_methods(["HEAD", "GET"])
+def mbtiles_tile(request, layer, z, x, y):
+    """
+    Serves a tile of a pre-rendered layer (utils.mbtiles) to holders of a tile
+    session or of a tile token for that layer (see utils.tiles).
+    """
+
+    if not tile_request_allowed(request, layer):
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    archive = get_archive(layer)
+    if archive is None:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+    data = archive.tile(z, x, y)
+    if data is None:
+        response = HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    else:
+        response = HttpResponse(
+            data, content_type="application/vnd.mapbox-vector-tile"
+        )
+        response["Content-Encoding"] = "gzip"
+    response["Cache-Control"] = "private, max-age=3600"
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def database_stats(request):
+    """Connection reuse and pool statistics of this worker, per database alias."""
+    return Response(connection_stats(), status=status.HTTP_200_OK)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_plan(request):  # API not used.
@@ -129,57 +182,23 @@ class KhataNumbersView(APIView):
             )
 
         try:
-            all_manager_obj = mh_all_manager()
-            khata_numbers = sorted(
-                [
-                    int(i)
-                    for i in list(
-                        set(
-                            all_manager_obj.get_khata_from_village(
-                                district, taluka_name, village_name
-                            )
-                        )
-                    )
-                ]
-            )
-            
-            # Get gat numbers using the function from mh_all_manager
+            index = get_village_index(district, taluka_name, village_name)
+            khata_numbers = index.khata_numbers()
+
+            # Gat and survey numbers are optional, as when they were fetched
+            # separately from mh_all_manager.
             gat_numbers = []
             try:
-                gat_numbers = sorted(
-                    [
-                        str(i)
-                        for i in list(
-                            set(
-                                all_manager_obj.get_gat_from_village(
-                                    district, taluka_name, village_name
-                                )
-                            )
-                        )
-                    ]
-                )
+                gat_numbers = index.numbers(GAT)
             except Exception as e:
                 print(f"Error fetching gat numbers: {e}")
-            
-            # Get survey numbers using the function from mh_all_manager
+
             survey_numbers = []
             try:
-                survey_numbers = sorted(
-                    [
-                        str(i)
-                        for i in list(
-                            set(
-                                all_manager_obj.get_survey_from_village(
-                                    district, taluka_name, village_name
-                                )
-                            )
-                        )
-                    ]
-                )
+                survey_numbers = index.numbers(SURVEY)
             except Exception as e:
                 print(f"Error fetching survey numbers: {e}")
-            
-            print(f"Found {len(khata_numbers)} khata numbers, {len(gat_numbers)} gat numbers, {len(survey_numbers)} survey numbers")
+
             return JsonResponse({
                 "khata_numbers": khata_numbers,
                 "gat_numbers": gat_numbers,
@@ -241,9 +260,16 @@ class RetrieveTransactionView(RetrieveAPIView):
 
 
 class MaharashtraMetadataList(APIView):
-    """Returns metadata for Maharashtra contains all the states, districts, talukas and villages."""
+    """
+    Returns metadata for Maharashtra contains all the states, districts, talukas and villages.
+
+    Rows come in pages ordered by ogc_fid: pass the X-Next-After header of one
+    response as `after` to get the next page, `limit` sets the page size. With
+    `stream=1` every matching row is streamed as NDJSON instead.
+    """
 
     permission_classes = [IsAuthenticated]
+    fields = MaharashtraMetadataSerializer.Meta.fields
 
     def get(self, request):
         filters = {}
@@ -261,16 +287,122 @@ class MaharashtraMetadataList(APIView):
         if village:
             filters["village_name"] = village
 
-        data = MaharashtraMetadata.objects.using("external_db").filter(**filters)
-        serializer = MaharashtraMetadataSerializer(data, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            after = int(request.query_params.get("after", 0))
+            limit = min(
+                int(request.query_params.get("limit", settings.METADATA_PAGE_SIZE)),
+                settings.METADATA_MAX_PAGE_SIZE,
+            )
+        except ValueError:
+            return Response(
+                {"error": "after and limit must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if limit < 1:
+            return Response(
+                {"error": "limit must be positive"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = (
+            MaharashtraMetadata.objects.using("external_db")
+            .filter(ogc_fid__gt=after, **filters)
+            .order_by("ogc_fid")
+            .values_list("ogc_fid", *self.fields)
+        )
+
+        if request.query_params.get("stream"):
+            return StreamingHttpResponse(
+                self._ndjson(rows), content_type="application/x-ndjson"
+            )
+
+        # One extra row tells whether there is a next page.
+        page = list(rows[: limit + 1])
+        data = [dict(zip(self.fields, row[1:])) for row in page[:limit]]
+        response = Response(data, status=status.HTTP_200_OK)
+        if len(page) > limit:
+            response["X-Next-After"] = str(page[limit - 1][0])
+        return response
+
+    def _ndjson(self, rows):
+        # A server-side cursor keeps memory flat however many rows match.
+        chunk_size = settings.METADATA_STREAM_CHUNK_SIZE
+        lines = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            lines.append(json.dumps(dict(zip(self.fields, row[1:]))))
+            if len(lines) >= chunk_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+
+def _payload_response(request, payload, private=False):
+    """
+    Serves a pre-serialized payload, honouring If-None-Match and Accept-Encoding.
+    `private` keeps shared caches from storing it, for authenticated endpoints.
+    """
+
+    if_none_match = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    matched = payload.etags.intersection(if_none_match)
+    if matched or "*" in if_none_match:
+        response = HttpResponseNotModified()
+        response["ETag"] = matched.pop() if matched else payload.etag
+    else:
+        body, encoding, etag = payload.negotiate(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["Cache-Control"] = "private, no-cache" if private else "public, no-cache"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
 
 
 @api_view(["GET"])
 # @permission_classes([IsAuthenticated])
 def maharashtra_hierarchy(request):
-    hierarchy = get_metadata_state()
-    return JsonResponse(hierarchy, status=200, safe=False)
+    """Serves the cached hierarchy, honouring If-None-Match and Accept-Encoding."""
+    return _payload_response(request, get_hierarchy_payload())
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def layer_index(request):
+    """Lists the catalogued tile layers (see utils.catalog) like pg_tileserv's index."""
+    return _payload_response(request, get_layer_catalog().index, private=True)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def layer_metadata(request, layer):
+    """Serves the catalogued metadata of one tile layer."""
+    payload = get_layer_catalog().layers.get(layer)
+    if payload is None:
+        return Response(
+            {"error": f"Unknown layer {layer}"}, status=status.HTTP_404_NOT_FOUND
+        )
+    return _payload_response(request, payload, private=True)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def layer_extent(request):
+    """Returns the bounds of a tile layer, [west, south, east, north] in EPSG:4326."""
+    layer = request.query_params.get("layer")
+    if not layer:
+        return Response(
+            {"error": "Missing required parameter: layer"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    payload = get_layer_catalog().extents.get(layer)
+    if payload is None:
+        return Response(
+            {"error": f"Unknown layer {layer}"}, status=status.HTTP_404_NOT_FOUND
+        )
+    return _payload_response(request, payload, private=True)
 
 
 @api_view(["GET"])
@@ -290,20 +422,18 @@ def report_gen(request):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    all_manager_obj = mh_all_manager()
-    pdf = all_manager_obj.get_plot_pdf_by_plot_id(plot_id)
-
-    if not pdf:
+    try:
+        pdf = open_report_pdf(plot_id)
+    except ReportRenderError:
         return Response(
             {"detail": "Failed to generate report"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
     filename = f"{plot_id}_plot.pdf"
-    response = HttpResponse(pdf.getvalue(), content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-
-    return response
+    return FileResponse(
+        pdf, as_attachment=True, filename=filename, content_type="application/pdf"
+    )
 
 
 @api_view(["GET"])
@@ -330,54 +460,251 @@ def report_gen3(request):
             {"detail": "Invalid query parameters"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    plan = get_report_access_plan(user)
+    reserved = reserve_reports(
+        user,
+        [
+            {
+                "khata_no": khata_no,
+                "village": params.get("village"),
+                "taluka": params.get("taluka"),
+                "district": params.get("district"),
+            }
+        ],
+    )
 
-    if not plan:
+    if not reserved:
         return Response(
             {"detail": "User does not have access to any plan"},
             status=status.HTTP_403_FORBIDDEN,
         )
 
-    all_manager_obj = mh_all_manager()
-    pdf = all_manager_obj.get_plot_pdf_by_plot_id(plot_id)
-
-    if not pdf:
+    try:
+        pdf = open_report_pdf(plot_id)
+    except Exception as e:
+        # Give the reserved report back, the user never received it.
+        reserved[0].delete()
+        if not isinstance(e, ReportRenderError):
+            raise
         return Response(
             {"error": "Failed to generate report"}, status=status.HTTP_400_BAD_REQUEST
         )
+
+    return FileResponse(
+        pdf,
+        as_attachment=True,
+        filename=f"{khata_no}_plot.pdf",
+        content_type="application/pdf",
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def create_report_job(request):
+    """Reserves a report and queues its PDF for rendering in the background."""
+
+    user = request.user
+    params = {
+        key: str(request.data.get(key, "")).strip().lower()
+        for key in ["state", "district", "taluka", "village"]
+    }
+    khata_no = request.data.get("khata_no")
+    plot_id = request.data.get("plot_id")
+
+    if not khata_no or not plot_id or any(not v for v in params.values()):
+        return Response(
+            {"detail": "Invalid query parameters"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
     try:
         with transaction.atomic():
-            village = params.get("village")
-            taluka = params.get("taluka")
-            district = params.get("district")
-
-            ReportTransaction.objects.create(
-                report_plan=plan,
-                khata_no=khata_no,
-                village=village,
-                taluka=taluka,
-                district=district,
+            reserved = reserve_reports(
+                user,
+                [
+                    {
+                        "khata_no": khata_no,
+                        "village": params.get("village"),
+                        "taluka": params.get("taluka"),
+                        "district": params.get("district"),
+                    }
+                ],
             )
-
-            response = HttpResponse(pdf.getvalue(), content_type="application/pdf")
-            response["Content-Disposition"] = (
-                f'attachment; filename="{khata_no}_plot.pdf"'
+            if not reserved:
+                return Response(
+                    {"detail": "User does not have access to any plan"},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            job = ReportJob.objects.create(
+                user=user,
+                report_transaction=reserved[0],
+                plot_id=plot_id,
+                khata_no=khata_no,
             )
-            return response
-
+            enqueue_report_job(job)
     except IntegrityError:
         return Response(
             {"error": "Failed to create report transaction"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
-    except Exception as e:
-        print(f"[ERROR]: An unexpected error occurred: {str(e)}")
+
+    serializer = ReportJobSerializer(job, context={"request": request})
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def report_job_status(request, pk):
+    """
+    Returns the job's status right away. While the job is still running, the
+    Retry-After header says when to poll again, so no worker is held waiting.
+    """
+
+    job = ReportJob.objects.filter(pk=pk, user=request.user).first()
+    if not job:
+        return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    serializer = ReportJobSerializer(job, context={"request": request})
+    response = Response(serializer.data, status=status.HTTP_200_OK)
+    if not job.is_finished:
+        response["Retry-After"] = str(settings.REPORT_JOB_RETRY_AFTER)
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def download_report_job(request, pk):
+    job = ReportJob.objects.filter(pk=pk, user=request.user).first()
+    if not job:
+        return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if not job.is_finished:
         return Response(
-            {"error": f"An unexpected error occurred: {str(e)}"},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            {"error": "Report is not ready yet"}, status=status.HTTP_409_CONFLICT
+        )
+
+    if job.status == ReportJobStatus.FAILED:
+        return Response({"error": job.error}, status=status.HTTP_410_GONE)
+
+    try:
+        pdf = open(job.file_path, "rb")
+    except FileNotFoundError:
+        # Evicted from the PDF cache since the job ran, render it again.
+        try:
+            pdf = open_report_pdf(job.plot_id)
+        except ReportRenderError as e:
+            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
+
+    return FileResponse(
+        pdf,
+        as_attachment=True,
+        filename=f"{job.khata_no or job.plot_id}_plot.pdf",
+        content_type="application/pdf",
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_report_gen(request):
+    """
+    Streams a ZIP of reports for a village, optionally narrowed down to a khata or
+    a list of plot_ids. Quota for every report is reserved up front in one go.
+    """
+
+    user = request.user
+    params = {
+        key: str(request.data.get(key, "")).strip()
+        for key in ["district", "taluka", "village"]
+    }
+    khata_no = request.data.get("khata_no")
+    plot_ids = request.data.get("plot_ids")
+
+    if any(not v for v in params.values()):
+        return Response(
+            {"detail": "Invalid query parameters"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if plot_ids is not None and not isinstance(plot_ids, list):
+        return Response(
+            {"detail": "plot_ids must be a list"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    index = get_village_index(params["district"], params["taluka"], params["village"])
+    entries = index.entries_for(KHATA, khata_no) if khata_no else index.entries
+
+    wanted = {str(p) for p in plot_ids} if plot_ids is not None else None
+    plots = {}
+    for entry in entries:
+        plot_id = str(entry["plot_id"])
+        if wanted is not None and plot_id not in wanted:
+            continue
+        plots.setdefault(plot_id, str(entry["khata_no"]))
+
+    if not plots:
+        return Response(
+            {"error": "No plots found for the selection"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    if len(plots) > settings.BULK_REPORT_MAX:
+        return Response(
+            {"error": f"At most {settings.BULK_REPORT_MAX} reports per request"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    location = {key: value.lower() for key, value in params.items()}
+    reserved = reserve_reports(
+        user,
+        [{"khata_no": khata, **location} for khata in plots.values()],
+    )
+    if reserved is None:
+        return Response(
+            {"detail": f"Not enough reports left in your plans for {len(plots)}"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+
+    transaction_ids = dict(zip(plots, (t.id for t in reserved)))
+
+    def refund(failed_plot_ids):
+        ReportTransaction.objects.filter(
+            id__in=[transaction_ids[p] for p in failed_plot_ids]
+        ).delete()
+
+    response = StreamingHttpResponse(
+        stream_report_zip(
+            [(plot_id, f"{khata}_{plot_id}.pdf") for plot_id, khata in plots.items()],
+            on_failed=refund,
+        ),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{params["village"]}_reports.zip"'
+    )
+    return response
+
+
+@api_view(["GET"])
+# @permission_classes([IsAuthenticated])
+def location_autocomplete(request):
+    """Returns districts, talukas and villages whose name starts with `q`."""
+
+    query = request.query_params.get("q", "").strip()
+    location_type = request.query_params.get("type") or None
+
+    if not query:
+        return Response(
+            {"error": "Missing required parameters"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if location_type not in (None, "district", "taluka", "village"):
+        return Response(
+            {"error": "Invalid location type"}, status=status.HTTP_400_BAD_REQUEST
         )
-    response = HttpResponse(pdf.getvalue(), content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{khata_no}_plot.pdf"'
+    try:
+        limit = min(int(request.query_params.get("limit", 10)), 50)
+    except ValueError:
+        return Response(
+            {"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    matches = get_location_index().complete(query, limit, location_type)
+    response = Response(matches, status=status.HTTP_200_OK)
+    response["Cache-Control"] = "public, max-age=300"
     return response
 
 
@@ -393,7 +720,6 @@ def get_tile_url(request):
     if has_plan_access(user, table):
         print("[INFO]: User has access to table")
         l_id = table
-        SECRET_KEY = "tudu"  # FIXME: Load the secret key from the config
 
         payload = {
             "uid": str(user.id),
@@ -403,11 +729,17 @@ def get_tile_url(request):
         }
 
         # Generate the JWT token
-        token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-
-        tile_url = (
-            f"http://43.204.226.30:8088/{l_id}/{{z}}/{{x}}/{{y}}.pbf?token={token}"
-        )
+        token = sign_tile_token(payload)
+
+        if get_archive(l_id) is not None:
+            # Pre-rendered layers are served from their archive (mbtiles_tile).
+            prefix = reverse("mbtiles-tile", args=[l_id, 0, 0, 0])
+            prefix = request.build_absolute_uri(prefix.removesuffix("0/0/0.pbf"))
+            tile_url = f"{prefix}{{z}}/{{x}}/{{y}}.pbf?token={token}"
+        else:
+            tile_url = (
+                f"http://43.204.226.30:8088/{l_id}/{{z}}/{{x}}/{{y}}.pbf?token={token}"
+            )
 
         print(tile_url)
         return Response({"tile_url": tile_url}, status=status.HTTP_200_OK)
@@ -418,17 +750,134 @@ def get_tile_url(request):
         )
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def tile_session(request):
+    """
+    Issues one tile token for every layer the user is entitled to. Clients send
+    it as the X-Tile-Token header (or rely on the cookie) with tile requests
+    and fetch a new one once `refresh_at` has passed.
+    """
+
+    session = issue_tile_session(request.user)
+    archives = reverse("mbtiles-tile", args=["layer", 0, 0, 0])
+    archives = request.build_absolute_uri(archives.removesuffix("layer/0/0/0.pbf"))
+    response = Response(
+        {
+            **session,
+            "tile_url": (
+                f"{settings.PROXY_URL.rstrip('/')}/{{layer}}/{{z}}/{{x}}/{{y}}.pbf"
+            ),
+            # Pre-rendered layers are served from their archive instead.
+            "archive_tile_url": f"{archives}{{layer}}/{{z}}/{{x}}/{{y}}.pbf",
+            "archived_layers": archived_layers(),
+        },
+        status=status.HTTP_200_OK,
+    )
+    response.set_cookie(
+        getattr(settings, "TILE_SESSION_COOKIE", "tile_session"),
+        session["token"],
+        max_age=max(session["expires_at"] - int(time.time()), 0),
+        domain=getattr(settings, "TILE_SESSION_COOKIE_DOMAIN", None),
+        secure=request.is_secure(),
+        httponly=True,
+        samesite="Lax",
+    )
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+# Deepest map zoom accepted, tolerance_for_zoom is well below a millimeter there.
+MAX_ZOOM = 30
+
+
+def _number_param(params, name, upper=None):
+    """A finite number >= 0 (and <= `upper`) from `params`, raises ValueError."""
+
+    try:
+        value = float(params[name])
+    except (TypeError, ValueError):
+        value = math.nan
+    if not math.isfinite(value) or value < 0 or (upper is not None and value > upper):
+        bounds = f"between 0 and {upper}" if upper is not None else "0 or more"
+        raise ValueError(f"{name} must be a number {bounds}")
+    return value
+
+
+def _simplification_tolerance(params):
+    """
+    The tolerance in meters plot geometry was asked for, directly or through
+    a map "zoom", or None to leave geometry out. Raises ValueError.
+    """
+    if params.get("tolerance") is not None:
+        return _number_param(params, "tolerance")
+    if params.get("zoom") is not None:
+        return tolerance_for_zoom(_number_param(params, "zoom", upper=MAX_ZOOM))
+    return None
+
+
+def _plot_details(entry) -> dict:
+    """A plot in the shape get_plot_by_lat_lng has always returned."""
+
+    details = {
+        "khata_no": entry["khata_no"],
+        "plot_id": entry["plot_id"],
+        "gat_no": entry["gat_no"],
+        "survey_no": entry["survey_no"],
+        "owner_names": entry["owner_name_english"],
+        "district": entry["district"],
+        "taluka": entry["taluka"],
+        "village_name": entry["village_name"],
+    }
+    if "geometry" in entry:
+        details["geometry"] = entry["geometry"]
+    return details
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_plot_by_lat_lng(request):
-    lat = request.query_params.get("lat")
-    lng = request.query_params.get("lng")
+    try:
+        lat = float(request.query_params["lat"])
+        lng = float(request.query_params["lng"])
+    except (KeyError, ValueError):
+        return Response(
+            {"error": "lat and lng must be numbers"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        return Response(
+            {"error": "lat and lng must be numbers"}, status=status.HTTP_400_BAD_REQUEST
+        )
     state = "maharashtra"
     if state in request.query_params:
         state = request.query_params.get("state")
-    coordinates = {"lng": float(lng), "lat": float(lat)}
-    cad_manager = mh_all_manager().cadastral_manager
-    entries = cad_manager.get_plot_by_lat_lng(coordinates, limit=10)
+    table = request.query_params.get("table")
+    if table:
+        # Answered from the in-process index of the layer the user clicked on.
+        table = table.strip()
+        if not has_plan_access(request.user, table):
+            return Response(
+                {"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED
+            )
+        try:
+            tolerance = _simplification_tolerance(request.query_params)
+            index = get_cadastral_index(table)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        entries = index.containing([(lng, lat)], tolerance=tolerance)[0]
+        if not entries:
+            return Response([], status=status.HTTP_404_NOT_FOUND)
+        response = Response(
+            [_plot_details(entry) for entry in entries], status=status.HTTP_200_OK
+        )
+        if tolerance is not None:
+            response["X-Simplification-Tolerance"] = str(index.tier(tolerance))
+        return response
+
+    coordinates = {"lng": lng, "lat": lat}
+    with mh_manager() as all_manager_obj:
+        cad_manager = all_manager_obj.cadastral_manager
+        entries = cad_manager.get_plot_by_lat_lng(coordinates, limit=10)
     if not entries:
         return Response(
             [],
@@ -436,23 +885,88 @@ def get_plot_by_lat_lng(request):
         )
     print("[INFO]: lat-long sample entry: ", entries[0])
 
-    details = []
+    details = [_plot_details(entry) for entry in entries]
 
-    for entry in entries:
-        details.append(
-            {
-                "khata_no": entry["khata_no"],
-                "plot_id": entry["plot_id"],
-                "gat_no": entry["gat_no"],
-                "survey_no": entry["survey_no"],
-                "owner_names": entry["owner_name_english"],
-                "district": entry["district"],
-                "taluka": entry["taluka"],
-                "village_name": entry["village_name"],
-            }
+    return Response(details, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def get_plots_by_points(request):
+    """
+    Looks up many points on one cadastral layer in a single request. Accepts
+    {"table": ..., "points": [[lng, lat], ...]} and, with "nearest": true, falls
+    back to the closest plot within "max_distance" meters for points that aren't
+    inside any plot. With a map "zoom" or a "tolerance" in meters, the plots'
+    geometry is included, simplified to match (see utils.spatial).
+    """
+
+    table = str(request.data.get("table", "")).strip()
+    points = request.data.get("points")
+    nearest = bool(request.data.get("nearest", False))
+    max_distance = request.data.get("max_distance")
+
+    if not table or not points:
+        return Response(
+            {"detail": "Invalid query parameters"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if isinstance(points, list) and len(points) > settings.CADASTRAL_BATCH_MAX:
+        return Response(
+            {"error": f"At most {settings.CADASTRAL_BATCH_MAX} points per request"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        if not isinstance(points, list):
+            raise TypeError
+        points = [(float(lng), float(lat)) for lng, lat in points]
+    except (TypeError, ValueError):
+        return Response(
+            {"detail": "points must be a list of [lng, lat] pairs"},
+            status=status.HTTP_400_BAD_REQUEST,
         )
+    if max_distance is not None:
+        try:
+            max_distance = float(max_distance)
+        except (TypeError, ValueError):
+            max_distance = math.nan
+        # query_nearest rejects 0 and below, and NaN would make the search unbounded.
+        if not math.isfinite(max_distance) or max_distance <= 0:
+            return Response(
+                {"detail": "max_distance must be a number above 0"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+    try:
+        tolerance = _simplification_tolerance(request.data)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not has_plan_access(request.user, table):
+        return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
 
-    return Response(details, status=status.HTTP_200_OK)
+    try:
+        index = get_cadastral_index(table)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = index.containing(points, tolerance=tolerance)
+    if nearest:
+        missing = [i for i, plots in enumerate(results) if not plots]
+        closest = index.nearest(
+            [points[i] for i in missing], max_distance, tolerance=tolerance
+        )
+        for i, plot in zip(missing, closest):
+            if plot is not None:
+                results[i] = [plot]
+
+    response = Response(
+        [
+            {"lng": lng, "lat": lat, "plots": plots}
+            for (lng, lat), plots in zip(points, results)
+        ],
+        status=status.HTTP_200_OK,
+    )
+    if tolerance is not None:
+        response["X-Simplification-Tolerance"] = str(index.tier(tolerance))
+    return response
 
 
 @api_view(["GET"])
@@ -463,8 +977,6 @@ def get_khata_preview(request):
     district = urllib.parse.unquote(request.query_params.get("district", ""))
     taluka = urllib.parse.unquote(request.query_params.get("taluka", ""))
     village = urllib.parse.unquote(request.query_params.get("village", ""))
-    print("[INFO]: Khata Preview, preview-params: ", state, district, taluka, village)
-
 
     if not all([state, district, taluka, village]):
         return Response(
@@ -472,27 +984,36 @@ def get_khata_preview(request):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    mh_all_manager_obj = mh_all_manager()
-    entries = mh_all_manager_obj.get_preview_from_village(district, taluka, village)
-
-    print("[INFO]: Khata Preview, preview-sample-data: ", entries[0])
-    details = []
-    for entry in entries:
-        details.append(
-            {
-                "khata_no": entry["khata_no"],
-                "village_name": village,
-                "owner_names": entry["owner_name_english"],
-                "district": district,
-                "taluka": taluka,
-                "plot_id": entry["plot_id"],
-                "gat_no": entry["gat_no"],
-                "survey_no": entry["survey_no"],
-            }
+    try:
+        khata_from = request.query_params.get("khata_from")
+        khata_to = request.query_params.get("khata_to")
+        khata_from = int(khata_from) if khata_from else None
+        khata_to = int(khata_to) if khata_to else None
+        offset = int(request.query_params.get("offset", 0))
+        limit = request.query_params.get("limit")
+        limit = int(limit) if limit else None
+    except ValueError:
+        return Response(
+            {"error": "khata_from, khata_to, offset and limit must be integers"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if offset < 0 or (limit is not None and limit < 0):
+        return Response(
+            {"error": "offset and limit can't be negative"},
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
-    print("[INFO]: Khata Preview, preview-entries count: ", len(details))
-    return Response(details, status=status.HTTP_200_OK)
+    index = get_village_index(district, taluka, village)
+    rows = index.khata_range(khata_from, khata_to)
+    page = rows[offset : offset + limit if limit is not None else None]
+
+    # Serialized straight from the index columns, skipping Response rendering.
+    response = HttpResponse(
+        ORJSONRenderer().dumps(index.preview(page, district, taluka, village)),
+        content_type="application/json",
+    )
+    response["X-Total-Count"] = str(len(rows))
+    return response
 
 
 # @api_view(["GET"])
@@ -550,25 +1071,16 @@ def report_info_from_khata(request):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    all_manager_obj = mh_all_manager()
-    if number_type == "khata":
-        entries = all_manager_obj.get_info_from_khata(
-            district=district, village=village, taluka=taluka, khata_no=number
-        )
-    elif number_type == "gat":
-        entries = all_manager_obj.get_info_from_gat(
-            district=district, village=village, taluka=taluka, gat_no=number
-        )
-    elif number_type == "survey":
-        entries = all_manager_obj.get_info_from_survey(
-            district=district, village=village, taluka=taluka, survey_no=number
-        )
-    else:
+    if number_type not in ("khata", "gat", "survey"):
         return Response(
             {"error": "Invalid number type"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    entries = get_village_index(district, taluka, village).entries_for(
+        number_type, number
+    )
+
     if not entries:
         return Response(
             {"error": "No entries found"},
@@ -600,14 +1112,13 @@ def report_info_from_khata(request):
 def get_available_reports(request):
     """Retuns the no of reports the user can access and total no of reports"""
     user = request.user
-    quantity = 0
-    reports_downloaded = 0
-    plans = ReportPlan.objects.filter(user=user)
-    for plan in plans:
-        quantity += plan.quantity
-        reports_downloaded += plan.total_transactions
+    totals = ReportPlan.objects.filter(user=user).aggregate(
+        quantity=Coalesce(Sum("quantity"), 0),
+        used=Coalesce(Sum("used_count"), 0),
+    )
     return Response(
-        {"quantity": quantity, "used": reports_downloaded}, status=status.HTTP_200_OK
+        {"quantity": totals["quantity"], "used": totals["used"]},
+        status=status.HTTP_200_OK,
     )
 
 
@@ -627,8 +1138,8 @@ def get_khata_from_survey_view(request):
         )
 
     try:
-        amo = mh_all_manager()
-        khata_numbers = amo.get_khata_from_survey(district, taluka, village, survey_no)
+        index = get_village_index(district, taluka, village)
+        khata_numbers = index.related(SURVEY, survey_no, KHATA)
         return Response({"khata_numbers": khata_numbers}, status=status.HTTP_200_OK)
     except Exception as e:
         print(f"Error getting khata from survey: {e}")
@@ -652,14 +1163,52 @@ def search_report_by_gat(request):
             {"error": "Missing required parameters"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    amo = mh_all_manager()
-    entries = amo.get_info_from_gat(district, taluka, village, gat_no)
+    # The raw get_info_from_gat rows, search_report_by_gat_v2 answers from the
+    # village index instead.
+    with mh_manager() as all_manager_obj:
+        entries = all_manager_obj.get_info_from_gat(district, taluka, village, gat_no)
 
     print(entries)
 
     return Response(entries, status=status.HTTP_200_OK)
 
 
+@api_view(["GET"])
+# @permission_classes([IsAuthenticated])
+def search_report_by_gat_v2(request):
+    """
+    Returns the reports by gat no from the village index, in the shape of
+    search_report_by_survey rather than the raw rows of search_report_by_gat.
+    """
+
+    gat_no = urllib.parse.unquote(request.query_params.get("gat_no", ""))
+    district = urllib.parse.unquote(request.query_params.get("district", ""))
+    taluka = urllib.parse.unquote(request.query_params.get("taluka", ""))
+    village = urllib.parse.unquote(request.query_params.get("village", ""))
+
+    if not all([gat_no, district, taluka, village]):
+        return Response(
+            {"error": "Missing required parameters"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    entries = get_village_index(district, taluka, village).entries_for(GAT, gat_no)
+    data = [
+        {
+            "khata_no": entry["khata_no"],
+            "plot_id": entry["plot_id"],
+            "gat_no": entry["gat_no"],
+            "survey_no": entry["survey_no"],
+            "owner_names": entry["owner_name_english"],
+            "district": district,
+            "taluka": taluka,
+            "village": village,
+        }
+        for entry in entries
+    ]
+
+    return Response(data, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 # @permission_classes([IsAuthenticated])
 def search_report_by_survey(request):
@@ -676,8 +1225,9 @@ def search_report_by_survey(request):
             {"error": "Missing required parameters"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    amo = mh_all_manager()
-    entries = amo.get_info_from_survey(district, taluka, village, survey_no)
+    entries = get_village_index(district, taluka, village).entries_for(
+        SURVEY, survey_no
+    )
     data = []
 
     for entry in entries:
@@ -695,3 +1245,56 @@ def search_report_by_survey(request):
         )
 
     return Response(data, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_report_by_owner(request):
+    """
+    Returns the plots of the owners best matching `q`, in English or Marathi,
+    within a district, optionally narrowed down to a taluka and village.
+    """
+
+    query = urllib.parse.unquote(request.query_params.get("q", "")).strip()
+    district = urllib.parse.unquote(request.query_params.get("district", ""))
+    taluka = urllib.parse.unquote(request.query_params.get("taluka", ""))
+    village = urllib.parse.unquote(request.query_params.get("village", ""))
+
+    if not query or not district or (village and not taluka):
+        return Response(
+            {"error": "Missing required parameters"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        limit = min(int(request.query_params.get("limit", 20)), 100)
+    except ValueError:
+        return Response(
+            {"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    index = get_owner_index(district)
+    if index is None:
+        return Response(
+            {"error": "Owner search isn't available for this district yet"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+    data = []
+    matches = index.search(query, limit=limit, taluka=taluka, village=village)
+    for owner_names, score, plots in matches:
+        for (d_name, t_name, v_name), entry in plots:
+            data.append(
+                {
+                    "owner_names": owner_names,
+                    "score": score,
+                    "khata_no": entry["khata_no"],
+                    "plot_id": entry["plot_id"],
+                    "gat_no": entry["gat_no"],
+                    "survey_no": entry["survey_no"],
+                    "district": d_name,
+                    "taluka": t_name,
+                    "village": v_name,
+                }
+            )
+
+    return Response(data, status=status.HTTP_200_OK)
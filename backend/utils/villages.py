@@ -0,0 +1,237 @@
+"""Per-village index of khata, gat and survey numbers.
+
+A village's preview rows (one per plot, from land_value's
+get_preview_from_village) are fetched once and kept column by column: khata,
+plot_id, gat and survey values plus an index into a table of distinct owner
+names. Rows are ordered by khata so a khata range is a contiguous slice, and
+each identifier maps to the rows carrying it, so listing a village's numbers or
+looking up the plots behind one of them is answered from memory. Indexes are
+cached per records data version in the shared cache and in a per-process LRU
+bounded by VILLAGE_INDEX_LOCAL_MAX_BYTES.
+"""
+
+import hashlib
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import RECORDS, get_data_version
+from .entitlements import normalize_name
+from .pool import mh_manager
+
+KHATA = "khata"
+GAT = "gat"
+SURVEY = "survey"
+
+FIELDS = {KHATA: "khata_no", GAT: "gat_no", SURVEY: "survey_no"}
+COLUMNS = ("khata_no", "plot_id", "gat_no", "survey_no")
+
+
+def normalize_number(number) -> str:
+    return str(number).strip()
+
+
+def number_sort_key(number):
+    """Sorts numeric identifiers numerically, ahead of ones like "12/1"."""
+    return (0, int(number), "") if number.isdigit() else (1, 0, number)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class VillageIndex:
+    """A village's preview rows stored as columns, plus identifier -> row lookups."""
+
+    def __init__(self, entries):
+        entries = sorted(
+            entries,
+            key=lambda e: number_sort_key(normalize_number(e.get("khata_no", ""))),
+        )
+
+        self.columns = {column: [] for column in COLUMNS}
+        self.owner_names = []
+        self.owners = array("I")
+        owner_ids = {}
+        for entry in entries:
+            for column, values in self.columns.items():
+                values.append(_intern(entry.get(column)))
+            name = entry.get("owner_name_english")
+            if name not in owner_ids:
+                owner_ids[name] = len(self.owner_names)
+                self.owner_names.append(name)
+            self.owners.append(owner_ids[name])
+
+        self._rows = {kind: {} for kind in FIELDS}
+        for kind, field in FIELDS.items():
+            for i, value in enumerate(self.columns[field]):
+                if value is None or normalize_number(value) == "":
+                    continue
+                self._rows[kind].setdefault(normalize_number(value), array("I")).append(
+                    i
+                )
+
+        self._numbers = {
+            kind: sorted(rows, key=number_sort_key) for kind, rows in self._rows.items()
+        }
+        # Numeric khatas sort first, so this is a prefix of the rows.
+        self._khata_ints = array("q")
+        for value in self.columns["khata_no"]:
+            value = normalize_number(value)
+            if not value.isdigit():
+                break
+            self._khata_ints.append(int(value))
+
+        self.nbytes = self._estimate_size()
+
+    def _estimate_size(self):
+        size = self.owners.itemsize * len(
+            self.owners
+        ) + self._khata_ints.itemsize * len(self._khata_ints)
+        size += sum(sys.getsizeof(name) for name in self.owner_names)
+        for values in self.columns.values():
+            size += sys.getsizeof(values) + sum(sys.getsizeof(v) for v in set(values))
+        for rows in self._rows.values():
+            size += sys.getsizeof(rows)
+            size += sum(sys.getsizeof(k) + r.itemsize * len(r) for k, r in rows.items())
+        return size
+
+    def __len__(self):
+        return len(self.owners)
+
+    def row(self, i) -> dict:
+        entry = {column: values[i] for column, values in self.columns.items()}
+        entry["owner_name_english"] = self.owner_names[self.owners[i]]
+        return entry
+
+    def rows(self, indices) -> list[dict]:
+        return [self.row(i) for i in indices]
+
+    @property
+    def entries(self) -> list[dict]:
+        return self.rows(range(len(self)))
+
+    def khata_range(self, start=None, end=None) -> range:
+        """
+        Returns the row indices whose khata number lies within [start, end],
+        either bound may be None. Khatas that aren't plain numbers are only
+        included when neither bound is given.
+        """
+
+        if start is None and end is None:
+            return range(len(self))
+        lo = bisect_left(self._khata_ints, start) if start is not None else 0
+        hi = (
+            bisect_right(self._khata_ints, end)
+            if end is not None
+            else len(self._khata_ints)
+        )
+        return range(lo, max(lo, hi))
+
+    def preview(self, indices, district, taluka, village) -> list[dict]:
+        """Rows in the shape of the khata-preview response."""
+
+        khatas, plot_ids, gats, surveys = (self.columns[c] for c in COLUMNS)
+        owners, names = self.owners, self.owner_names
+        return [
+            {
+                "khata_no": khatas[i],
+                "village_name": village,
+                "owner_names": names[owners[i]],
+                "district": district,
+                "taluka": taluka,
+                "plot_id": plot_ids[i],
+                "gat_no": gats[i],
+                "survey_no": surveys[i],
+            }
+            for i in indices
+        ]
+
+    def numbers(self, kind) -> list[str]:
+        """Returns the village's distinct `kind` numbers in sorted order."""
+        return self._numbers[kind]
+
+    def khata_numbers(self):
+        # Kept as ints where possible, that's what the khata list always returned.
+        return [int(k) if k.isdigit() else k for k in self._numbers[KHATA]]
+
+    def row_ids(self, kind, number):
+        return self._rows[kind].get(normalize_number(number), ())
+
+    def entries_for(self, kind, number) -> list[dict]:
+        """Returns the preview rows whose `kind` number matches."""
+        return self.rows(self.row_ids(kind, number))
+
+    def related(self, kind, number, other) -> list[str]:
+        """Returns the `other` numbers found on the same plots, e.g. khatas of a survey."""
+
+        values = self.columns[FIELDS[other]]
+        found = {
+            normalize_number(values[i])
+            for i in self.row_ids(kind, number)
+            if values[i] is not None
+        }
+        return sorted(found, key=number_sort_key)
+
+    def plot_ids(self, kind, number) -> list:
+        plot_ids = self.columns["plot_id"]
+        return [plot_ids[i] for i in self.row_ids(kind, number)]
+
+
+def build_village_index(district, taluka, village) -> VillageIndex:
+    with mh_manager() as all_manager_obj:
+        entries = all_manager_obj.get_preview_from_village(district, taluka, village)
+    return VillageIndex(entries or [])
+
+
+_local = OrderedDict()
+_local_bytes = 0
+_local_lock = threading.Lock()
+
+
+def get_village_index(district, taluka, village) -> VillageIndex:
+    """Returns the identifier index of a village, building it on a cache miss."""
+
+    global _local_bytes
+
+    names = ":".join(normalize_name(n) for n in (district, taluka, village))
+    digest = hashlib.sha256(names.encode()).hexdigest()[:32]
+    key = f"village-index:v{get_data_version(RECORDS)}:{digest}"
+
+    with _local_lock:
+        index = _local.get(key)
+        if index is not None:
+            _local.move_to_end(key)
+            return index
+
+    index = cache.get(key)
+    if index is None:
+        index = build_village_index(district, taluka, village)
+        cache.set(
+            key,
+            index,
+            timeout=getattr(settings, "VILLAGE_INDEX_CACHE_TIMEOUT", 60 * 60),
+        )
+
+    max_bytes = getattr(settings, "VILLAGE_INDEX_LOCAL_MAX_BYTES", 256 * 1024**2)
+    with _local_lock:
+        if key not in _local:
+            _local[key] = index
+            _local_bytes += index.nbytes
+        # The newest index stays even if it alone is over the limit.
+        while _local_bytes > max_bytes and len(_local) > 1:
+            _, evicted = _local.popitem(last=False)
+            _local_bytes -= evicted.nbytes
+    return index
+
+
+def clear_local_cache():
+    global _local_bytes
+    with _local_lock:
+        _local.clear()
+        _local_bytes = 0